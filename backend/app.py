@@ -2,193 +2,550 @@ import sys
 print("--- RELOADING app.py ---")
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request, stream_with_context
 import sqlite3
 import subprocess
+import base64
+import binascii
+import json
 import datetime
 import logging
 import time
 import argparse
-import concurrent.futures
-from src.scraper.dynamic_scraper import scrape_dynamic_site
-from src.database.database import create_connection, create_table, insert_listing, get_all_listings
-from src.analysis.gemini_analyzer import analyze_car_data as analyze_with_gemini
-from src.analysis.ollama_analyzer import analyze_car_data_ollama as analyze_with_ollama
-from src.digest.generator import generate_digest, send_email
+import functools
+import queue
+import signal
+from src.lazy import lazy_import
+from src.database.database import create_table, insert_listing, bulk_insert_listings, get_all_listings, query_listings, listing_cursor, touch_listings, price_drops, delisted_listings, data_version, bump_data_version, LISTING_SORT_COLUMNS
+from src.database.connections import connection
+from src.database.migrations import migrate
+from src.database.dedup import link_duplicates
+from src.analysis.cache import AnalysisCache, analysis_cache_key
+from src.events import Event, event_bus
+from src.metrics import count, registry as metrics_registry, timer
+from src.response_cache import ResponseCache, gzip_etag, make_entry
+from src.jobs.job_queue import DuplicateJob, JobQueue, WorkerPool
+from src.startup import profile_startup
 
-import threading
+# The scraper, analyzer and digest backends pull in Selenium, the LLM clients,
+# NumPy and Jinja2; they are imported on first use so the API is ready sooner.
+sources = lazy_import('src.scraper.sources')
+scheduler = lazy_import('src.scraper.scheduler')
+driver_pool = lazy_import('src.scraper.driver_pool')
+gemini_analyzer = lazy_import('src.analysis.gemini_analyzer')
+ollama_analyzer = lazy_import('src.analysis.ollama_analyzer')
+ollama_client = lazy_import('src.analysis.ollama_client')
+batch = lazy_import('src.analysis.batch')
+ranking = lazy_import('src.analysis.ranking')
+digest = lazy_import('src.digest.generator')
+columnar = lazy_import('src.database.columnar')
 
-scrape_status = {'status': 'idle', 'message': 'No scrape initiated.'}
+import threading
 
 app = Flask(__name__)
 
 DATABASE = os.environ.get('DATABASE_PATH', '/home/jmacleod/repos/car-finder-agent/car_finder.db')
 
-def get_db_connection():
-    conn = sqlite3.connect(DATABASE)
-    conn.row_factory = sqlite3.Row # This allows accessing columns by name
-    return conn
+OLLAMA_WARMUP_MODEL = os.environ.get('OLLAMA_WARMUP_MODEL', 'mistral')
+WEBDRIVER_POOL_WARM = os.environ.get('WEBDRIVER_POOL_WARM', '').lower() in ('1', 'true', 'yes')
+
+analysis_cache = AnalysisCache(DATABASE)
+
+def db_connection(readonly=False):
+    """Borrows a pooled, reusable connection; GET endpoints use the read-only one."""
+    return connection(DATABASE, readonly=readonly, row_factory=sqlite3.Row) # This allows accessing columns by name
 
 def init_db():
-    conn = get_db_connection()
-    c = conn.cursor()
-    sql_create_listings_table = """ CREATE TABLE IF NOT EXISTS listings (
-                                    id integer PRIMARY KEY,
-                                    make text NOT NULL,
-                                    model text NOT NULL,
-                                    year integer NOT NULL,
-                                    price real NOT NULL,
-                                    mileage integer,
-                                    vin text UNIQUE,
-                                    location text,
-                                    url text NOT NULL UNIQUE,
-                                    source_site text,
-                                    scraped_timestamp text NOT NULL
-                                ); """
-
-    sql_create_feedback_table = """ CREATE TABLE IF NOT EXISTS feedback (
-                                    id integer PRIMARY KEY,
-                                    car_id integer NOT NULL,
-                                    preference text NOT NULL,
-                                    timestamp text NOT NULL,
-                                    FOREIGN KEY (car_id) REFERENCES listings (id)
-                                ); """
-    c.execute(sql_create_listings_table)
-    c.execute(sql_create_feedback_table)
-    conn.commit()
-    conn.close()
+    with db_connection() as conn:
+        migrate(conn)
+
+response_cache = ResponseCache()
+
+def cached_response(view):
+    """
+    Serves a read endpoint from the response cache.
 
+    Responses are cached per path and query string at the current data
+    version, which ingest bumps after each page it commits, so a scrape
+    invalidates them all. Each body is hashed and gzipped once when cached;
+    clients get a strong ETag and a 304 when theirs still matches. Streamed
+    and non-200 responses pass through untouched.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        with db_connection(readonly=True) as conn:
+            version = data_version(conn)
+        key = (request.path, tuple(sorted(request.args.items(multi=True))))
+        entry = response_cache.get(key, version)
+        count('car_finder_response_cache_total', outcome='hit' if entry is not None else 'miss')
+        if entry is None:
+            response = app.make_response(view(*args, **kwargs))
+            if response.status_code != 200 or response.is_streamed:
+                return response
+            headers = [(name, value) for name, value in response.headers
+                       if name not in ('Content-Type', 'Content-Length')]
+            entry = response_cache.put(key, version, make_entry(response.get_data(), response.content_type, headers))
+
+        use_gzip = entry.gzip_body is not None and request.accept_encodings['gzip'] > 0
+        response = Response(entry.gzip_body if use_gzip else entry.body, headers=entry.headers,
+                            content_type=entry.content_type)
+        response.set_etag(gzip_etag(entry.etag) if use_gzip else entry.etag)
+        if use_gzip:
+            response.headers['Content-Encoding'] = 'gzip'
+        response.vary.add('Accept-Encoding')
+        # Clients may keep a copy but must revalidate it, which costs a 304 at most.
+        response.cache_control.no_cache = True
+        if request.if_none_match.contains_weak(response.get_etag()[0]):
+            count('car_finder_response_cache_total', outcome='not_modified')
+            response = Response(status=304, headers={name: value for name, value in response.headers
+                                                     if name in ('ETag', 'Vary', 'Cache-Control')})
+        return response
+    return wrapper
 
 @app.route('/')
 def hello_world():
     return jsonify(message="Hello from Flask Backend!")
 
+CARS_PAGE_SIZE = 100
+CARS_MAX_PAGE_SIZE = 1000
+LISTING_FILTER_TYPES = {
+    'make': str,
+    'model': str,
+    'source_site': str,
+    'year_min': int,
+    'year_max': int,
+    'price_min': float,
+    'price_max': float,
+    'mileage_max': int,
+    'scraped_after': int,
+    'scraped_before': int,
+    'seen_after': int,
+}
+# Listings unseen for this long count as delisted; drops this recent are highlighted.
+HISTORY_WINDOW_DAYS = 7
+DELISTED_AFTER_DAYS = float(os.getenv('DELISTED_AFTER_DAYS', HISTORY_WINDOW_DAYS))
+PRICE_DROP_DAYS = float(os.getenv('PRICE_DROP_DAYS', HISTORY_WINDOW_DAYS))
+
+def encode_cursor(row, sort):
+    column = sort.lstrip('-')
+    payload = json.dumps([row[column], row['id']]).encode()
+    return base64.urlsafe_b64encode(payload).decode()
+
+def decode_cursor(cursor):
+    value, last_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    return value, int(last_id)
+
+def parse_listing_query(args):
+    """Parses the filter and sort query parameters shared by the listing endpoints."""
+    filters = {}
+    for key, cast in LISTING_FILTER_TYPES.items():
+        value = args.get(key)
+        if value not in (None, ''):
+            filters[key] = cast(value)
+    sort = args.get('sort', 'id')
+    if sort.lstrip('-') not in LISTING_SORT_COLUMNS:
+        raise ValueError(f"Unsupported sort column: {sort}")
+    return filters, sort
+
 @app.route('/api/cars')
+@cached_response
 def get_cars():
-    conn = get_db_connection()
-    cars = conn.execute('SELECT * FROM listings').fetchall()
-    conn.close()
-    
-    # Convert Row objects to dictionaries
-    cars_list = []
-    for car in cars:
-        cars_list.append(dict(car))
-    
-    print(f"Returning {len(cars_list)} cars to the frontend.")
-    return jsonify(cars_list)
-
-def analyze_car(car_tuple, model):
-    car_dict = {
-        'id': car_tuple[0],
-        'make': car_tuple[1],
-        'model': car_tuple[2],
-        'year': car_tuple[3],
-        'price': car_tuple[4],
-        'mileage': car_tuple[5],
-        'vin': car_tuple[6],
-        'location': car_tuple[7],
-        'link': car_tuple[8],
-        'source_site': car_tuple[9],
-        'scraped_timestamp': car_tuple[10]
-    }
-    car_dict['title'] = f"{car_dict['year']} {car_dict['make']} {car_dict['model']}"
-    analysis_input_dict = {
-        'title': car_dict['title'],
-        'price': f"${car_dict['price']}",
-        'mileage': f"{car_dict['mileage']} miles" if car_dict['mileage'] else "N/A",
-        'location': car_dict['location'],
-        'link': car_dict['link']
-    }
+    try:
+        filters, sort = parse_listing_query(request.args)
+        limit = max(1, min(int(request.args.get('limit', CARS_PAGE_SIZE)), CARS_MAX_PAGE_SIZE))
+        cursor = request.args.get('cursor')
+        after = decode_cursor(cursor) if cursor else None
+    except (ValueError, TypeError, binascii.Error) as e:
+        return jsonify(message=f"Invalid query parameters: {e}"), 400
 
-    if model == "gemini":
-        analysis = analyze_with_gemini(analysis_input_dict)
-    else:
-        analysis = analyze_with_ollama(analysis_input_dict, model=model)
-    
-    car_dict['analysis'] = analysis
-    return car_dict
+    with db_connection(readonly=True) as conn:
+        # Fetch one extra row to know whether there is a next page.
+        rows = query_listings(conn, filters, sort, after, limit + 1).fetchall()
 
-@app.route('/api/scrape', methods=['POST'])
-def scrape_cars():
-    global scrape_status
-    if scrape_status['status'] == 'running':
-        return jsonify(message="Scraping is already in progress."), 409
+    next_cursor = encode_cursor(rows[limit - 1], sort) if len(rows) > limit else None
+    cars_list = [dict(car) for car in rows[:limit]]
+    return jsonify(cars=cars_list, next_cursor=next_cursor)
+
+@app.route('/api/cars/export')
+@cached_response
+def export_cars():
+    """
+    Streams every matching listing as a JSON array or NDJSON straight from the
+    cursor, or returns them as a columnar NumPy .npz for analytics jobs.
+    """
+    try:
+        filters, sort = parse_listing_query(request.args)
+    except (ValueError, TypeError) as e:
+        return jsonify(message=f"Invalid query parameters: {e}"), 400
+    export_format = request.args.get('format', 'json')
+    if export_format not in ('json', 'ndjson', 'npz'):
+        return jsonify(message=f"Unsupported export format: {export_format}"), 400
+    if export_format == 'npz':
+        with db_connection(readonly=True) as conn:
+            data, exported = columnar.export_npz_bytes(conn, filters, sort)
+        return Response(data, mimetype='application/octet-stream',
+                        headers={'Content-Disposition': 'attachment; filename=listings.npz',
+                                 'X-Listing-Count': str(exported)})
+
+    def generate():
+        with db_connection(readonly=True) as conn:
+            rows = query_listings(conn, filters, sort)
+            try:
+                if export_format == 'ndjson':
+                    for row in rows:
+                        yield json.dumps(dict(row)) + '\n'
+                    return
+                yield '['
+                for i, row in enumerate(rows):
+                    yield (',' if i else '') + json.dumps(dict(row))
+                yield ']'
+            finally:
+                # The connection outlives this export, so end its read now even if the client left early.
+                rows.close()
 
-    scrape_status = {'status': 'running', 'message': 'Scraping initiated.'}
-    threading.Thread(target=_scrape_and_store_data).start()
-    return jsonify(message="Scraping initiated successfully! Check /api/scrape-status for updates."), 202
+    mimetype = 'application/x-ndjson' if export_format == 'ndjson' else 'application/json'
+    return Response(stream_with_context(generate()), mimetype=mimetype)
 
-def _scrape_and_store_data():
-    global scrape_status
+def parse_window_query(args):
+    """Parses the `days` and `limit` query parameters of the price-history endpoints."""
+    days = float(args.get('days', HISTORY_WINDOW_DAYS))
+    if days < 0:
+        raise ValueError("days must not be negative")
+    limit = max(1, min(int(args.get('limit', CARS_PAGE_SIZE)), CARS_MAX_PAGE_SIZE))
+    return int(time.time() - days * 86400), limit
+
+@app.route('/api/cars/price-drops')
+def get_price_drops():
+    """Listings whose price dropped in the last `days` days, newest drop first."""
+    try:
+        since, limit = parse_window_query(request.args)
+    except ValueError as e:
+        return jsonify(message=f"Invalid query parameters: {e}"), 400
+    with db_connection(readonly=True) as conn:
+        cars_list = [dict(row) for row in price_drops(conn, since, limit)]
+    return jsonify(cars=cars_list)
+
+@app.route('/api/cars/delisted')
+def get_delisted():
+    """Listings no scrape has seen in the last `days` days, most recently seen first."""
     try:
-        logging.basicConfig(level=logging.INFO)
-        logging.info("Scrape request received.")
+        since, limit = parse_window_query(request.args)
+    except ValueError as e:
+        return jsonify(message=f"Invalid query parameters: {e}"), 400
+    with db_connection(readonly=True) as conn:
+        cars_list = [dict(row) for row in delisted_listings(conn, since, limit)]
+    return jsonify(cars=cars_list)
+
+def analysis_input(listing):
+    return {
+        'title': listing.title,
+        'price': f"${listing.price}",
+        'mileage': f"{listing.mileage} miles" if listing.mileage else "N/A",
+        'location': listing.location,
+        'link': listing.link
+    }
+
+def analyze_car(listing, model):
+    analysis_input_dict = analysis_input(listing)
 
-        logging.info("--- 1. Scraping ---")
+    try:
+        if model == "gemini":
+            analysis = analysis_cache.get_or_compute(
+                analysis_input_dict, gemini_analyzer.GEMINI_MODEL_NAME,
+                lambda: gemini_analyzer.generate_analysis(analysis_input_dict))
+        else:
+            analysis = analysis_cache.get_or_compute(
+                analysis_input_dict, model, lambda: ollama_analyzer.generate_analysis_ollama(analysis_input_dict, model=model))
+    except Exception as e:
+        logging.error(f"Analysis failed for car {listing.id}: {e}")
+        analysis = f"An error occurred during analysis: {e}"
+
+    listing.analysis = analysis
+    return listing
+
+def analyze_cars(listings, model, concurrency=None, on_result=None):
+    """
+    Analyzes many Listings concurrently, setting their `analysis` and returning
+    them in input order. `on_result` is called with each listing as soon as its
+    analysis is ready.
+    """
+    if model == "gemini":
+        return analyze_cars_gemini_batched(listings, on_result)
+
+    analyzer = batch.BatchAnalyzer(model, concurrency=concurrency, cache=analysis_cache)
+    for result in analyzer.analyze((analysis_input(listing) for listing in listings), ordered=False):
+        listing = listings[result.index]
+        if result.error is not None:
+            listing.analysis = f"An error occurred during analysis: {result.error}"
+        else:
+            listing.analysis = result.analysis
+        if on_result:
+            on_result(listing)
+    return listings
+
+def analyze_cars_gemini_batched(listings, on_result=None):
+    """Packs the cache misses into multi-listing Gemini requests."""
+    inputs = [analysis_input(listing) for listing in listings]
+    model_name = gemini_analyzer.GEMINI_MODEL_NAME
+    keys = [analysis_cache_key(analysis_input_dict, model_name) for analysis_input_dict in inputs]
+    misses = []
+    for i, key in enumerate(keys):
+        cached = analysis_cache.get(key)
+        if cached is None:
+            misses.append(i)
+        else:
+            listings[i].analysis = cached
+            if on_result:
+                on_result(listings[i])
+
+    if misses:
         try:
-            scraped_cars = scrape_dynamic_site()
-            logging.info(f"{len(scraped_cars)} cars scraped successfully.")
+            results = gemini_analyzer.generate_analyses_batch([inputs[i] for i in misses])
         except Exception as e:
-            logging.error(f"An error occurred during scraping: {e}", exc_info=True)
-            scraped_cars = []
-        
-        if not scraped_cars:
-            logging.info("No cars scraped. Exiting.")
-            scrape_status = {'status': 'completed', 'message': 'No cars scraped.'}
-            return
-
-        logging.info("--- 2. Database ---")
-        db_file = DATABASE
-        conn = create_connection(db_file)
-        if conn is None:
-            logging.error("Error! cannot create the database connection.")
-            scrape_status = {'status': 'failed', 'message': 'Error! cannot create the database connection.'}
-            return
+            results = [e] * len(misses)
+        for i, result in zip(misses, results):
+            if isinstance(result, Exception):
+                listings[i].analysis = f"An error occurred during analysis: {result}"
+            else:
+                analysis_cache.put(keys[i], model_name, result)
+                listings[i].analysis = result
+            if on_result:
+                on_result(listings[i])
+    return listings
+
+IDLE_STATUS = {'status': 'idle', 'message': 'No scrape initiated.'}
+
+def publish_job_update(job):
+    if job is not None:
+        event_bus.publish('status', job)
+
+job_queue = JobQueue(DATABASE)
+
+def select_digest_cars(model=None, top_n=None, scraped_after=None):
+    """
+    Ranks every canonical listing still listed and returns the top-N Listings
+    with their deal score and any recent price drop. Only these are sent to the
+    LLM for analysis.
+    """
+    top_n = ranking.DEFAULT_TOP_N if top_n is None else top_n
+    now = time.time()
+    with db_connection(readonly=True) as conn:
+        ranked = ranking.rank_listings(conn, top_n, scraped_after, seen_after=int(now - DELISTED_AFTER_DAYS * 86400))
+        rows = {listing.id: listing for listing in listing_cursor(conn).execute(
+            f"SELECT * FROM listings WHERE id IN ({','.join('?' for _ in ranked)})", [r.id for r in ranked]
+        )} if ranked else {}
+        drops = {}
+        if ranked:
+            # Newest first, so the first drop seen per listing is its latest.
+            for row in price_drops(conn, int(now - PRICE_DROP_DAYS * 86400)):
+                if row['id'] in rows:
+                    drops.setdefault(row['id'], row)
+
+    listings = [rows[r.id] for r in ranked]
+    for listing, r in zip(listings, ranked):
+        listing.deal_score = round(r.score, 3)
+        listing.expected_price = round(r.expected_price, 2)
+        if r.id in drops:
+            listing.previous_price = drops[r.id]['previous_price']
+            listing.price_drop = -drops[r.id]['price_change']
+    return analyze_cars(listings, model) if model else listings
+
+@app.route('/api/digest')
+def get_digest():
+    try:
+        top_n = max(1, int(request.args.get('top', ranking.DEFAULT_TOP_N)))
+        scraped_after = request.args.get('scraped_after', type=int)
+    except ValueError as e:
+        return jsonify(message=f"Invalid query parameters: {e}"), 400
+    cars = select_digest_cars(request.args.get('model'), top_n, scraped_after)
+    return Response(stream_with_context(digest.render_digest(cars)), mimetype='text/html')
 
+@app.route('/api/digest/send', methods=['POST'])
+def send_digest():
+    data = request.get_json(silent=True) or {}
+    recipients = data.get('recipients') or []
+    if not isinstance(recipients, list) or not all(isinstance(recipient, str) for recipient in recipients):
+        return jsonify(message="recipients must be a list of email addresses."), 400
+    if not recipients:
+        return jsonify(message="No recipients given."), 400
+    try:
+        top_n = max(1, int(data.get('top', ranking.DEFAULT_TOP_N)))
+        scraped_after = data.get('scraped_after')
+        scraped_after = int(scraped_after) if scraped_after is not None else None
+    except (TypeError, ValueError) as e:
+        return jsonify(message=f"Invalid parameters: {e}"), 400
+    params = {
+        'recipients': recipients,
+        'model': data.get('model'),
+        'top': top_n,
+        'scraped_after': scraped_after,
+    }
+    try:
+        job_id = job_queue.enqueue('digest', params, dedup_key=f"digest:{','.join(sorted(recipients))}")
+    except DuplicateJob as e:
+        return jsonify(message="This digest is already being sent.", job_id=e.job_id), 409
+
+    start_job_workers()
+    return jsonify(message=f"Digest delivery queued. Check /api/scrape-status/{job_id} for updates.", job_id=job_id), 202
+
+def run_digest_job(job):
+    """Job handler: ranks and analyzes the top listings once, then mails a digest to each recipient."""
+    recipients = job.params['recipients']
+    job.progress('rank', message='Selecting the top listings.')
+    cars = select_digest_cars(job.params.get('model'), job.params.get('top'),
+                              job.params.get('scraped_after'))
+    job.progress('rank', done=len(cars), total=len(cars))
+
+    job.progress('send', done=0, total=len(recipients), message=f'Sending {len(recipients)} digests.')
+    sent = [0]
+
+    def on_report(report):
+        sent[0] += 1
+        job.progress('send', done=sent[0])
+        job.check_cancelled()
+
+    with digest.SMTPMailer() as mailer:
+        reports = digest.send_digests(((recipient, cars) for recipient in recipients), mailer, on_report=on_report)
+    failed = [report.recipient for report in reports if report.error]
+    if failed:
+        raise RuntimeError(f"Failed to send digests to {', '.join(failed)}.")
+    return f"Sent {len(reports)} digests."
+
+def scrape_dedup_key(plan):
+    return ';'.join(sources.run_key(name, urls) for name, urls in plan.items())
+
+@app.route('/api/scrape', methods=['POST'])
+def scrape_cars():
+    data = request.get_json(silent=True) or {}
+    try:
+        plan = sources.resolve_plan(data.get('sources'), data.get('urls'))
+    except ValueError as e:
+        return jsonify(message=str(e)), 400
+    params = {
+        'sources': plan,
+        'model': data.get('model'),
+        'incremental': bool(data.get('incremental', True)),
+    }
+    try:
+        job_id = job_queue.enqueue('scrape', params, dedup_key=scrape_dedup_key(plan))
+    except DuplicateJob as e:
+        return jsonify(message="Scraping is already in progress.", job_id=e.job_id), 409
+
+    start_job_workers()
+    publish_job_update(job_queue.get(job_id))
+    return jsonify(message=f"Scraping initiated successfully! Check /api/scrape-status/{job_id} for updates.",
+                   job_id=job_id), 202
+
+def run_scrape_job(job):
+    """Job handler: scrapes the job's sources, stores new listings and optionally analyzes them."""
+    model = job.params.get('model')
+    incremental = job.params.get('incremental', True)
+    plan = sources.resolve_plan(job.params.get('sources'), job.params.get('urls'))
+    total_pages = sum(len(urls) for urls in plan.values())
+    logging.info(f"Scrape job {job.id} started.")
+
+    db_file = DATABASE
+    with db_connection() as conn:
         create_table(conn)
-        logging.info("Database table created or already exists.")
+        first_new_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM listings").fetchone()[0] + 1
+        totals = {'inserted': 0, 'duplicates': 0, 'price_changes': 0, 'rejected': 0, 'linked': 0, 'unchanged': 0}
+        pages_done = [0]
 
-        for car in scraped_cars:
-            try:
-                logging.info(f"Processing car: {car}")
-                
-                make = car.get('make')
-                model = car.get('model')
-                year = car.get('year')
-                price = car.get('price')
-                mileage = car.get('mileage')
-                vin = car.get('vin')
-                location = car.get('location')
-                url = car.get('url')
-                source_site = "truecar.com"
-                scraped_timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
-                if all([make, model, year, price, url]):
-                    listing_tuple = (
-                        make, model, year, price, mileage, vin, location, url, source_site, scraped_timestamp
-                    )
-                    insert_listing(conn, listing_tuple)
-                    logging.info(f"Inserted car into database: {listing_tuple}")
-                else:
-                    logging.warning(f"Skipping incomplete listing: {car}")
-
-            except (ValueError, IndexError) as e:
-                logging.error(f"Error processing car: {car}, Error: {e}", exc_info=True)
-                continue
-
-        logging.info("Database processing complete.")
-        conn.close()
-
-        logging.info("Scrape request completed successfully.")
-        scrape_status = {'status': 'completed', 'message': 'Scraping completed successfully!'}
-    except Exception as e:
-        logging.error(f"An unexpected error occurred during scraping: {e}", exc_info=True)
-        scrape_status = {'status': 'failed', 'message': f'An unexpected error occurred during scraping: {str(e)}'}
+        def ingest_page(page):
+            job.check_cancelled()
+            pages_done[0] += 1
+            job.progress('scrape', done=pages_done[0], total=total_pages)
+            if page.status == 'failed':
+                job.progress('ingest', message=f"Failed to scrape {page.source} page {page.page} "
+                                               f"({pages_done[0]} of {total_pages}); it is retried next time.")
+                return
+            for car in page.listings:
+                event_bus.publish('scraped', car.to_dict())
+            now = int(time.time())
+            # Known cards skipped as unchanged were still seen, so they stay listed.
+            totals['unchanged'] += touch_listings(conn, page.unchanged, now)
+            if page.listings:
+                last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM listings").fetchone()[0]
+                stats = bulk_insert_listings(conn, page.listings, source_site=page.source, scraped_timestamp=now)
+                for key in ('inserted', 'duplicates', 'price_changes', 'rejected'):
+                    totals[key] += stats[key]
+                with timer('dedup'):
+                    totals['linked'] += link_duplicates(conn, last_id + 1)
+                with timer('baseline_refresh'):
+                    ranking.refresh_baselines(conn, last_id + 1)
+                for listing in listing_cursor(conn).execute("SELECT * FROM listings WHERE id > ? ORDER BY id", (last_id,)):
+                    event_bus.publish('inserted', listing.to_dict())
+            if page.listings or page.unchanged:
+                # Cached API responses rendered before this page are now stale.
+                bump_data_version(conn)
+            job.progress('ingest', done=totals['inserted'],
+                         message=f"Scraped {page.source} page {page.page} ({pages_done[0]} of {total_pages}).")
+
+        job.progress('scrape', done=0, total=total_pages, message=f"Scraping {', '.join(plan)}.")
+        job.progress('ingest', done=0)
+        scraped = sum(scheduler.run_sources(plan, ingest_page, db_file, incremental=incremental,
+                                            check=job.check_cancelled).values())
+        logging.info(f"{scraped} {'new ' if incremental else ''}cars scraped. Database processing complete: "
+                     f"{totals['inserted']} inserted, {totals['duplicates']} already stored ({totals['price_changes']} price changes), "
+                     f"{totals['unchanged']} unchanged, {totals['rejected']} rejected, "
+                     f"{totals['linked']} linked to cars seen before.")
+        # Duplicates of a car already stored share its analysis, so only canonical listings are analyzed.
+        inserted = listing_cursor(conn).execute(
+            "SELECT * FROM listings WHERE id >= ? AND canonical_id IS NULL ORDER BY id", (first_new_id,)).fetchall()
+
+    if not scraped:
+        return 'No new cars scraped.'
+
+    if model and inserted:
+        logging.info("--- Analysis ---")
+        job.progress('analysis', done=0, total=len(inserted),
+                     message=f'Analyzing {len(inserted)} new listings with {model}.')
+        analyzed = [0]
+
+        def on_result(listing):
+            event_bus.publish('analyzed', listing.to_dict())
+            analyzed[0] += 1
+            job.progress('analysis', done=analyzed[0])
+            job.check_cancelled()
+
+        analyze_cars(inserted, model, on_result=on_result)
+
+    logging.info(f"Scrape job {job.id} completed successfully.")
+    return 'Scraping completed successfully!'
+
+job_workers = WorkerPool(job_queue, {'scrape': run_scrape_job, 'digest': run_digest_job}, on_update=publish_job_update)
+
+def start_job_workers():
+    job_workers.start()
+
+@app.route('/api/scrape-status/<int:job_id>')
+def get_job_status(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify(message=f"Job {job_id} not found."), 404
+    return jsonify(job)
+
+@app.route('/api/scrape-status/<int:job_id>/timings')
+def get_job_timings(job_id):
+    timings = job_queue.timings(job_id)
+    if timings is None:
+        return jsonify(message=f"No timing report for job {job_id}; it may still be running."), 404
+    return jsonify(timings)
+
+@app.route('/metrics')
+def metrics():
+    return Response(metrics_registry.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/scrape/<int:job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    if not job_queue.cancel(job_id):
+        return jsonify(message=f"Job {job_id} is not active."), 409
+    publish_job_update(job_queue.get(job_id))
+    return jsonify(message=f"Cancellation of job {job_id} requested."), 202
 
 @app.route('/api/scrape-status')
 def get_scrape_status():
-    global scrape_status
-    return jsonify(scrape_status)
+    return jsonify(job_queue.latest('scrape') or IDLE_STATUS)
     data = request.get_json()
     car_id = data.get('carId')
     preference = data.get('preference')
@@ -198,45 +555,90 @@ def get_scrape_status():
         return jsonify(message="Missing carId or preference"), 400
 
     try:
-        conn = get_db_connection()
-        conn.execute(
-            'INSERT INTO feedback (car_id, preference, timestamp) VALUES (?, ?, ?)',
-            (car_id, preference, timestamp)
-        )
-        conn.commit()
-        conn.close()
+        with db_connection() as conn:
+            conn.execute(
+                'INSERT INTO feedback (car_id, preference, timestamp) VALUES (?, ?, ?)',
+                (car_id, preference, timestamp)
+            )
+            conn.commit()
         return jsonify(message=f"Feedback for car {car_id} ({preference}) recorded successfully!"), 200
     except sqlite3.Error as e:
         return jsonify(message=f"Failed to record feedback: {e}"), 500
 
+SSE_HEARTBEAT_SECONDS = 15
+
+def format_sse(event):
+    event_id = f"id: {event.id}\n" if event.id is not None else ""
+    return f"{event_id}event: {event.type}\ndata: {json.dumps(event.data)}\n\n"
+
+@app.route('/api/events')
+def stream_events():
+    """Server-sent events stream of scrape and analysis progress."""
+    last_event_id = request.headers.get('Last-Event-ID')
+    last_event_id = int(last_event_id) if last_event_id and last_event_id.isdigit() else None
+    subscriber = event_bus.subscribe(last_event_id)
+
+    def generate():
+        try:
+            if last_event_id is None:
+                yield format_sse(Event(None, 'status', job_queue.latest('scrape') or IDLE_STATUS))
+            while True:
+                try:
+                    yield format_sse(subscriber.get(timeout=SSE_HEARTBEAT_SECONDS))
+                except queue.Empty:
+                    # Comment line keeps proxies from closing an idle stream.
+                    yield ": heartbeat\n\n"
+        finally:
+            event_bus.unsubscribe(subscriber)
+
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/api/test-ollama')
 def test_ollama():
     try:
-        ollama_api_url = "http://ollama.ollama.svc.cluster.local:11434/api/generate"
-        request_data = {
-            "model": "mistral",
-            "prompt": "Why is the sky blue?",
-            "stream": False
-        }
-        headers = {"Content-Type": "application/json"}
-
-        response = requests.post(
-            ollama_api_url,
-            data=json.dumps(request_data),
-            headers=headers
-        )
+        model = request.args.get('model', OLLAMA_WARMUP_MODEL)
+        client = ollama_client.get_client()
+        warm_up = client.warm_up(model)
+        result = client.generate(model, "Why is the sky blue?")
 
         return jsonify({
-            "status_code": response.status_code,
-            "headers": dict(response.headers),
-            "content": response.text
+            "model": model,
+            "load_seconds": warm_up["load"],
+            "ttft_seconds": result["ttft"],
+            "total_seconds": result["total"],
+            "content": result["response"]
         })
     except Exception as e:
         return jsonify(message="An unexpected error occurred during the test!", error=str(e)), 500
 
+def warm_up_ollama():
+    try:
+        ollama_client.get_client().warm_up(OLLAMA_WARMUP_MODEL)
+    except Exception as e:
+        logging.warning(f"Ollama warm-up for {OLLAMA_WARMUP_MODEL} failed: {e}")
+
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Car finder API server.")
+    parser.add_argument('--profile-startup', action='store_true',
+                        help="Print the import-time breakdown of starting the server, then exit.")
+    args = parser.parse_args()
+    if args.profile_startup:
+        profile_startup(['app'], path=[os.path.dirname(os.path.abspath(__file__))])
+        sys.exit(0)
     try:
         init_db()
+        start_job_workers()
+        if OLLAMA_WARMUP_MODEL:
+            threading.Thread(target=warm_up_ollama, daemon=True).start()
+        if WEBDRIVER_POOL_WARM:
+            # Create the driver pool on the main thread so it can hook SIGTERM for a clean shutdown.
+            # Dynamic sources are scraped on threads of this process and borrow it.
+            threading.Thread(target=driver_pool.get_driver_pool().warm, daemon=True).start()
+        else:
+            # The first scrape creates the pool off the main thread, where it can't hook SIGTERM;
+            # exiting normally on SIGTERM still runs its atexit shutdown.
+            signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(128 + signum))
         app.run(debug=True, host='0.0.0.0', use_reloader=False)
     except Exception as e:
-        logging.error(f"An error occurred during application startup: {e}")
\ No newline at end of file
+        logging.error(f"An error occurred during application startup: {e}")
@@ -0,0 +1,366 @@
+"""
+Local stand-in for the LLM backends, for load-testing the analysis layer offline.
+
+Speaks the Ollama /api/generate protocol (streaming NDJSON or a single JSON
+body) and the Gemini REST generateContent call. Responses are replayed from a
+JSONL recording keyed by prompt hash, with configurable time-to-first-token,
+tokens/sec and error rate. In record mode requests are proxied to real
+upstreams and every exchange is appended to the recording.
+
+    # Replay, 300 ms TTFT, 40 tokens/s, 5% errors:
+    python -m benchmarks.llm_standin --recordings llm.jsonl --ttft 0.3 --tokens-per-second 40 --error-rate 0.05
+    OLLAMA_API_URL=http://localhost:11435/api/generate GEMINI_API_ENDPOINT=http://localhost:11435 ...
+
+    # Record real traffic:
+    python -m benchmarks.llm_standin --recordings llm.jsonl --record \
+        --upstream-ollama http://ollama:11434 --upstream-gemini https://generativelanguage.googleapis.com
+"""
+import argparse
+import hashlib
+import json
+import logging
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+DEFAULT_PORT = 11435
+NANOSECONDS = 1_000_000_000
+GEMINI_PATH = re.compile(r'^/v1(?:beta)?/models/(?P<model>[^:/]+):generateContent$')
+BATCH_LISTING = re.compile(r'^\s*Listing (\d+):', re.MULTILINE)
+
+def prompt_hash(prompt):
+    return hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+
+def tokenize(text):
+    """Splits text into word-sized chunks, roughly as a model streams it."""
+    return re.findall(r'\S+\s*|\s+', text) or ['']
+
+def synthetic_response(prompt, json_mode=False):
+    """
+    A deterministic stand-in answer for prompts with no recording.
+
+    Batch prompts in JSON mode get one array entry per listing, so the
+    batched Gemini path parses them like a real reply.
+    """
+    seed = int(prompt_hash(prompt)[:8], 16)
+    rng = random.Random(seed)
+    pros = rng.choice(["reasonable price", "low mileage for its age", "popular, reliable model", "local dealer"])
+    cons = rng.choice(["priced slightly above similar listings", "high mileage", "older model year", "few details listed"])
+    analysis = f"Pros: {pros}. Cons: {cons}. Worth a closer look if the service history checks out."
+    if json_mode:
+        ids = [int(n) for n in BATCH_LISTING.findall(prompt)] or [1]
+        return json.dumps([{"id": i, "analysis": analysis} for i in ids])
+    return analysis
+
+class Recordings:
+    """Recorded responses keyed by prompt hash, backed by an append-only JSONL file."""
+
+    def __init__(self, path=None):
+        self.path = path
+        self._records = {}
+        self._lock = threading.Lock()
+        if path:
+            try:
+                with open(path) as f:
+                    for line in f:
+                        if line.strip():
+                            record = json.loads(line)
+                            self._records[record['prompt_hash']] = record
+            except FileNotFoundError:
+                pass
+        logging.info(f"Loaded {len(self._records)} recorded responses.")
+
+    def get(self, key):
+        return self._records.get(key)
+
+    def add(self, record):
+        with self._lock:
+            self._records[record['prompt_hash']] = record
+            if self.path:
+                with open(self.path, 'a') as f:
+                    f.write(json.dumps(record) + "\n")
+
+class LatencyProfile:
+    """Simulated timing and failure behaviour of a backend."""
+
+    def __init__(self, ttft=0.2, ttft_jitter=0.0, tokens_per_second=30.0, error_rate=0.0,
+                 load_seconds=0.0, recorded_timing=False, seed=None):
+        self.ttft = ttft
+        self.ttft_jitter = ttft_jitter
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.load_seconds = load_seconds
+        self.recorded_timing = recorded_timing
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def first_token_delay(self, record=None):
+        if self.recorded_timing and record and record.get('ttft') is not None:
+            return record['ttft']
+        with self._lock:
+            return max(0.0, self.ttft + self._rng.uniform(-self.ttft_jitter, self.ttft_jitter))
+
+    def token_delay(self, record=None):
+        if self.recorded_timing and record and record.get('tokens_per_second'):
+            return 1.0 / record['tokens_per_second']
+        return 1.0 / self.tokens_per_second if self.tokens_per_second else 0.0
+
+    def should_fail(self):
+        with self._lock:
+            return self._rng.random() < self.error_rate
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        logging.debug(format % args)
+
+    # -- plumbing ---------------------------------------------------------
+
+    def _read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or b'{}')
+
+    def _send_json(self, status, body, headers=None):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _start_chunked(self, content_type):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+    def _write_chunk(self, data):
+        if data:
+            self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+
+    def _end_chunked(self):
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def _lookup(self, prompt, json_mode):
+        """Returns (record, text), or (None, None) on a miss in strict mode."""
+        record = self.server.recordings.get(prompt_hash(prompt))
+        if record is not None:
+            return record, record['response']
+        if self.server.miss == 'error':
+            return None, None
+        return None, synthetic_response(prompt, json_mode)
+
+    def do_POST(self):
+        try:
+            if self.path.split('?')[0] == '/api/generate':
+                self._ollama_generate(self._read_json())
+                return
+            match = GEMINI_PATH.match(self.path.split('?')[0])
+            if match:
+                self._gemini_generate(match.group('model'), self._read_json())
+                return
+            self._send_json(404, {"error": f"unknown path {self.path}"})
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    # -- Ollama -----------------------------------------------------------
+
+    def _ollama_generate(self, body):
+        model, prompt = body.get('model'), body.get('prompt')
+        profile = self.server.profile
+        if not prompt:
+            # A warm-up request: load the model, generate nothing.
+            time.sleep(profile.load_seconds)
+            self._send_json(200, {"model": model, "response": "", "done": True,
+                                  "load_duration": int(profile.load_seconds * NANOSECONDS)})
+            return
+        if self.server.upstream_ollama:
+            self._record_ollama(body)
+            return
+        if profile.should_fail():
+            self._send_json(503, {"error": "simulated overload"}, {'Retry-After': '1'})
+            return
+        record, text = self._lookup(prompt, json_mode=body.get('format') == 'json')
+        if text is None:
+            self._send_json(404, {"error": "no recorded response for this prompt"})
+            return
+
+        start = time.perf_counter()
+        tokens = tokenize(text)
+        time.sleep(profile.first_token_delay(record))
+        final = {"model": model, "response": "", "done": True, "load_duration": 0, "eval_count": len(tokens)}
+        if body.get('stream', True) is False:
+            time.sleep(profile.token_delay(record) * (len(tokens) - 1))
+            final.update(response=text, total_duration=int((time.perf_counter() - start) * NANOSECONDS))
+            self._send_json(200, final)
+            return
+
+        self._start_chunked('application/x-ndjson')
+        for i, token in enumerate(tokens):
+            if i:
+                time.sleep(profile.token_delay(record))
+            self._write_chunk(json.dumps({"model": model, "response": token, "done": False}).encode() + b"\n")
+        final['total_duration'] = int((time.perf_counter() - start) * NANOSECONDS)
+        self._write_chunk(json.dumps(final).encode() + b"\n")
+        self._end_chunked()
+
+    def _record_ollama(self, body):
+        start = time.perf_counter()
+        ttft, tokens, final = None, [], {}
+        upstream = requests.post(f"{self.server.upstream_ollama}/api/generate", json=body,
+                                 stream=True, timeout=(5, 600))
+        if upstream.status_code != 200:
+            self._send_json(upstream.status_code, {"error": upstream.text})
+            return
+        streaming = body.get('stream', True) is not False
+        if streaming:
+            self._start_chunked('application/x-ndjson')
+        for line in upstream.iter_lines():
+            if not line:
+                continue
+            chunk = json.loads(line)
+            if chunk.get('response') and ttft is None:
+                ttft = time.perf_counter() - start
+            tokens.append(chunk.get('response', ''))
+            if chunk.get('done'):
+                final = chunk
+            if streaming:
+                self._write_chunk(line + b"\n")
+        if streaming:
+            self._end_chunked()
+        else:
+            self._send_json(200, final)
+        self._save(body['prompt'], 'ollama', body.get('model'), "".join(tokens), ttft,
+                   time.perf_counter() - start, final.get('eval_count'))
+
+    # -- Gemini -----------------------------------------------------------
+
+    def _gemini_generate(self, model, body):
+        prompt = "".join(
+            part.get('text', '') for content in body.get('contents', []) for part in content.get('parts', [])
+        )
+        config = body.get('generationConfig') or body.get('generation_config') or {}
+        json_mode = (config.get('responseMimeType') or config.get('response_mime_type')) == 'application/json'
+        if self.server.upstream_gemini:
+            self._record_gemini(model, prompt, body)
+            return
+        profile = self.server.profile
+        if profile.should_fail():
+            self._send_json(429, {"error": {"code": 429, "message": "simulated quota exhaustion",
+                                            "status": "RESOURCE_EXHAUSTED"}}, {'Retry-After': '1'})
+            return
+        record, text = self._lookup(prompt, json_mode)
+        if text is None:
+            self._send_json(404, {"error": {"code": 404, "message": "no recorded response for this prompt",
+                                            "status": "NOT_FOUND"}})
+            return
+        tokens = tokenize(text)
+        time.sleep(profile.first_token_delay(record) + profile.token_delay(record) * (len(tokens) - 1))
+        self._send_json(200, {
+            "candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "finishReason": "STOP", "index": 0}],
+            "usageMetadata": {"promptTokenCount": len(tokenize(prompt)), "candidatesTokenCount": len(tokens),
+                              "totalTokenCount": len(tokenize(prompt)) + len(tokens)},
+        })
+
+    def _record_gemini(self, model, prompt, body):
+        start = time.perf_counter()
+        headers = {name: value for name, value in self.headers.items() if name.lower().startswith('x-goog')}
+        upstream = requests.post(f"{self.server.upstream_gemini}{self.path}", json=body, headers=headers,
+                                 timeout=(5, 600))
+        total = time.perf_counter() - start
+        try:
+            reply = upstream.json()
+        except ValueError:
+            reply = {"error": upstream.text}
+        self._send_json(upstream.status_code, reply)
+        if upstream.status_code == 200:
+            text = "".join(part.get('text', '') for part in reply['candidates'][0]['content']['parts'])
+            # The REST call is not streamed, so TTFT is unknown.
+            self._save(prompt, 'gemini', model, text, None, total,
+                       reply.get('usageMetadata', {}).get('candidatesTokenCount'))
+
+    def _save(self, prompt, backend, model, text, ttft, total, eval_count):
+        generation = total - (ttft or 0)
+        self.server.recordings.add({
+            "prompt_hash": prompt_hash(prompt),
+            "backend": backend,
+            "model": model,
+            "response": text,
+            "ttft": ttft,
+            "total": total,
+            "tokens_per_second": (eval_count / generation) if eval_count and generation > 0 else None,
+            "recorded_at": int(time.time()),
+        })
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, recordings, profile, miss='synthetic', upstream_ollama=None, upstream_gemini=None):
+        super().__init__(address, StandInHandler)
+        self.recordings = recordings
+        self.profile = profile
+        self.miss = miss
+        self.upstream_ollama = upstream_ollama.rstrip('/') if upstream_ollama else None
+        self.upstream_gemini = upstream_gemini.rstrip('/') if upstream_gemini else None
+
+def start_standin(host='127.0.0.1', port=0, recordings=None, profile=None, **options):
+    """
+    Starts a stand-in server on a background thread.
+
+    Returns:
+        The server; its URL is http://host:server.server_port. Call shutdown() to stop it.
+    """
+    server = StandInServer((host, port), recordings or Recordings(), profile or LatencyProfile(), **options)
+    threading.Thread(target=server.serve_forever, name='llm-standin', daemon=True).start()
+    return server
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve recorded or simulated LLM responses.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--recordings', help="JSONL file of recorded responses.")
+    parser.add_argument('--record', action='store_true', help="Proxy to the upstreams and append to --recordings.")
+    parser.add_argument('--upstream-ollama', help="Ollama base URL to record from.")
+    parser.add_argument('--upstream-gemini', default='https://generativelanguage.googleapis.com',
+                        help="Gemini REST base URL to record from.")
+    parser.add_argument('--miss', choices=('synthetic', 'error'), default='synthetic',
+                        help="Answer unrecorded prompts with a synthetic response, or a 404.")
+    parser.add_argument('--ttft', type=float, default=0.2, help="Seconds to the first token.")
+    parser.add_argument('--ttft-jitter', type=float, default=0.0, help="Uniform +/- jitter on the TTFT.")
+    parser.add_argument('--tokens-per-second', type=float, default=30.0)
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of requests answered 503/429.")
+    parser.add_argument('--load-seconds', type=float, default=0.0, help="Simulated model load time on warm-up.")
+    parser.add_argument('--recorded-timing', action='store_true', help="Replay recorded TTFT and token rate when known.")
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args(argv)
+
+    if args.record and not args.recordings:
+        parser.error("--record needs --recordings")
+    logging.basicConfig(level=logging.INFO)
+    profile = LatencyProfile(args.ttft, args.ttft_jitter, args.tokens_per_second, args.error_rate,
+                             args.load_seconds, args.recorded_timing, args.seed)
+    server = StandInServer(
+        (args.host, args.port), Recordings(args.recordings), profile, args.miss,
+        upstream_ollama=args.upstream_ollama if args.record else None,
+        upstream_gemini=args.upstream_gemini if args.record else None,
+    )
+    logging.info(f"LLM stand-in listening on http://{args.host}:{server.server_port} "
+                 f"({'recording' if args.record else 'replaying'}).")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == '__main__':
+    main()
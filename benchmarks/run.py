@@ -0,0 +1,253 @@
+"""
+Synthetic-load benchmarks for the scrape -> store -> serve pipeline.
+
+    python -m benchmarks.run --sizes 1000 10000 100000 --output bench.json
+    python -m benchmarks.run --sizes 1000 --compare bench.json
+
+Each benchmark is timed `--repeat` times; the results file records the commit,
+environment and per-benchmark statistics so runs can be diffed across commits.
+"""
+import argparse
+import importlib
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import closing
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.synthetic import SCRAPED_TIMESTAMP, build_database, synthetic_listings, synthetic_results_page
+from src.analysis.ranking import rank_listings
+from src.database.database import bulk_insert_listings, create_connection, create_table, insert_listing, validate_listing
+from src.digest.generator import generate_digest
+from src.scraper.dynamic_scraper import scrape_cars_com
+
+DEFAULT_SIZES = (1000, 10000)
+DEFAULT_REPEAT = 5
+DEFAULT_PAGE_CARDS = (20, 100, 1000)
+# insert_listing commits per row, so it is only run up to this many rows.
+MAX_SINGLE_INSERTS = 10000
+
+class HtmlDriver:
+    """
+    Just enough of a WebDriver for scrape_cars_com's `html` mode, so extraction
+    can be benchmarked without a browser.
+    """
+
+    def __init__(self, page_source, current_url="https://example.com/results"):
+        self.page_source = page_source
+        self.current_url = current_url
+
+    def find_element(self, by, selector):
+        return True
+
+def measure(fn, repeat, setup=None):
+    """Runs `fn` `repeat` times (after `setup`, untimed) and returns the durations in seconds."""
+    durations = []
+    for _ in range(repeat):
+        arg = setup() if setup else None
+        start = time.perf_counter()
+        fn(arg) if setup else fn()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+def summarize(name, size, durations, items=None, **extra):
+    ordered = sorted(durations)
+    result = {
+        'name': name,
+        'size': size,
+        'repeat': len(durations),
+        'min_seconds': ordered[0],
+        'median_seconds': statistics.median(ordered),
+        'p95_seconds': ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))],
+        'mean_seconds': statistics.fmean(ordered),
+    }
+    if items:
+        result['items_per_second'] = items / result['median_seconds']
+    result.update(extra)
+    print(f"{name:<32} size={size:<8} median={result['median_seconds'] * 1000:10.2f} ms"
+          + (f"  {result['items_per_second']:12.0f}/s" if items else ""))
+    return result
+
+def bench_extraction(page_cards, repeat, browser=False):
+    results = []
+    for cards in page_cards:
+        page, _ = synthetic_results_page(cards)
+        driver = HtmlDriver(page)
+        assert len(scrape_cars_com(driver, mode='html')) == cards, "extraction lost cards"
+        results.append(summarize('extract_html', cards, measure(lambda: scrape_cars_com(driver, mode='html'), repeat), cards))
+        if browser:
+            from src.scraper.driver_pool import DriverPool
+            with tempfile.NamedTemporaryFile('w', suffix='.html', delete=False) as f:
+                f.write(page)
+            pool = DriverPool(size=1)
+            try:
+                with pool.driver() as real_driver:
+                    real_driver.get(f"file://{f.name}")
+                    for mode in ('script', 'elements'):
+                        durations = measure(lambda: scrape_cars_com(real_driver, mode=mode), repeat)
+                        results.append(summarize(f'extract_{mode}', cards, durations, cards))
+            finally:
+                pool.shutdown()
+                os.remove(f.name)
+    return results
+
+def _fresh_database(directory):
+    fd, db_file = tempfile.mkstemp(suffix='.db', dir=directory)
+    os.close(fd)
+    with closing(create_connection(db_file)) as conn:
+        create_table(conn)
+    return db_file
+
+def bench_ingest(sizes, repeat, directory):
+    results = []
+    for size in sizes:
+        listings = synthetic_listings(size)
+
+        def bulk(db_file):
+            with closing(create_connection(db_file)) as conn:
+                bulk_insert_listings(conn, listings, scraped_timestamp=SCRAPED_TIMESTAMP)
+        results.append(summarize('ingest_bulk', size, measure(bulk, repeat, lambda: _fresh_database(directory)), size))
+
+        if size <= MAX_SINGLE_INSERTS:
+            rows = [validate_listing(listing, 'example.com', SCRAPED_TIMESTAMP) for listing in listings]
+
+            def single(db_file):
+                with closing(create_connection(db_file)) as conn:
+                    for row in rows:
+                        insert_listing(conn, row)
+            results.append(summarize('ingest_insert_listing', size,
+                                     measure(single, max(1, repeat // 2), lambda: _fresh_database(directory)), size))
+    return results
+
+def _load_app(db_file):
+    os.environ['DATABASE_PATH'] = db_file
+    backend = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+    if backend not in sys.path:
+        sys.path.insert(0, backend)
+    app_module = importlib.import_module('app')
+    app_module.DATABASE = db_file
+    return app_module
+
+def bench_api(sizes, repeat, directory):
+    results = []
+    for size in sizes:
+        db_file = os.path.join(directory, f'api-{size}.db')
+        build_database(db_file, size)
+        app_module = _load_app(db_file)
+        client = app_module.app.test_client()
+
+        def get(path, status=200, headers=None):
+            response = client.get(path, headers=headers)
+            assert response.status_code == status, (path, response.status_code)
+            return response
+
+        def get_uncached(path):
+            app_module.response_cache.clear()
+            return get(path)
+
+        first_page_etag = get('/api/cars?limit=50').headers['ETag']
+
+        def walk_pages(path, pages=5):
+            cursor = None
+            for _ in range(pages):
+                body = get(path + (f"&cursor={cursor}" if cursor else "")).get_json()
+                cursor = body['next_cursor']
+                if cursor is None:
+                    break
+
+        queries = {
+            'api_cars_first_page': lambda: get('/api/cars?limit=50'),
+            'api_cars_first_page_uncached': lambda: get_uncached('/api/cars?limit=50'),
+            'api_cars_first_page_gzip': lambda: get('/api/cars?limit=50', headers={'Accept-Encoding': 'gzip'}),
+            'api_cars_first_page_not_modified': lambda: get('/api/cars?limit=50', 304, {'If-None-Match': first_page_etag}),
+            'api_cars_sorted_price': lambda: get('/api/cars?limit=50&sort=-price'),
+            'api_cars_filtered': lambda: get('/api/cars?limit=50&make=Honda&year_min=2015&price_max=20000'),
+            'api_cars_5_pages': lambda: walk_pages('/api/cars?limit=50&sort=mileage'),
+            'api_cars_export_ndjson': lambda: get('/api/cars/export?format=ndjson').get_data(),
+            'api_cars_export_npz': lambda: get('/api/cars/export?format=npz').get_data(),
+        }
+        for name, query in queries.items():
+            query()  # warm the page cache, the statement cache and the response cache
+            results.append(summarize(name, size, measure(query, repeat)))
+    return results
+
+def bench_digest(sizes, repeat, directory):
+    results = []
+    cars = synthetic_listings(100)
+    for car in cars:
+        car.analysis = "Priced below similar listings with average mileage for its age. " * 4
+    for count in (10, 100):
+        results.append(summarize('generate_digest', count, measure(lambda: generate_digest(cars[:count]), repeat), count))
+
+    for size in sizes:
+        db_file = os.path.join(directory, f'api-{size}.db')
+        if not os.path.exists(db_file):
+            build_database(db_file, size)
+        with closing(create_connection(db_file)) as conn:
+            results.append(summarize('rank_listings', size, measure(lambda: rank_listings(conn, 10), repeat), size))
+    return results
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(__file__)).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(current, baseline_file):
+    with open(baseline_file) as f:
+        baseline = {(r['name'], r['size']): r for r in json.load(f)['results']}
+    print(f"\nCompared with {baseline_file}:")
+    for result in current:
+        before = baseline.get((result['name'], result['size']))
+        if before:
+            ratio = result['median_seconds'] / before['median_seconds']
+            print(f"{result['name']:<32} size={result['size']:<8} {ratio:6.2f}x {'(slower)' if ratio > 1.1 else ''}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the synthetic-load benchmarks.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="Listing counts to benchmark.")
+    parser.add_argument('--page-cards', type=int, nargs='+', default=DEFAULT_PAGE_CARDS,
+                        help="Cards per synthetic results page.")
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT)
+    parser.add_argument('--only', nargs='+', choices=('extraction', 'ingest', 'api', 'digest'),
+                        help="Run only these benchmark groups.")
+    parser.add_argument('--browser', action='store_true', help="Also benchmark the script and elements extraction modes in Chrome.")
+    parser.add_argument('--output', default='benchmark-results.json', help="Where to write the JSON results.")
+    parser.add_argument('--compare', help="A previous results file to compare against.")
+    args = parser.parse_args(argv)
+
+    groups = args.only or ('extraction', 'ingest', 'api', 'digest')
+    results = []
+    with tempfile.TemporaryDirectory(prefix='car-finder-bench-') as directory:
+        if 'extraction' in groups:
+            results += bench_extraction(args.page_cards, args.repeat, args.browser)
+        if 'ingest' in groups:
+            results += bench_ingest(args.sizes, args.repeat, directory)
+        if 'api' in groups:
+            results += bench_api(args.sizes, args.repeat, directory)
+        if 'digest' in groups:
+            results += bench_digest(args.sizes, args.repeat, directory)
+
+    report = {
+        'commit': git_commit(),
+        'timestamp': int(time.time()),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'arguments': vars(args),
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nWrote {len(results)} results to {args.output}")
+    if args.compare:
+        compare(results, args.compare)
+
+if __name__ == '__main__':
+    main()
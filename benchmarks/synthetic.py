@@ -0,0 +1,101 @@
+import html
+import random
+from contextlib import closing
+
+from src.analysis.ranking import refresh_baselines
+from src.database.database import bulk_insert_listings, create_connection, create_table
+from src.listing import Listing
+
+MAKES_MODELS = {
+    'Toyota': ['Camry', 'Corolla', 'RAV4', 'Tacoma', 'Highlander'],
+    'Honda': ['Civic', 'Accord', 'CR-V', 'Pilot', 'Odyssey'],
+    'Ford': ['F-150', 'Mustang', 'Escape', 'Explorer', 'Focus'],
+    'Chevrolet': ['Silverado', 'Malibu', 'Equinox', 'Tahoe', 'Camaro'],
+    'Subaru': ['Outback', 'Forester', 'Impreza', 'Crosstour', 'WRX'],
+}
+DEALERS = [
+    "Honest John's Used Cars", "Crazy Carl's Car Emporium", "Speedy's Auto Sales", "Main Street Motors",
+    "Lakeside Auto Group", "Downtown Certified Pre-Owned", "Sunset Imports", "Valley Truck Center",
+]
+SCRAPED_TIMESTAMP = 1735689600
+
+def synthetic_listings(count, seed=0, start=0):
+    """
+    Generates realistic-looking listings.
+
+    Prices fall with age and mileage plus noise, so ranking has real deals to find.
+
+    Args:
+        count: Number of listings.
+        seed: Random seed; the same seed always gives the same listings.
+        start: First listing number, used to keep URLs unique across calls.
+
+    Returns:
+        A list of Listings as the scrapers produce them.
+    """
+    rng = random.Random(seed)
+    listings = []
+    for i in range(start, start + count):
+        make = rng.choice(list(MAKES_MODELS))
+        year = rng.randint(2008, 2024)
+        age = 2025 - year
+        mileage = max(0, int(rng.gauss(12000 * age, 4000 * age + 2000)))
+        price = max(1500, round(38000 * 0.88 ** age - 0.04 * mileage + rng.gauss(0, 2500), -1))
+        listings.append(Listing(
+            make=make,
+            model=rng.choice(MAKES_MODELS[make]),
+            year=year,
+            price=float(price),
+            mileage=mileage,
+            location=rng.choice(DEALERS),
+            url=f"https://example.com/details/{i}",
+        ))
+    return listings
+
+def vehicle_card_html(listing):
+    """Renders one listing as a `.vehicle-card`, matching backend/listings.html."""
+    return (
+        '    <div class="vehicle-card">\n'
+        f'        <h2 class="vehicle-card-title">{listing.year} {html.escape(listing.make)} {html.escape(listing.model)}</h2>\n'
+        f'        <p class="primary-price">${listing.price:,.0f}</p>\n'
+        f'        <div class="mileage">{listing.mileage:,} mi.</div>\n'
+        f'        <div class="dealer-name">{html.escape(listing.location)}</div>\n'
+        f'        <a href="{html.escape(listing.url)}">Details</a>\n'
+        '    </div>\n'
+    )
+
+def synthetic_results_page(cards, seed=0):
+    """
+    Generates a results page with `cards` vehicle cards.
+
+    Returns:
+        (html, listings) so extraction results can be checked against the source listings.
+    """
+    listings = synthetic_listings(cards, seed)
+    page = (
+        "<html>\n<head>\n    <title>Used Car Listings</title>\n</head>\n<body>\n    <h1>Used Car Listings</h1>\n"
+        + "".join(vehicle_card_html(listing) for listing in listings)
+        + "</body>\n</html>\n"
+    )
+    return page, listings
+
+def build_database(db_file, count, seed=0, chunk_size=10000):
+    """
+    Creates (or extends) a database with `count` synthetic listings, migrated to the current schema.
+
+    Returns:
+        The number of listings inserted.
+    """
+    inserted = 0
+    with closing(create_connection(db_file)) as conn:
+        create_table(conn)
+        start = conn.execute("SELECT COUNT(*) FROM listings").fetchone()[0]
+        for offset in range(0, count, chunk_size):
+            batch = synthetic_listings(min(chunk_size, count - offset), seed + offset, start + offset)
+            inserted += bulk_insert_listings(conn, batch, source_site='example.com',
+                                             scraped_timestamp=SCRAPED_TIMESTAMP)['inserted']
+        # Rebuild the ranking baselines from scratch, as a migrated database would have them.
+        with conn:
+            conn.execute("DELETE FROM price_baselines")
+        refresh_baselines(conn, 1)
+    return inserted
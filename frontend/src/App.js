@@ -1,15 +1,24 @@
 import React, { useState, useEffect } from 'react';
 import './App.css';
 
+const PAGE_SIZE = 50;
+
 function App() {
   const [cars, setCars] = useState([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
   const [scrapeMessage, setScrapeMessage] = useState('');
 
-  const fetchCars = () => {
+  const [nextCursor, setNextCursor] = useState(null);
+  const [newListings, setNewListings] = useState(0);
+
+  const fetchCars = (cursor = null) => {
     console.log('Fetching cars...');
-    fetch('/api/cars')
+    const params = new URLSearchParams({ limit: PAGE_SIZE });
+    if (cursor) {
+      params.set('cursor', cursor);
+    }
+    fetch(`/api/cars?${params.toString()}`)
       .then(response => {
         console.log('Received response:', response);
         if (!response.ok) {
@@ -26,7 +35,8 @@ function App() {
       })
       .then(data => {
         console.log('Received data:', data);
-        setCars(data);
+        setCars(previous => (cursor ? [...previous, ...data.cars] : data.cars));
+        setNextCursor(data.next_cursor);
         setLoading(false);
       })
       .catch(error => {
@@ -42,6 +52,34 @@ function App() {
 
   const [scrapeStatus, setScrapeStatus] = useState(null);
 
+  useEffect(() => {
+    // Progress is pushed over server-sent events, so the list is updated
+    // incrementally instead of polling and refetching the whole table.
+    const events = new EventSource('/api/events');
+    events.addEventListener('status', event => {
+      setScrapeStatus(JSON.parse(event.data));
+    });
+    // The list is keyset-paginated, so inserted cars aren't spliced into it;
+    // that could repeat or misorder rows on the next "Load more". They are
+    // counted instead, and shown once the user refreshes.
+    events.addEventListener('inserted', () => {
+      setNewListings(previous => previous + 1);
+    });
+    events.addEventListener('analyzed', event => {
+      const analyzed = JSON.parse(event.data);
+      setCars(previous => previous.map(car => (car.id === analyzed.id ? { ...car, analysis: analyzed.analysis } : car)));
+    });
+    events.onerror = error => {
+      console.error('Event stream error:', error);
+    };
+    return () => events.close();
+  }, []);
+
+  const handleRefresh = () => {
+    setNewListings(0);
+    fetchCars();
+  };
+
   const handleScrape = () => {
     setScrapeMessage('Scraping in progress...');
     fetch('/api/scrape', {
@@ -50,21 +88,6 @@ function App() {
       .then(response => response.json())
       .then(data => {
         setScrapeMessage(data.message);
-        const interval = setInterval(() => {
-          fetch('/api/scrape-status')
-            .then(response => response.json())
-            .then(statusData => {
-              setScrapeStatus(statusData);
-              if (statusData.status === 'completed' || statusData.status === 'failed') {
-                clearInterval(interval);
-                fetchCars();
-              }
-            })
-            .catch(error => {
-              console.error('Error fetching scrape status:', error);
-              clearInterval(interval);
-            });
-        }, 2000); // Poll every 2 seconds
       })
       .catch(error => {
         setScrapeMessage(`Scraping failed: ${error.message}`);
@@ -116,6 +139,14 @@ function App() {
         <button onClick={handleScrape}>Scrape Now</button>
         {scrapeMessage && <p>{scrapeMessage}</p>}
         {scrapeStatus && <p>Scrape Status: {scrapeStatus.status} - {scrapeStatus.message}</p>}
+        {scrapeStatus && scrapeStatus.status === 'running' && scrapeStatus.eta_seconds != null && (
+          <p>{scrapeStatus.listings_per_second} listings/sec, about {Math.ceil(scrapeStatus.eta_seconds)}s remaining</p>
+        )}
+        {newListings > 0 && (
+          <p>
+            {newListings} new listings. <button onClick={handleRefresh}>Refresh</button>
+          </p>
+        )}
         <div className="car-list">
           {cars.map(car => (
             <div key={car.id} className="car-item">
@@ -123,6 +154,7 @@ function App() {
               <p>Price: ${car.price}</p>
               <p>Mileage: {car.mileage} miles</p>
               <p>Location: {car.location}</p>
+              {car.analysis && <p>Analysis: {car.analysis}</p>}
               <p><a href={car.url} target="_blank" rel="noopener noreferrer">View Listing</a></p>
               <div>
                 <button onClick={() => handleFeedback(car.id, 'like')}>Like</button>
@@ -131,6 +163,7 @@ function App() {
             </div>
           ))}
         </div>
+        {nextCursor && <button onClick={() => fetchCars(nextCursor)}>Load more</button>}
       </header>
     </div>
   );
@@ -0,0 +1,71 @@
+"""
+Scheduled pipeline run (see cronjob.yaml): scrape the configured result pages,
+then mail the digest.
+
+    python3 main.py --model mistral
+    python3 main.py --profile-startup
+
+Both steps run as jobs on the backend's job queue in this process, so a run is
+recorded like a scrape started from the UI and shows up in /api/scrape-status.
+"""
+import argparse
+import logging
+import os
+import sys
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend')
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Scrape new listings and send the daily digest.")
+    parser.add_argument('--model', help="Analyze new listings and the digest with this model (e.g. mistral, gemini).")
+    parser.add_argument('--sources', nargs='+',
+                        help="Sites to scrape (see src/scraper/sources.py); defaults to SCRAPE_SOURCES.")
+    parser.add_argument('--urls', nargs='+', help="Result pages to scrape for a single source; defaults to its own.")
+    parser.add_argument('--full', action='store_true', help="Re-extract every card instead of only new or changed ones.")
+    parser.add_argument('--recipients', nargs='+', default=os.environ.get('DIGEST_RECIPIENTS', '').split(','),
+                        help="Digest recipients; defaults to DIGEST_RECIPIENTS. No recipients skips the digest.")
+    parser.add_argument('--top', type=int, help="Number of listings in the digest.")
+    parser.add_argument('--profile-startup', action='store_true',
+                        help="Print the import-time breakdown of starting a run, then exit.")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    sys.path.insert(0, BACKEND_DIR)
+    if args.profile_startup:
+        from src.startup import profile_startup
+        profile_startup(['app'], path=[BACKEND_DIR])
+        return 0
+
+    import app
+    from src.jobs.job_queue import DuplicateJob
+
+    app.init_db()
+    try:
+        plan = app.sources.resolve_plan(args.sources, args.urls)
+    except ValueError as e:
+        logging.error(e)
+        return 2
+    recipients = [recipient for recipient in args.recipients if recipient]
+    steps = [('scrape', {'sources': plan, 'model': args.model, 'incremental': not args.full},
+              app.scrape_dedup_key(plan))]
+    if recipients:
+        steps.append(('digest', {'recipients': recipients, 'model': args.model, 'top': args.top},
+                      f"digest:{','.join(sorted(recipients))}"))
+
+    failed = False
+    for kind, params, dedup_key in steps:
+        try:
+            job_id = app.job_queue.enqueue(kind, params, dedup_key=dedup_key)
+        except DuplicateJob as e:
+            logging.warning(f"A {kind} job ({e.job_id}) is already active; skipping.")
+            continue
+        for finished_id, status in app.job_workers.run_pending():
+            job = app.job_queue.get(finished_id)
+            logging.info(f"Job {finished_id} ({job['kind']}) {status}: {job['message']}")
+            failed = failed or (finished_id == job_id and status != 'completed')
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
@@ -0,0 +1,170 @@
+import collections
+import concurrent.futures
+import contextvars
+import logging
+import os
+import random
+import threading
+import time
+
+import requests
+
+from src.analysis.ollama_analyzer import generate_analysis_ollama as generate_with_ollama
+from src.lazy import lazy_import
+
+# Importing the Gemini backend loads google.generativeai, so Ollama-only batches
+# never do; the model name is read from the same variable gemini_analyzer uses.
+gemini_analyzer = lazy_import('src.analysis.gemini_analyzer')
+GEMINI_MODEL_NAME = os.getenv("GEMINI_MODEL", 'gemini-pro')
+
+# Maximum number of in-flight LLM requests per backend. Ollama serves one GPU,
+# so it gets far fewer slots than the hosted Gemini API.
+DEFAULT_CONCURRENCY = {
+    'ollama': int(os.environ.get("OLLAMA_CONCURRENCY", 2)),
+    'gemini': int(os.environ.get("GEMINI_CONCURRENCY", 8)),
+}
+RETRYABLE_STATUS_CODES = (429, 500, 502, 503, 504)
+DEFAULT_MAX_RETRIES = 4
+DEFAULT_BACKOFF_SECONDS = 1.0
+MAX_BACKOFF_SECONDS = 60.0
+
+AnalysisResult = collections.namedtuple('AnalysisResult', ['index', 'car', 'analysis', 'error', 'attempts'])
+
+def backend_for_model(model: str) -> str:
+    """Maps a model name to the backend that serves it."""
+    return 'gemini' if model in ('gemini', GEMINI_MODEL_NAME) else 'ollama'
+
+def _status_code(error):
+    response = getattr(error, 'response', None)
+    status = getattr(response, 'status_code', None)
+    if status is None:
+        # google.api_core exceptions carry the HTTP status as `code`.
+        code = getattr(error, 'code', None)
+        status = code if isinstance(code, int) else None
+    return status
+
+def _retry_after(error):
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None) or {}
+    try:
+        return float(headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return None
+
+def is_retryable(error) -> bool:
+    """Whether an LLM call failure is transient (rate limit, overload, dropped connection)."""
+    if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+        return True
+    return _status_code(error) in RETRYABLE_STATUS_CODES
+
+class BatchAnalyzer:
+    """
+    Runs many listings through an LLM backend on a bounded worker pool.
+
+    At most `concurrency` requests are in flight and at most `2 * concurrency`
+    listings are pulled from the input iterable ahead of the consumer, so a slow
+    backend throttles the producer instead of queueing unbounded work.
+    Rate-limited and transient failures are retried with exponential backoff,
+    honouring `Retry-After` when the server sends one.
+    """
+
+    def __init__(self, model: str, concurrency: int = None, max_retries: int = DEFAULT_MAX_RETRIES,
+                 backoff_seconds: float = DEFAULT_BACKOFF_SECONDS, cache=None, generate=None):
+        self.model = model
+        self.backend = backend_for_model(model)
+        self.concurrency = concurrency or DEFAULT_CONCURRENCY[self.backend]
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.cache = cache
+        self._generate = generate or self._default_generate
+        self._window = threading.BoundedSemaphore(self.concurrency * 2)
+
+    def _default_generate(self, car_data):
+        if self.backend == 'gemini':
+            return gemini_analyzer.generate_analysis(car_data)
+        return generate_with_ollama(car_data, self.model)
+
+    def _cache_model_name(self):
+        return GEMINI_MODEL_NAME if self.backend == 'gemini' else self.model
+
+    def _call_with_retries(self, car_data):
+        attempts = 0
+        while True:
+            attempts += 1
+            try:
+                return self._generate(car_data), attempts
+            except Exception as e:
+                if attempts > self.max_retries or not is_retryable(e):
+                    raise
+                delay = _retry_after(e)
+                if delay is None:
+                    delay = min(MAX_BACKOFF_SECONDS, self.backoff_seconds * 2 ** (attempts - 1))
+                    delay *= random.uniform(0.5, 1.0)
+                logging.warning(f"{self.backend} request failed ({e}); retry {attempts}/{self.max_retries} in {delay:.1f}s")
+                time.sleep(delay)
+
+    def _analyze_one(self, index, car_data):
+        attempts = 0
+        try:
+            if self.cache is not None:
+                def compute():
+                    nonlocal attempts
+                    analysis, attempts = self._call_with_retries(car_data)
+                    return analysis
+                analysis = self.cache.get_or_compute(car_data, self._cache_model_name(), compute)
+            else:
+                analysis, attempts = self._call_with_retries(car_data)
+            return AnalysisResult(index, car_data, analysis, None, attempts)
+        except Exception as e:
+            logging.error(f"Analysis failed for listing {index}: {e}")
+            return AnalysisResult(index, car_data, None, e, attempts)
+        finally:
+            self._window.release()
+
+    def analyze(self, cars, ordered: bool = True):
+        """
+        Analyzes an iterable of prompt-input dicts.
+
+        Args:
+            cars: Iterable of car data dictionaries (see `build_car_prompt`).
+            ordered: Yield results in input order if True, else as they complete.
+
+        Yields:
+            An AnalysisResult per listing. Failed listings carry the exception in
+            `error` and `None` as the analysis.
+        """
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.concurrency,
+                                                   thread_name_prefix=f"{self.backend}-analysis") as executor:
+            pending = collections.deque() if ordered else set()
+            for index, car_data in enumerate(cars):
+                # Blocks once the in-flight window is full; drain finished work meanwhile.
+                while not self._window.acquire(timeout=0.05):
+                    yield from self._drain(pending, ordered, block=False)
+                # Run in a copy of the caller's context so timings reach its job report.
+                future = executor.submit(contextvars.copy_context().run, self._analyze_one, index, car_data)
+                if ordered:
+                    pending.append(future)
+                else:
+                    pending.add(future)
+                yield from self._drain(pending, ordered, block=False)
+            while pending:
+                yield from self._drain(pending, ordered, block=True)
+
+    @staticmethod
+    def _drain(pending, ordered, block):
+        if ordered:
+            while pending and (pending[0].done() or block):
+                yield pending.popleft().result()
+                block = False
+            return
+        if not pending:
+            return
+        done, _ = concurrent.futures.wait(
+            pending, timeout=None if block else 0, return_when=concurrent.futures.FIRST_COMPLETED)
+        for future in done:
+            pending.discard(future)
+            yield future.result()
+
+    def analyze_all(self, cars):
+        """Analyzes every listing and returns the results in input order."""
+        return list(self.analyze(cars, ordered=True))
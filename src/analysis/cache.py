@@ -0,0 +1,140 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from src.analysis.prompts import PROMPT_VERSION, normalize_prompt_inputs
+from src.database.connections import connection
+
+DEFAULT_TTL_SECONDS = 30 * 24 * 60 * 60
+DEFAULT_MAX_ENTRIES = 50000
+DEFAULT_MEMORY_ENTRIES = 1024
+EVICT_EVERY_N_PUTS = 100
+
+def analysis_cache_key(car_data: dict, model: str, prompt_version: int = PROMPT_VERSION) -> str:
+    """
+    Computes the content address of an analysis.
+
+    Args:
+        car_data: A dictionary containing car data.
+        model: The name of the model producing the analysis.
+        prompt_version: The version of the prompt template.
+
+    Returns:
+        A hex SHA-256 digest of the normalized prompt inputs, model and prompt version.
+    """
+    payload = json.dumps({
+        'inputs': normalize_prompt_inputs(car_data),
+        'model': model,
+        'prompt_version': prompt_version,
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class AnalysisCache:
+    """
+    Two-tier cache of LLM analyses: an in-process LRU in front of the
+    `analyses` table. Entries expire after `ttl` seconds and the table is
+    trimmed to `max_entries` by least-recent access.
+    """
+
+    def __init__(self, db_file, ttl=DEFAULT_TTL_SECONDS, max_entries=DEFAULT_MAX_ENTRIES,
+                 memory_entries=DEFAULT_MEMORY_ENTRIES):
+        self.db_file = db_file
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._puts = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _remember(self, key, analysis, created_at):
+        with self._lock:
+            self._memory[key] = (analysis, created_at)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def get(self, key):
+        """Returns the cached analysis for `key`, or None on a miss."""
+        now = int(time.time())
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if now - entry[1] < self.ttl:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                del self._memory[key]
+
+        with connection(self.db_file) as conn:
+            row = conn.execute(
+                "SELECT analysis, created_at FROM analyses WHERE cache_key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] >= self.ttl:
+                with self._lock:
+                    self.misses += 1
+                return None
+            with conn:
+                conn.execute("UPDATE analyses SET last_accessed = ? WHERE cache_key = ?", (now, key))
+
+        self._remember(key, row[0], row[1])
+        with self._lock:
+            self.hits += 1
+        return row[0]
+
+    def put(self, key, model, analysis, prompt_version=PROMPT_VERSION):
+        """Stores an analysis in both tiers."""
+        now = int(time.time())
+        with connection(self.db_file) as conn:
+            with conn:
+                conn.execute(
+                    """ INSERT OR REPLACE INTO analyses(cache_key, model, prompt_version, analysis, created_at, last_accessed)
+                        VALUES(?,?,?,?,?,?) """,
+                    (key, model, prompt_version, analysis, now, now)
+                )
+        self._remember(key, analysis, now)
+
+        with self._lock:
+            self._puts += 1
+            should_evict = self._puts % EVICT_EVERY_N_PUTS == 0
+        if should_evict:
+            self.evict()
+
+    def evict(self):
+        """Deletes expired rows and trims the table to `max_entries` by least-recent access."""
+        cutoff = int(time.time()) - self.ttl
+        with connection(self.db_file) as conn:
+            with conn:
+                expired = conn.execute("DELETE FROM analyses WHERE created_at < ?", (cutoff,)).rowcount
+                trimmed = conn.execute(
+                    """ DELETE FROM analyses WHERE cache_key IN (
+                            SELECT cache_key FROM analyses ORDER BY last_accessed DESC LIMIT -1 OFFSET ?
+                        ) """,
+                    (self.max_entries,)
+                ).rowcount
+        if expired or trimmed:
+            logging.info(f"Analysis cache evicted {expired} expired and {trimmed} least-recently-used entries.")
+
+    def get_or_compute(self, car_data: dict, model: str, compute):
+        """
+        Returns the cached analysis for a listing, calling `compute()` only on a miss.
+
+        Args:
+            car_data: The prompt inputs for the listing.
+            model: The name of the model producing the analysis.
+            compute: Zero-argument callable running the LLM. Exceptions propagate
+                and nothing is cached.
+
+        Returns:
+            The analysis text.
+        """
+        key = analysis_cache_key(car_data, model)
+        analysis = self.get(key)
+        if analysis is None:
+            analysis = compute()
+            self.put(key, model, analysis)
+        return analysis
@@ -1,9 +1,59 @@
+import json
+import logging
 import os
+import threading
+import time
 import google.generativeai as genai
+from src.analysis.prompts import build_batch_prompt, build_car_prompt
+from src.metrics import count, timer
 
-def analyze_car_data(car_data: dict) -> str:
+GEMINI_MODEL_NAME = os.getenv("GEMINI_MODEL", 'gemini-pro')
+DEFAULT_BATCH_SIZE = int(os.getenv("GEMINI_BATCH_SIZE", 10))
+# A failed batched request (e.g. 429 or quota exceeded) is retried as a whole,
+# waiting BATCH_BACKOFF_SECONDS, then twice that, and so on.
+BATCH_MAX_RETRIES = int(os.getenv("GEMINI_BATCH_RETRIES", 3))
+BATCH_BACKOFF_SECONDS = float(os.getenv("GEMINI_BATCH_BACKOFF", 2.0))
+
+BATCH_RESPONSE_SCHEMA = {
+    "type": "ARRAY",
+    "items": {
+        "type": "OBJECT",
+        "properties": {
+            "id": {"type": "INTEGER"},
+            "analysis": {"type": "STRING"},
+        },
+        "required": ["id", "analysis"],
+    },
+}
+
+_model = None
+_model_lock = threading.Lock()
+
+def get_model():
     """
-    Analyzes car data using the Gemini API.
+    Returns the process-wide Gemini model, configuring the API key on first use.
+
+    Returns:
+        A configured `genai.GenerativeModel`.
+    """
+    global _model
+    with _model_lock:
+        if _model is None:
+            api_key = os.getenv("GEMINI_API_KEY")
+            if not api_key:
+                raise ValueError("GEMINI_API_KEY environment variable not set.")
+            endpoint = os.getenv("GEMINI_API_ENDPOINT")
+            if endpoint:
+                # e.g. a local stand-in server (benchmarks/llm_standin.py), reached over REST.
+                genai.configure(api_key=api_key, transport='rest', client_options={'api_endpoint': endpoint})
+            else:
+                genai.configure(api_key=api_key)
+            _model = genai.GenerativeModel(GEMINI_MODEL_NAME)
+        return _model
+
+def generate_analysis(car_data: dict) -> str:
+    """
+    Analyzes car data using the Gemini API, raising on failure.
 
     Args:
         car_data: A dictionary containing car data.
@@ -11,33 +61,148 @@ def analyze_car_data(car_data: dict) -> str:
     Returns:
         A string containing the analysis of the car data.
     """
-    api_key = os.getenv("GEMINI_API_KEY")
-    if not api_key:
-        raise ValueError("GEMINI_API_KEY environment variable not set.")
+    model = get_model()
+    try:
+        with timer('llm_request', backend='gemini'):
+            response = model.generate_content(build_car_prompt(car_data))
+            text = response.text
+    except Exception:
+        count('car_finder_llm_requests_total', backend='gemini', outcome='error')
+        raise
+    count('car_finder_llm_requests_total', backend='gemini', outcome='ok')
+    return text
+
+def parse_batch_response(text: str, expected: int) -> dict:
+    """
+    Splits a batched JSON response into per-listing analyses.
+
+    Args:
+        text: The raw response text.
+        expected: The number of listings in the request.
+
+    Returns:
+        A dictionary mapping 0-based listing position to analysis text. Listings
+        missing from or malformed in the response are absent.
+
+    Raises:
+        ValueError: If the response isn't a JSON array at all.
+    """
+    text = text.strip()
+    if text.startswith("```"):
+        # Tolerate a fenced code block around the JSON.
+        text = text.strip("`")
+        text = text[text.find("["):]
+    try:
+        entries = json.loads(text)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Batched response is not valid JSON: {e}") from None
+    if not isinstance(entries, list):
+        raise ValueError(f"Batched response is a JSON {type(entries).__name__}, not an array.")
+
+    analyses = {}
+    for entry in entries:
+        if not isinstance(entry, dict):
+            continue
+        listing_id, analysis = entry.get("id"), entry.get("analysis")
+        if isinstance(listing_id, int) and 1 <= listing_id <= expected and isinstance(analysis, str) and analysis.strip():
+            analyses[listing_id - 1] = analysis.strip()
+    return analyses
+
+def generate_analyses_batch(cars: list[dict], batch_size: int = DEFAULT_BATCH_SIZE) -> list:
+    """
+    Analyzes many listings by packing `batch_size` of them into each Gemini request.
 
-    genai.configure(api_key=api_key)
-    model = genai.GenerativeModel('gemini-pro')
+    A batch whose request fails, or whose response isn't a JSON array, is
+    retried whole with exponential backoff, since falling back to one request
+    per listing would only make rate limiting worse; if it never succeeds, its
+    listings get the last error. Entries missing from or malformed in a parsed
+    response are retried as single-listing requests.
 
-    prompt = f"""
-    Analyze the following car listing and provide a summary of its pros and cons.
-    Be concise and to the point.
+    Args:
+        cars: A list of car data dictionaries.
+        batch_size: The number of listings per request.
+
+    Returns:
+        A list aligned with `cars` holding either the analysis text or the
+        exception raised while analyzing that listing.
+    """
+    model = get_model()
+    generation_config = genai.GenerationConfig(
+        response_mime_type="application/json",
+        response_schema=BATCH_RESPONSE_SCHEMA,
+    )
+    results = [None] * len(cars)
+    request_count = 0
+
+    for start in range(0, len(cars), batch_size):
+        chunk = cars[start:start + batch_size]
+        analyses = {}
+        if len(chunk) > 1:
+            for attempt in range(1, BATCH_MAX_RETRIES + 2):
+                try:
+                    request_count += 1
+                    with timer('llm_request', backend='gemini_batch'):
+                        response = model.generate_content(build_batch_prompt(chunk), generation_config=generation_config)
+                        analyses = parse_batch_response(response.text, len(chunk))
+                    count('car_finder_llm_requests_total', backend='gemini_batch', outcome='ok')
+                    break
+                except Exception as e:
+                    count('car_finder_llm_requests_total', backend='gemini_batch', outcome='error')
+                    logging.warning(f"Batched Gemini request for {len(chunk)} listings failed "
+                                    f"(attempt {attempt}): {e}")
+                    if attempt > BATCH_MAX_RETRIES:
+                        results[start:start + len(chunk)] = [e] * len(chunk)
+                        break
+                    time.sleep(BATCH_BACKOFF_SECONDS * 2 ** (attempt - 1))
+
+        for offset, car_data in enumerate(chunk):
+            if results[start + offset] is not None:
+                continue
+            if offset in analyses:
+                results[start + offset] = analyses[offset]
+                continue
+            try:
+                request_count += 1
+                results[start + offset] = generate_analysis(car_data)
+            except Exception as e:
+                results[start + offset] = e
 
-    **Car Data:**
-    - Title: {car_data.get('title')}
-    - Price: {car_data.get('price')}
-    - Mileage: {car_data.get('mileage')}
-    - Location: {car_data.get('location')}
-    - Link: {car_data.get('link')}
+    logging.info(f"Analyzed {len(cars)} listings with {request_count} Gemini requests.")
+    return results
 
-    **Analysis:**
+def analyze_car_data(car_data: dict) -> str:
     """
+    Analyzes car data using the Gemini API.
+
+    Args:
+        car_data: A dictionary containing car data.
 
+    Returns:
+        A string containing the analysis of the car data.
+    """
     try:
-        response = model.generate_content(prompt)
-        return response.text
+        return generate_analysis(car_data)
+    except ValueError:
+        raise
     except Exception as e:
         return f"An error occurred during analysis: {e}"
 
+def analyze_car_data_batch(cars: list[dict], batch_size: int = DEFAULT_BATCH_SIZE) -> list[str]:
+    """
+    Analyzes many listings with batched Gemini requests.
+
+    Args:
+        cars: A list of car data dictionaries.
+        batch_size: The number of listings per request.
+
+    Returns:
+        A list of analysis strings aligned with `cars`.
+    """
+    return [
+        f"An error occurred during analysis: {result}" if isinstance(result, Exception) else result
+        for result in generate_analyses_batch(cars, batch_size)
+    ]
+
 if __name__ == '__main__':
     # Example usage
     sample_car_data = {
@@ -47,11 +212,11 @@ if __name__ == '__main__':
         'location': 'Los Angeles, CA',
         'link': 'https://example.com/car123'
     }
-    
+
     # To run this example, you need to set the GEMINI_API_KEY environment variable.
     # For example, in your terminal:
     # export GEMINI_API_KEY='your_api_key'
-    
+
     if os.getenv("GEMINI_API_KEY"):
         analysis = analyze_car_data(sample_car_data)
         print(analysis)
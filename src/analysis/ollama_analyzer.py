@@ -1,15 +1,11 @@
-import os
-import requests
-import json
 import logging
-import subprocess
 
-import time
+from src.analysis.ollama_client import get_client
+from src.analysis.prompts import build_car_prompt
 
-def analyze_car_data_ollama(car_data: dict, model: str) -> str:
-    time.sleep(5)
+def generate_analysis_ollama(car_data: dict, model: str) -> str:
     """
-    Analyzes car data using a self-hosted Ollama model.
+    Analyzes car data using a self-hosted Ollama model, raising on failure.
 
     Args:
         car_data: A dictionary containing car data.
@@ -18,56 +14,24 @@ def analyze_car_data_ollama(car_data: dict, model: str) -> str:
     Returns:
         A string containing the analysis of the car data.
     """
-    ollama_api_url = os.environ.get("OLLAMA_API_URL", "http://ollama.ollama.svc.cluster.local:11434/api/generate")
-    prompt = f"""
-    Analyze the following car listing and provide a summary of its pros and cons.
-    Be concise and to the point.
+    result = get_client().generate(model, build_car_prompt(car_data))
+    logging.info(f"Ollama analysis with {model}: load {result['load']:.2f}s, "
+                 f"ttft {result['ttft'] or 0:.2f}s, total {result['total']:.2f}s")
+    return result["response"]
 
-    **Car Data:**
-    - Title: {car_data.get('title')}
-    - Price: {car_data.get('price')}
-    - Mileage: {car_data.get('mileage')}
-    - Location: {car_data.get('location')}
-    - Link: {car_data.get('link')}
-
-    **Analysis:**
+def analyze_car_data_ollama(car_data: dict, model: str) -> str:
     """
+    Analyzes car data using a self-hosted Ollama model.
 
-    try:
-        logging.info(f"Ollama API URL: {ollama_api_url}")
-        request_data = {
-            "model": model,
-            "prompt": prompt,
-            "stream": True
-        }
-        logging.info(f"Request Data: {json.dumps(request_data)}")
-        headers = {"Content-Type": "application/json"}
-        logging.info(f"Request Headers: {headers}")
-
-        time.sleep(10)
-        with requests.Session() as session:
-            response = session.post(
-                ollama_api_url,
-                data=json.dumps(request_data),
-                headers=headers
-            )
-            if response.status_code != 200:
-                logging.error(f"Ollama API returned status code {response.status_code}")
-                logging.error(f"Response headers: {response.headers}")
-                logging.error(f"Response content: {response.content}")
-            response.raise_for_status()
-
-            full_response = []
-            for line in response.iter_lines():
-                if line:
-                    try:
-                        json_line = json.loads(line)
-                        full_response.append(json_line.get("response", ""))
-                    except json.JSONDecodeError:
-                        # Ignore lines that are not valid JSON
-                        pass
-            return "".join(full_response)
+    Args:
+        car_data: A dictionary containing car data.
+        model: The name of the Ollama model to use.
 
+    Returns:
+        A string containing the analysis of the car data.
+    """
+    try:
+        return generate_analysis_ollama(car_data, model)
     except Exception as e:
         return f"An unexpected error occurred during analysis: {e}"
 
@@ -0,0 +1,148 @@
+import json
+import logging
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from src.metrics import count, observe_stage
+
+DEFAULT_OLLAMA_API_URL = "http://ollama.ollama.svc.cluster.local:11434/api/generate"
+DEFAULT_POOL_SIZE = int(os.environ.get("OLLAMA_POOL_SIZE", 8))
+DEFAULT_CONNECT_TIMEOUT = float(os.environ.get("OLLAMA_CONNECT_TIMEOUT", 5))
+DEFAULT_READ_TIMEOUT = float(os.environ.get("OLLAMA_READ_TIMEOUT", 300))
+# How long Ollama keeps the model resident after the last request.
+DEFAULT_KEEP_ALIVE = os.environ.get("OLLAMA_KEEP_ALIVE", "30m")
+
+NANOSECONDS = 1e9
+
+def ollama_base_url(api_url: str = None) -> str:
+    """Derives the server base URL from OLLAMA_API_URL, which points at /api/generate."""
+    api_url = api_url or os.environ.get("OLLAMA_API_URL", DEFAULT_OLLAMA_API_URL)
+    api_url = api_url.rstrip('/')
+    if api_url.endswith('/api/generate'):
+        api_url = api_url[:-len('/api/generate')]
+    return api_url
+
+class OllamaClient:
+    """
+    Long-lived Ollama HTTP client.
+
+    Reuses pooled keep-alive connections across calls, sends `keep_alive` so
+    the model stays loaded between analyses, and reports model load time
+    separately from time-to-first-token.
+    """
+
+    def __init__(self, base_url: str = None, pool_size: int = DEFAULT_POOL_SIZE,
+                 connect_timeout: float = DEFAULT_CONNECT_TIMEOUT, read_timeout: float = DEFAULT_READ_TIMEOUT,
+                 keep_alive: str = DEFAULT_KEEP_ALIVE):
+        self.base_url = ollama_base_url(base_url)
+        self.timeout = (connect_timeout, read_timeout)
+        self.keep_alive = keep_alive
+        self.session = requests.Session()
+        self.session.headers.update({"Content-Type": "application/json"})
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _post_generate(self, payload: dict, stream: bool):
+        response = self.session.post(
+            f"{self.base_url}/api/generate",
+            data=json.dumps(payload),
+            timeout=self.timeout,
+            stream=stream
+        )
+        if response.status_code != 200:
+            logging.error(f"Ollama API returned status code {response.status_code}")
+            logging.error(f"Response content: {response.content}")
+        response.raise_for_status()
+        return response
+
+    def generate(self, model: str, prompt: str, **options) -> dict:
+        """
+        Runs a streaming generation.
+
+        Args:
+            model: The name of the Ollama model to use.
+            prompt: The prompt text.
+            **options: Extra fields for the /api/generate request body.
+
+        Returns:
+            A dictionary with the generated `response` text and timings in seconds:
+            `ttft` (request start to first token, measured client-side), `total`,
+            and `load` (model load time reported by Ollama; near zero when warm).
+        """
+        payload = {"model": model, "prompt": prompt, "stream": True, "keep_alive": self.keep_alive}
+        payload.update(options)
+
+        start = time.perf_counter()
+        ttft = None
+        chunks = []
+        final = {}
+        try:
+            with self._post_generate(payload, stream=True) as response:
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    try:
+                        json_line = json.loads(line)
+                    except json.JSONDecodeError:
+                        # Ignore lines that are not valid JSON
+                        continue
+                    if "error" in json_line:
+                        raise RuntimeError(f"Ollama error: {json_line['error']}")
+                    token = json_line.get("response", "")
+                    if token and ttft is None:
+                        ttft = time.perf_counter() - start
+                    chunks.append(token)
+                    if json_line.get("done"):
+                        final = json_line
+        except Exception:
+            count('car_finder_llm_requests_total', backend='ollama', outcome='error')
+            raise
+
+        result = {
+            "response": "".join(chunks),
+            "ttft": ttft,
+            "total": time.perf_counter() - start,
+            "load": final.get("load_duration", 0) / NANOSECONDS,
+            "eval_count": final.get("eval_count"),
+        }
+        count('car_finder_llm_requests_total', backend='ollama', outcome='ok')
+        if ttft is not None:
+            observe_stage('llm_ttft', ttft, backend='ollama')
+        observe_stage('llm_request', result['total'], backend='ollama')
+        return result
+
+    def warm_up(self, model: str) -> dict:
+        """
+        Loads `model` into memory without generating, so the first real request is warm.
+
+        Returns:
+            A dictionary with `load` (Ollama-reported load time) and `total` seconds.
+        """
+        start = time.perf_counter()
+        response = self._post_generate({"model": model, "keep_alive": self.keep_alive, "stream": False}, stream=False)
+        body = response.json()
+        timings = {
+            "load": body.get("load_duration", 0) / NANOSECONDS,
+            "total": time.perf_counter() - start,
+        }
+        logging.info(f"Warmed up Ollama model {model}: load {timings['load']:.2f}s, total {timings['total']:.2f}s")
+        return timings
+
+    def close(self):
+        self.session.close()
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_client() -> OllamaClient:
+    """Returns the process-wide OllamaClient, creating it on first use."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = OllamaClient()
+        return _client
@@ -0,0 +1,77 @@
+# Bump PROMPT_VERSION whenever the prompt text changes so cached analyses
+# produced by the old prompt are no longer reused.
+PROMPT_VERSION = 1
+
+PROMPT_FIELDS = ('title', 'price', 'mileage', 'location', 'link')
+
+def normalize_prompt_inputs(car_data: dict) -> dict:
+    """
+    Extracts the fields that feed the analysis prompt, with whitespace normalized.
+
+    Args:
+        car_data: A dictionary containing car data.
+
+    Returns:
+        A dictionary with one string entry per prompt field.
+    """
+    normalized = {}
+    for field in PROMPT_FIELDS:
+        value = car_data.get(field)
+        normalized[field] = " ".join(str(value).split()) if value is not None else None
+    return normalized
+
+def build_batch_prompt(cars: list[dict]) -> str:
+    """
+    Builds a prompt that asks for one analysis per listing in a single request.
+
+    Args:
+        cars: A list of car data dictionaries. Each is numbered from 1 in the prompt.
+
+    Returns:
+        The prompt text. The model is asked to answer with a JSON array of
+        {"id": <number>, "analysis": <text>} objects.
+    """
+    listings = "\n".join(
+        f"""
+    Listing {i}:
+    - Title: {car.get('title')}
+    - Price: {car.get('price')}
+    - Mileage: {car.get('mileage')}
+    - Location: {car.get('location')}
+    - Link: {car.get('link')}"""
+        for i, car in enumerate(cars, start=1)
+    )
+    return f"""
+    Analyze each of the following car listings and provide a summary of its pros and cons.
+    Be concise and to the point.
+
+    Respond with a JSON array containing exactly one object per listing, of the form
+    {{"id": <listing number>, "analysis": "<pros and cons>"}}.
+
+    **Car Data:**
+    {listings}
+    """
+
+def build_car_prompt(car_data: dict) -> str:
+    """
+    Builds the single-listing analysis prompt shared by all analyzers.
+
+    Args:
+        car_data: A dictionary containing car data.
+
+    Returns:
+        The prompt text.
+    """
+    return f"""
+    Analyze the following car listing and provide a summary of its pros and cons.
+    Be concise and to the point.
+
+    **Car Data:**
+    - Title: {car_data.get('title')}
+    - Price: {car_data.get('price')}
+    - Mileage: {car_data.get('mileage')}
+    - Location: {car_data.get('location')}
+    - Link: {car_data.get('link')}
+
+    **Analysis:**
+    """
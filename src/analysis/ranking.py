@@ -0,0 +1,154 @@
+import collections
+import logging
+
+import numpy as np
+
+DEFAULT_TOP_N = 10
+# Groups with fewer canonical listings than this have no trustworthy baseline
+# and are left out of the ranking.
+MIN_BASELINE_LISTINGS = 3
+# Floor on the mileage-adjusted expected price, as a fraction of the group mean,
+# so a steep slope can't push it to zero for high-mileage cars.
+MIN_EXPECTED_FRACTION = 0.2
+
+RankedListing = collections.namedtuple('RankedListing', ['id', 'score', 'expected_price'])
+
+# Per-(make, model, year) sufficient statistics over canonical listings. An
+# ingest folds its new rows in with one grouped upsert; price changes on known
+# listings are applied by the listings_observe_change trigger.
+REFRESH_BASELINES_SQL = """
+    INSERT INTO price_baselines(make, model, year, n, price_sum, mileage_n, mileage_price_sum,
+                                mileage_sum, mileage_sq_sum, price_mileage_sum)
+    SELECT make, model, year, COUNT(*), SUM(price), COUNT(mileage),
+           TOTAL(CASE WHEN mileage IS NOT NULL THEN price END),
+           TOTAL(mileage), TOTAL(mileage * mileage), TOTAL(mileage * price)
+    FROM listings
+    WHERE id >= ? AND canonical_id IS NULL
+    GROUP BY make, model, year
+    ON CONFLICT(make, model, year) DO UPDATE SET
+        n = n + excluded.n,
+        price_sum = price_sum + excluded.price_sum,
+        mileage_n = mileage_n + excluded.mileage_n,
+        mileage_price_sum = mileage_price_sum + excluded.mileage_price_sum,
+        mileage_sum = mileage_sum + excluded.mileage_sum,
+        mileage_sq_sum = mileage_sq_sum + excluded.mileage_sq_sum,
+        price_mileage_sum = price_mileage_sum + excluded.price_mileage_sum
+"""
+
+SCORING_COLUMNS_SQL = """
+    SELECT l.id, l.price, l.mileage, b.n, b.price_sum, b.mileage_n, b.mileage_price_sum,
+           b.mileage_sum, b.mileage_sq_sum, b.price_mileage_sum
+    FROM listings l
+    JOIN price_baselines b ON b.make = l.make AND b.model = l.model AND b.year = l.year
+    WHERE l.canonical_id IS NULL AND b.n >= ?
+"""
+
+def refresh_baselines(conn, first_id):
+    """
+    Folds newly ingested listings into the price baselines.
+
+    Call once per ingest, after duplicates have been linked, so each physical
+    car is counted once.
+
+    Args:
+        conn: The database connection.
+        first_id: The first listing id inserted by this ingest.
+    """
+    with conn:
+        conn.execute(REFRESH_BASELINES_SQL, (first_id,))
+
+def load_scoring_columns(conn, scraped_after=None, seen_after=None):
+    """
+    Loads canonical listings and their group baselines column-wise.
+
+    Args:
+        conn: The database connection.
+        scraped_after: Only load listings scraped at or after this epoch.
+        seen_after: Only load listings last seen at or after this epoch, i.e. still listed.
+
+    Returns:
+        A dict of NumPy arrays keyed by column name; missing mileage is NaN.
+    """
+    sql, params = SCORING_COLUMNS_SQL, [MIN_BASELINE_LISTINGS]
+    if scraped_after is not None:
+        sql += " AND l.scraped_timestamp >= ?"
+        params.append(scraped_after)
+    if seen_after is not None:
+        sql += " AND l.last_seen >= ?"
+        params.append(seen_after)
+    rows = conn.execute(sql, params).fetchall()
+    names = ('id', 'price', 'mileage', 'n', 'price_sum', 'mileage_n', 'mileage_price_sum',
+             'mileage_sum', 'mileage_sq_sum', 'price_mileage_sum')
+    if not rows:
+        return {name: np.empty(0) for name in names}
+    # None becomes NaN in a float array.
+    table = np.array(rows, dtype=float)
+    columns = {name: table[:, i] for i, name in enumerate(names)}
+    columns['id'] = columns['id'].astype(np.int64)
+    return columns
+
+def deal_scores(columns):
+    """
+    Computes mileage-adjusted deal scores.
+
+    Within each group, price is regressed on mileage; a listing's expected
+    price is the group's fitted price at its mileage (or the group mean if it
+    has none). The score is the fraction it is priced below that, so 0.1 means
+    10% under market.
+
+    Args:
+        columns: The arrays returned by load_scoring_columns.
+
+    Returns:
+        (scores, expected_prices) as NumPy arrays.
+    """
+    price, mileage = columns['price'], columns['mileage']
+    mean_price = columns['price_sum'] / columns['n']
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mileage_n = columns['mileage_n']
+        mean_mileage = columns['mileage_sum'] / mileage_n
+        mean_price_with_mileage = columns['mileage_price_sum'] / mileage_n
+        variance = columns['mileage_sq_sum'] / mileage_n - mean_mileage ** 2
+        covariance = columns['price_mileage_sum'] / mileage_n - mean_price_with_mileage * mean_mileage
+        slope = np.where((mileage_n >= MIN_BASELINE_LISTINGS) & (variance > 0), covariance / variance, 0.0)
+    # More miles never make a car worth more.
+    slope = np.minimum(np.nan_to_num(slope), 0.0)
+
+    adjusted = mean_price_with_mileage + slope * (mileage - mean_mileage)
+    expected = np.where(np.isnan(mileage) | (slope == 0), mean_price, adjusted)
+    expected = np.maximum(expected, MIN_EXPECTED_FRACTION * mean_price)
+    return (expected - price) / expected, expected
+
+def top_n(scores, n):
+    """
+    Returns the indices of the n highest scores, best first.
+
+    Uses a partial sort, so only the selected candidates are fully ordered.
+    """
+    n = min(n, len(scores))
+    if n <= 0:
+        return np.empty(0, dtype=np.int64)
+    candidates = np.argpartition(-scores, n - 1)[:n]
+    return candidates[np.argsort(-scores[candidates], kind='stable')]
+
+def rank_listings(conn, n=DEFAULT_TOP_N, scraped_after=None, seen_after=None):
+    """
+    Ranks canonical listings by deal score.
+
+    Args:
+        conn: The database connection.
+        n: The number of listings to return.
+        scraped_after: Only rank listings scraped at or after this epoch.
+        seen_after: Only rank listings last seen at or after this epoch.
+
+    Returns:
+        A list of RankedListing, best deal first.
+    """
+    columns = load_scoring_columns(conn, scraped_after, seen_after)
+    if not len(columns['id']):
+        return []
+    scores, expected = deal_scores(columns)
+    best = top_n(scores, n)
+    logging.info(f"[*] Ranked {len(scores)} listings; selected the top {len(best)}.")
+    return [RankedListing(int(columns['id'][i]), float(scores[i]), float(expected[i])) for i in best]
@@ -0,0 +1,127 @@
+"""
+Columnar export of the listings table for offline analysis
+
+    python -m src.database.columnar car_finder.db listings.npz
+
+The .npz holds one NumPy array per column, in row order:
+
+* numeric columns as int64/float64; a NULL mileage or price is NaN, a NULL
+  canonical_id, first_seen or last_seen is 0
+* make, model, location and source_site dictionary-encoded, as int32 codes
+  (-1 for NULL) in `<column>` plus the distinct values in `<column>_categories`
+* url and vin as fixed-width unicode ('' for NULL)
+
+read_columns decodes the categorical columns back into plain arrays.
+"""
+import argparse
+import io
+import sys
+from contextlib import closing
+
+import numpy as np
+
+from src.database.database import create_connection, query_listings
+
+NUMERIC_COLUMNS = {
+    'id': np.int64,
+    'year': np.int64,
+    'price': np.float64,
+    'mileage': np.float64,
+    'scraped_timestamp': np.int64,
+    'canonical_id': np.int64,
+    'first_seen': np.int64,
+    'last_seen': np.int64,
+}
+CATEGORICAL_COLUMNS = ('make', 'model', 'location', 'source_site')
+TEXT_COLUMNS = ('url', 'vin')
+CATEGORIES_SUFFIX = '_categories'
+FETCH_SIZE = 10000
+
+def _numeric(values, dtype):
+    if dtype is np.float64:
+        return np.array([np.nan if v is None else v for v in values], dtype=dtype)
+    return np.array([0 if v is None else v for v in values], dtype=dtype)
+
+def _categorical(values):
+    categories, codes = {}, np.empty(len(values), dtype=np.int32)
+    for i, value in enumerate(values):
+        codes[i] = -1 if value is None else categories.setdefault(value, len(categories))
+    return codes, np.array(list(categories), dtype=str)
+
+def listing_columns(conn, filters=None, sort='id'):
+    """
+    Read listings column-wise into NumPy arrays
+    :param conn: the Connection object
+    :param filters: dict of LISTING_FILTERS keys to values, as for query_listings
+    :param sort: a LISTING_SORT_COLUMNS name, prefixed with '-' for descending
+    :return: dict of array name to array, in the .npz layout described above
+    """
+    cursor = query_listings(conn, filters, sort)
+    names = [column[0] for column in cursor.description]
+    values = {name: [] for name in names}
+    while True:
+        rows = cursor.fetchmany(FETCH_SIZE)
+        if not rows:
+            break
+        for name, column in zip(names, zip(*rows)):
+            values[name].extend(column)
+
+    arrays = {}
+    for name, dtype in NUMERIC_COLUMNS.items():
+        arrays[name] = _numeric(values[name], dtype)
+    for name in CATEGORICAL_COLUMNS:
+        arrays[name], arrays[name + CATEGORIES_SUFFIX] = _categorical(values[name])
+    for name in TEXT_COLUMNS:
+        arrays[name] = np.array(['' if v is None else v for v in values[name]], dtype=str)
+    return arrays
+
+def export_npz(conn, file, filters=None, sort='id', compress=True):
+    """
+    Write the listings table to a .npz file
+    :param conn: the Connection object
+    :param file: path or binary file object
+    :param filters: dict of LISTING_FILTERS keys to values
+    :param sort: a LISTING_SORT_COLUMNS name, prefixed with '-' for descending
+    :param compress: deflate the arrays (slower to write, several times smaller)
+    :return: number of listings written
+    """
+    arrays = listing_columns(conn, filters, sort)
+    (np.savez_compressed if compress else np.savez)(file, **arrays)
+    return len(arrays['id'])
+
+def export_npz_bytes(conn, filters=None, sort='id', compress=True):
+    """
+    Export listings as in-memory .npz data, e.g. for an HTTP response
+    :return: (bytes, number of listings)
+    """
+    buffer = io.BytesIO()
+    exported = export_npz(conn, buffer, filters, sort, compress)
+    return buffer.getvalue(), exported
+
+def read_columns(file):
+    """
+    Load an exported .npz, decoding the categorical columns
+    :param file: path or binary file object
+    :return: dict of column name to array; NULL categorical values become ''
+    """
+    with np.load(file) as data:
+        arrays = {name: data[name] for name in data.files if not name.endswith(CATEGORIES_SUFFIX)}
+        for name in CATEGORICAL_COLUMNS:
+            categories = np.append(data[name + CATEGORIES_SUFFIX], '')
+            # Code -1 (NULL) indexes the '' appended at the end.
+            arrays[name] = categories[arrays[name]]
+    return arrays
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export the listings table to a columnar .npz file.")
+    parser.add_argument('database', help="The SQLite database file.")
+    parser.add_argument('output', help="The .npz file to write.")
+    parser.add_argument('--sort', default='id', help="Sort column, '-' prefixed for descending.")
+    parser.add_argument('--no-compress', action='store_true', help="Write uncompressed arrays.")
+    args = parser.parse_args(argv)
+    with closing(create_connection(args.database)) as conn:
+        exported = export_npz(conn, args.output, sort=args.sort, compress=not args.no_compress)
+    print(f"Exported {exported} listings to {args.output}")
+
+if __name__ == '__main__':
+    sys.exit(main())
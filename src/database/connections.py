@@ -0,0 +1,172 @@
+import contextlib
+import os
+import sqlite3
+import threading
+import urllib.parse
+
+from src.metrics import count
+
+# Tuned per-connection settings. WAL lets readers run alongside a writer;
+# synchronous=NORMAL is durable in WAL mode except for the last commits on power
+# loss; mmap and a larger page cache keep hot pages out of read() calls.
+MMAP_SIZE = int(os.environ.get("SQLITE_MMAP_SIZE", 256 * 1024 * 1024))
+CACHE_SIZE_KB = int(os.environ.get("SQLITE_CACHE_SIZE_KB", 16 * 1024))
+BUSY_TIMEOUT_SECONDS = float(os.environ.get("SQLITE_BUSY_TIMEOUT", 5.0))
+# Prepared statements kept per connection, keyed by SQL text. The listing
+# queries are built from a fixed set of filters, so this covers all of them.
+STATEMENT_CACHE_SIZE = 256
+# Idle connections kept per (readonly, autocommit) flavour. Threads only hold a
+# connection for the duration of a block, so a few serve many request threads.
+POOL_SIZE = int(os.environ.get("SQLITE_POOL_SIZE", 4))
+
+def apply_pragmas(conn, readonly=False):
+    """
+    Apply the tuned pragmas to a connection
+    :param conn: the Connection object
+    :param readonly: if True, also refuse writes on this connection
+    :return: the connection
+    """
+    if not readonly:
+        # journal_mode is stored in the database file, so only a writer can set it.
+        conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA mmap_size={MMAP_SIZE:d}")
+    conn.execute(f"PRAGMA cache_size={-CACHE_SIZE_KB:d}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    if readonly:
+        conn.execute("PRAGMA query_only=ON")
+    return conn
+
+def open_connection(db_file, readonly=False, autocommit=False, row_factory=None):
+    """
+    Open a new, tuned connection; it may be used from any thread, one at a time
+    :param db_file: database file
+    :param readonly: open the file read-only; it must already exist
+    :param autocommit: if True, transactions are only begun explicitly (isolation_level None)
+    :param row_factory: row factory for the connection, e.g. sqlite3.Row
+    :return: Connection object
+    """
+    if readonly:
+        uri = f"file:{urllib.parse.quote(os.path.abspath(db_file))}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, timeout=BUSY_TIMEOUT_SECONDS,
+                               cached_statements=STATEMENT_CACHE_SIZE, check_same_thread=False)
+    else:
+        conn = sqlite3.connect(db_file, timeout=BUSY_TIMEOUT_SECONDS,
+                               cached_statements=STATEMENT_CACHE_SIZE, check_same_thread=False)
+    if autocommit:
+        conn.isolation_level = None
+    conn.row_factory = row_factory
+    count('car_finder_db_connections_total', mode='read' if readonly else 'write')
+    return apply_pragmas(conn, readonly)
+
+class ConnectionManager:
+    """
+    Pooled, reusable connections to one database file
+
+    Up to POOL_SIZE idle connections per (readonly, autocommit) flavour are
+    kept and checked out by whichever thread needs one, so the schema is parsed
+    and the pragmas applied once per pooled connection rather than once per
+    request or thread, and the prepared-statement cache survives between uses.
+    When more are in use at once, extra connections are opened and closed again
+    on return. Connections opened before a fork are never reused in the child.
+    """
+
+    def __init__(self, db_file, row_factory=None, pool_size=POOL_SIZE):
+        self.db_file = db_file
+        self.row_factory = row_factory
+        self.pool_size = pool_size
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._idle = {}
+        self._pid = os.getpid()
+
+    def _slots(self):
+        slots = getattr(self._local, 'slots', None)
+        if slots is None or self._local.pid != os.getpid():
+            slots = self._local.slots = {}
+            self._local.pid = os.getpid()
+        return slots
+
+    def _checkout(self, key):
+        with self._lock:
+            if self._pid != os.getpid():
+                # Inherited connections belong to the parent; drop them unclosed.
+                self._idle = {}
+                self._pid = os.getpid()
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop()
+        return open_connection(self.db_file, *key, row_factory=self.row_factory)
+
+    def _checkin(self, key, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        with self._lock:
+            if self._pid == os.getpid():
+                idle = self._idle.setdefault(key, [])
+                if len(idle) < self.pool_size:
+                    idle.append(conn)
+                    return
+        conn.close()
+
+    @contextlib.contextmanager
+    def connection(self, readonly=False, autocommit=False):
+        """
+        Borrow a pooled connection for the enclosed block
+        :param readonly: use a read-only connection
+        :param autocommit: use a connection without implicit transactions
+        :return: context manager yielding the Connection object
+
+        Blocks may nest; a thread gets the same connection back in nested blocks.
+        The outermost block returns it to the pool, rolling back a transaction
+        still open, as closing the connection would.
+        """
+        slots = self._slots()
+        key = (readonly, autocommit)
+        slot = slots.get(key)
+        if slot is None:
+            slot = slots[key] = [self._checkout(key), 0]
+        slot[1] += 1
+        try:
+            yield slot[0]
+        finally:
+            slot[1] -= 1
+            if not slot[1]:
+                del slots[key]
+                self._checkin(key, slot[0])
+
+    def close(self):
+        """ close the idle pooled connections """
+        with self._lock:
+            idle = [conn for conns in self._idle.values() for conn in conns] if self._pid == os.getpid() else []
+            self._idle = {}
+        for conn in idle:
+            conn.close()
+
+_managers = {}
+_managers_lock = threading.Lock()
+
+def get_manager(db_file, row_factory=None):
+    """
+    The shared ConnectionManager for a database file and row factory
+    :param db_file: database file
+    :param row_factory: row factory of its connections
+    :return: ConnectionManager
+    """
+    key = (db_file, row_factory)
+    manager = _managers.get(key)
+    if manager is None:
+        with _managers_lock:
+            manager = _managers.setdefault(key, ConnectionManager(db_file, row_factory))
+    return manager
+
+def connection(db_file, readonly=False, autocommit=False, row_factory=None):
+    """
+    Borrow a pooled connection to `db_file`
+    :param db_file: database file
+    :param readonly: use a read-only connection, e.g. for GET endpoints
+    :param autocommit: use a connection without implicit transactions
+    :param row_factory: row factory of the connection, e.g. sqlite3.Row
+    :return: context manager yielding the Connection object; do not close it
+    """
+    return get_manager(db_file, row_factory).connection(readonly, autocommit)
@@ -1,61 +1,305 @@
 import sqlite3
+import logging
 from sqlite3 import Error
+from src.database.connections import open_connection
+from src.database.migrations import migrate
+from src.listing import Listing, listing_factory
+from src.metrics import count, timer
+
+REQUIRED_LISTING_FIELDS = ('make', 'model', 'year', 'price', 'url')
+BULK_INSERT_CHUNK_SIZE = 500
+
+# Listings are keyed by URL. A listing seen again has its price, mileage and
+# last_seen refreshed (the observation triggers record any change); other
+# conflicts, e.g. a VIN already stored under another URL, are ignored.
+UPSERT_LISTING_SQL = ''' INSERT INTO listings(make,model,year,price,mileage,vin,location,url,source_site,scraped_timestamp,first_seen,last_seen)
+              VALUES(?1,?2,?3,?4,?5,?6,?7,?8,?9,?10,?10,?10)
+              ON CONFLICT(url) DO UPDATE SET
+                  price = excluded.price,
+                  mileage = COALESCE(excluded.mileage, mileage),
+                  last_seen = MAX(COALESCE(last_seen, 0), excluded.last_seen)
+              ON CONFLICT DO NOTHING '''
 
 def create_connection(db_file):
-    """ create a database connection to a SQLite database """
+    """ create a new database connection to a SQLite database
+
+    The database is switched to WAL journaling so readers (e.g. /api/cars)
+    are not blocked while a scrape is writing, and the connection gets the
+    tuned pragmas. Long-running code should borrow a reusable pooled
+    connection from src.database.connections instead.
+    """
     conn = None
     try:
-        conn = sqlite3.connect(db_file)
+        conn = open_connection(db_file)
         return conn
     except Error as e:
         print(e)
     return conn
 
+def listing_cursor(conn):
+    """
+    Create a cursor whose rows are Listings, whatever the connection's row factory
+    :param conn: the Connection object
+    :return: Cursor object
+    """
+    cursor = conn.cursor()
+    cursor.row_factory = listing_factory
+    return cursor
+
 def create_table(conn):
-    """ create tables from the create_table_sql statements """
+    """ create or upgrade the tables by applying any pending schema migrations """
     try:
-        sql_create_listings_table = """ CREATE TABLE IF NOT EXISTS listings (
-                                        id integer PRIMARY KEY,
-                                        make text NOT NULL,
-                                        model text NOT NULL,
-                                        year integer NOT NULL,
-                                        price real NOT NULL,
-                                        mileage integer,
-                                        vin text UNIQUE,
-                                        location text,
-                                        url text NOT NULL UNIQUE,
-                                        source_site text,
-                                        scraped_timestamp text NOT NULL
-                                    ); """
-
-        sql_create_feedback_table = """ CREATE TABLE IF NOT EXISTS feedback (
-                                        id integer PRIMARY KEY,
-                                        car_id integer NOT NULL,
-                                        preference text NOT NULL,
-                                        timestamp text NOT NULL,
-                                        FOREIGN KEY (car_id) REFERENCES listings (id)
-                                    ); """
-
-        c = conn.cursor()
-        c.execute(sql_create_listings_table)
-        c.execute(sql_create_feedback_table)
+        migrate(conn)
     except Error as e:
         print(e)
 
 def insert_listing(conn, listing):
     """
-    Create a new listing into the listings table
+    Create a new listing into the listings table, or refresh it if its URL is known
     :param conn:
     :param listing:
     :return: project id
     """
-    sql = ''' INSERT OR IGNORE INTO listings(make,model,year,price,mileage,vin,location,url,source_site,scraped_timestamp)
-              VALUES(?,?,?,?,?,?,?,?,?,?) '''
     cur = conn.cursor()
-    cur.execute(sql, listing)
+    cur.execute(UPSERT_LISTING_SQL, listing)
     conn.commit()
     return cur.lastrowid
 
+def validate_listing(car, source_site=None, scraped_timestamp=None):
+    """
+    Validate a scraped listing and normalize it into an insertable row
+    :param car: Listing, or a dict with the listing fields
+    :param source_site: default source_site if the listing has none
+    :param scraped_timestamp: default scraped_timestamp if the listing has none
+    :return: tuple in insert_listing column order, or None if the listing is invalid
+    """
+    if isinstance(car, dict):
+        car = Listing.from_dict(car)
+    if not isinstance(car, Listing) or not all(getattr(car, field) for field in REQUIRED_LISTING_FIELDS):
+        return None
+    try:
+        year = int(car.year)
+        price = float(car.price)
+        mileage = int(car.mileage) if car.mileage not in (None, '') else None
+    except (TypeError, ValueError):
+        return None
+
+    timestamp = car.scraped_timestamp or scraped_timestamp
+    if timestamp is None:
+        return None
+
+    return (
+        car.make, car.model, year, price, mileage, car.vin, car.location,
+        car.url, car.source_site or source_site, timestamp,
+    )
+
+def bulk_insert_listings(conn, listings, source_site=None, scraped_timestamp=None, chunk_size=BULK_INSERT_CHUNK_SIZE):
+    """
+    Validate and upsert many listings in one transaction using chunked executemany
+    :param conn: the Connection object
+    :param listings: iterable of Listings (or listing dicts)
+    :param source_site: default source_site for listings that don't carry one
+    :param scraped_timestamp: default scraped_timestamp for listings that don't carry one
+    :param chunk_size: number of rows sent per executemany call
+    :return: dict with inserted, duplicates (already stored), price_changes and rejected counts
+    """
+    stats = {'inserted': 0, 'duplicates': 0, 'price_changes': 0, 'rejected': 0}
+    chunk = []
+
+    def max_id(table):
+        return conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}").fetchone()[0]
+
+    def flush():
+        # Ids only grow, so new rows are the ones above the previous maximum.
+        listings_before, observations_before = max_id('listings'), max_id('listing_observations')
+        with timer('db_insert_batch'):
+            conn.executemany(UPSERT_LISTING_SQL, chunk)
+        inserted = conn.execute("SELECT COUNT(*) FROM listings WHERE id > ?", (listings_before,)).fetchone()[0]
+        # The change trigger also records mileage-only updates; only count real price moves.
+        price_changes = conn.execute(
+            "SELECT COUNT(*) FROM listing_observations WHERE id > ? AND price_change IS NOT NULL AND price_change != 0",
+            (observations_before,)).fetchone()[0]
+        stats['inserted'] += inserted
+        stats['duplicates'] += len(chunk) - inserted
+        stats['price_changes'] += price_changes
+        chunk.clear()
+
+    with conn:
+        for car in listings:
+            row = validate_listing(car, source_site, scraped_timestamp)
+            if row is None:
+                logging.debug(f"Rejecting invalid listing: {car}")
+                stats['rejected'] += 1
+                continue
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                flush()
+        if chunk:
+            flush()
+
+    for outcome, listings_count in stats.items():
+        count('car_finder_listings_total', listings_count, outcome=outcome)
+    return stats
+
+LISTING_SORT_COLUMNS = ('id', 'price', 'year', 'mileage', 'scraped_timestamp')
+NULLABLE_SORT_COLUMNS = ('mileage',)
+LISTING_FILTERS = {
+    'make': 'make = ?',
+    'model': 'model = ?',
+    'source_site': 'source_site = ?',
+    'year_min': 'year >= ?',
+    'year_max': 'year <= ?',
+    'price_min': 'price >= ?',
+    'price_max': 'price <= ?',
+    'mileage_max': 'mileage <= ?',
+    'scraped_after': 'scraped_timestamp >= ?',
+    'scraped_before': 'scraped_timestamp < ?',
+    'seen_after': 'last_seen >= ?',
+}
+
+def _keyset_condition(column, descending, after):
+    """
+    Build the WHERE clause that resumes a (column, id) ordering after a cursor position
+    :param column: the sort column
+    :param descending: whether the ordering is descending
+    :param after: (value, id) of the last row already returned
+    :return: (sql, params)
+    """
+    value, last_id = after
+    op = '<' if descending else '>'
+    if column == 'id':
+        return f"id {op} ?", [last_id]
+    if column not in NULLABLE_SORT_COLUMNS:
+        return f"({column}, id) {op} (?, ?)", [value, last_id]
+
+    # SQLite sorts NULLs first ascending and last descending.
+    if value is None:
+        if descending:
+            return f"({column} IS NULL AND id < ?)", [last_id]
+        return f"(({column} IS NULL AND id > ?) OR {column} IS NOT NULL)", [last_id]
+    if descending:
+        return f"(({column}, id) < (?, ?) OR {column} IS NULL)", [value, last_id]
+    return f"({column}, id) > (?, ?)", [value, last_id]
+
+def build_listings_query(filters=None, sort='id', after=None, limit=None):
+    """
+    Build a keyset-paginated, filtered query over the listings table
+    :param filters: dict of LISTING_FILTERS keys to values
+    :param sort: a LISTING_SORT_COLUMNS name, prefixed with '-' for descending
+    :param after: (sort value, id) of the last row of the previous page
+    :param limit: maximum number of rows, or None for all
+    :return: (sql, params)
+    """
+    descending = sort.startswith('-')
+    column = sort.lstrip('-')
+    if column not in LISTING_SORT_COLUMNS:
+        raise ValueError(f"Unsupported sort column: {column}")
+
+    clauses, params = [], []
+    for key, value in (filters or {}).items():
+        if key not in LISTING_FILTERS:
+            raise ValueError(f"Unsupported filter: {key}")
+        if value is not None:
+            clauses.append(LISTING_FILTERS[key])
+            params.append(value)
+    if after is not None:
+        clause, clause_params = _keyset_condition(column, descending, after)
+        clauses.append(clause)
+        params.extend(clause_params)
+
+    direction = 'DESC' if descending else 'ASC'
+    sql = "SELECT * FROM listings"
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    if column == 'id':
+        sql += f" ORDER BY id {direction}"
+    else:
+        sql += f" ORDER BY {column} {direction}, id {direction}"
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(int(limit))
+    return sql, params
+
+def query_listings(conn, filters=None, sort='id', after=None, limit=None):
+    """
+    Run a keyset-paginated, filtered query over the listings table
+    :param conn: the Connection object
+    :return: a cursor over the matching rows, so callers can stream them
+    """
+    sql, params = build_listings_query(filters, sort, after, limit)
+    return conn.execute(sql, params)
+
+def touch_listings(conn, urls, seen_at):
+    """
+    Mark listings as seen again without other changes
+    :param conn: the Connection object
+    :param urls: URLs of the listings seen unchanged
+    :param seen_at: epoch of the sighting
+    :return: number of listings updated
+    """
+    before = conn.total_changes
+    with conn:
+        conn.executemany(
+            "UPDATE listings SET last_seen = ? WHERE url = ? AND COALESCE(last_seen, 0) < ?",
+            ((seen_at, url, seen_at) for url in urls)
+        )
+    return conn.total_changes - before
+
+def data_version(conn):
+    """
+    Read the listings data version
+    :param conn: the Connection object
+    :return: the counter bump_data_version last advanced
+    """
+    return conn.execute("SELECT version FROM data_version WHERE id = 1").fetchone()[0]
+
+def bump_data_version(conn):
+    """
+    Advance the listings data version once a batch of writes is committed, so
+    responses cached for the previous version are no longer served
+    :param conn: the Connection object
+    :return: the new version
+    """
+    with conn:
+        conn.execute("UPDATE data_version SET version = version + 1 WHERE id = 1")
+    return data_version(conn)
+
+def price_drops(conn, since, limit=None):
+    """
+    Query listings whose price dropped at or after `since`, newest drop first
+    :param conn: the Connection object
+    :param since: epoch lower bound of the drop
+    :param limit: maximum number of rows, or None for all
+    :return: a cursor over listing rows plus dropped_at, previous_price and price_change
+
+    Served by the partial index on price-drop observations, so only drops are read.
+    """
+    sql = ''' SELECT l.*, o.observed_at AS dropped_at, o.price - o.price_change AS previous_price,
+                     o.price_change
+              FROM listing_observations o JOIN listings l ON l.id = o.listing_id
+              WHERE o.price_change < 0 AND o.observed_at >= ?
+              ORDER BY o.observed_at DESC '''
+    params = [since]
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(int(limit))
+    return conn.execute(sql, params)
+
+def delisted_listings(conn, not_seen_since, limit=None):
+    """
+    Query listings not seen by any scrape since `not_seen_since`, most recently seen first
+    :param conn: the Connection object
+    :param not_seen_since: epoch; listings last seen before it count as delisted
+    :param limit: maximum number of rows, or None for all
+    :return: a cursor over listing rows
+    """
+    sql = "SELECT * FROM listings WHERE last_seen < ? ORDER BY last_seen DESC"
+    params = [not_seen_since]
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(int(limit))
+    return conn.execute(sql, params)
+
 def get_all_listings(conn):
     """
     Query all rows in the listings table
@@ -77,7 +321,7 @@ if __name__ == '__main__':
         create_table(conn)
 
         # create a new listing
-        listing = ('Toyota', 'Camry', 2022, 25000, 15000, '123456789ABCDEFGH', 'Los Angeles, CA', 'http://example.com/car1', 'example.com', '2025-10-03 12:00:00')
+        listing = ('Toyota', 'Camry', 2022, 25000, 15000, '123456789ABCDEFGH', 'Los Angeles, CA', 'http://example.com/car1', 'example.com', 1759492800)
         insert_listing(conn, listing)
 
         get_all_listings(conn)
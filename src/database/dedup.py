@@ -0,0 +1,135 @@
+import logging
+from difflib import SequenceMatcher
+
+from src.database.database import listing_cursor
+
+# Blocking: only listings with the same make, model and year and a nearby
+# price/mileage bucket are ever compared, so linking a page of listings costs a
+# handful of indexed lookups instead of a scan of the whole table.
+PRICE_BUCKET = 1000
+MILEAGE_BUCKET = 5000
+# Fuzzy-match tolerances within a block.
+MAX_PRICE_DIFF = 0.03
+MAX_MILEAGE_DIFF = 0.02
+MIN_MILEAGE_SLACK = 250
+MIN_LOCATION_SIMILARITY = 0.6
+
+LISTING_COLUMNS = "id, make, model, year, price, mileage, vin, location"
+
+def _norm(text):
+    return " ".join(str(text).lower().split()) if text else ''
+
+def _bucket(value, size):
+    return int(value // size) if value is not None else None
+
+def blocking_key(listing):
+    """
+    Build the blocking key of a listing
+    :param listing: Listing with make, model, year, price and mileage
+    :return: (make, model, year, price bucket, mileage bucket)
+    """
+    return (
+        _norm(listing.make), _norm(listing.model), int(listing.year),
+        _bucket(listing.price, PRICE_BUCKET), _bucket(listing.mileage, MILEAGE_BUCKET),
+    )
+
+def neighbouring_keys(key):
+    """
+    The keys of a block and its neighbours, so near-duplicates that straddle a
+    bucket boundary still meet
+    """
+    make, model, year, price, mileage = key
+    mileages = [None] if mileage is None else [mileage - 1, mileage, mileage + 1]
+    return [(make, model, year, p, m) for p in (price - 1, price, price + 1) for m in mileages]
+
+def is_duplicate(a, b):
+    """
+    Decide whether two listings in the same block describe the same physical car
+    :param a: Listing
+    :param b: Listing
+    :return: True if they match
+    """
+    if a.vin and b.vin:
+        return _norm(a.vin) == _norm(b.vin)
+    if abs(a.price - b.price) > MAX_PRICE_DIFF * max(a.price, b.price):
+        return False
+    if (a.mileage is None) != (b.mileage is None):
+        return False
+    if a.mileage is not None:
+        slack = max(MIN_MILEAGE_SLACK, MAX_MILEAGE_DIFF * max(a.mileage, b.mileage))
+        if abs(a.mileage - b.mileage) > slack:
+            return False
+    location_a, location_b = _norm(a.location), _norm(b.location)
+    if location_a and location_b:
+        return SequenceMatcher(None, location_a, location_b).ratio() >= MIN_LOCATION_SIMILARITY
+    return True
+
+class BlockIndex:
+    """ canonical listings grouped by blocking key """
+
+    def __init__(self):
+        self._blocks = {}
+
+    def add(self, listing):
+        self._blocks.setdefault(blocking_key(listing), []).append(listing)
+
+    def find(self, listing):
+        """
+        Find the canonical listing a listing duplicates
+        :param listing: Listing
+        :return: the matching canonical listing, or None
+        """
+        for key in neighbouring_keys(blocking_key(listing)):
+            for candidate in self._blocks.get(key, ()):
+                if candidate.id != listing.id and is_duplicate(listing, candidate):
+                    return candidate
+        return None
+
+def link_duplicates(conn, first_id):
+    """
+    Link listings with id >= first_id to the canonical listing of the same car
+    :param conn: the Connection object
+    :param first_id: the first newly inserted listing id
+    :return: number of listings linked as duplicates
+
+    Canonical listings are the oldest sighting of a car and have a NULL
+    canonical_id; duplicates point at them so analysis runs once per car.
+    Only the blocks the new listings fall into are loaded, via the
+    (make, model, year) index.
+    """
+    cursor = listing_cursor(conn)
+    new_listings = cursor.execute(
+        f"SELECT {LISTING_COLUMNS} FROM listings WHERE id >= ? ORDER BY id", (first_id,)).fetchall()
+    if not new_listings:
+        return 0
+
+    index = BlockIndex()
+    ranges = {}
+    for listing in new_listings:
+        block = (listing.make, listing.model, listing.year)
+        low, high = ranges.get(block, (listing.price, listing.price))
+        ranges[block] = (min(low, listing.price), max(high, listing.price))
+    for (make, model, year), (low, high) in ranges.items():
+        # Widen by one bucket either side, matching neighbouring_keys.
+        rows = cursor.execute(
+            f"SELECT {LISTING_COLUMNS} FROM listings WHERE make = ? AND model = ? AND year = ? "
+            "AND price >= ? AND price < ? AND id < ? AND canonical_id IS NULL",
+            (make, model, year, (_bucket(low, PRICE_BUCKET) - 1) * PRICE_BUCKET,
+             (_bucket(high, PRICE_BUCKET) + 2) * PRICE_BUCKET, first_id)
+        )
+        for row in rows:
+            index.add(row)
+
+    links = []
+    for listing in new_listings:
+        canonical = index.find(listing)
+        if canonical is None:
+            index.add(listing)
+        else:
+            links.append((canonical.id, listing.id))
+
+    if links:
+        with conn:
+            conn.executemany("UPDATE listings SET canonical_id = ? WHERE id = ?", links)
+        logging.info(f"[*] Linked {len(links)} of {len(new_listings)} new listings to existing cars.")
+    return len(links)
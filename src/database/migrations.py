@@ -0,0 +1,237 @@
+import logging
+from sqlite3 import Error
+
+# Each migration is (version, [statements]). The schema version is tracked in
+# PRAGMA user_version, so a database only ever runs the migrations it is missing.
+# Append new migrations to the end; never edit one that has shipped.
+MIGRATIONS = [
+    (1, [
+        """ CREATE TABLE IF NOT EXISTS listings (
+                id integer PRIMARY KEY,
+                make text NOT NULL,
+                model text NOT NULL,
+                year integer NOT NULL,
+                price real NOT NULL,
+                mileage integer,
+                vin text UNIQUE,
+                location text,
+                url text NOT NULL UNIQUE,
+                source_site text,
+                scraped_timestamp text NOT NULL
+            ); """,
+        """ CREATE TABLE IF NOT EXISTS feedback (
+                id integer PRIMARY KEY,
+                car_id integer NOT NULL,
+                preference text NOT NULL,
+                timestamp text NOT NULL,
+                FOREIGN KEY (car_id) REFERENCES listings (id)
+            ); """,
+    ]),
+    # Store scraped_timestamp as an integer epoch so range queries can use an
+    # index. The column had TEXT affinity, so the table has to be rebuilt.
+    (2, [
+        """ CREATE TABLE listings_new (
+                id integer PRIMARY KEY,
+                make text NOT NULL,
+                model text NOT NULL,
+                year integer NOT NULL,
+                price real NOT NULL,
+                mileage integer,
+                vin text UNIQUE,
+                location text,
+                url text NOT NULL UNIQUE,
+                source_site text,
+                scraped_timestamp integer NOT NULL
+            ); """,
+        """ INSERT INTO listings_new
+            SELECT id, make, model, year, price, mileage, vin, location, url, source_site,
+                   COALESCE(
+                       CASE WHEN CAST(scraped_timestamp AS INTEGER) || '' = scraped_timestamp
+                            THEN CAST(scraped_timestamp AS INTEGER)
+                            ELSE CAST(strftime('%s', scraped_timestamp) AS INTEGER)
+                       END, 0)
+            FROM listings; """,
+        "DROP TABLE listings;",
+        "ALTER TABLE listings_new RENAME TO listings;",
+    ]),
+    (3, [
+        "CREATE INDEX IF NOT EXISTS idx_listings_make_model_year ON listings (make, model, year);",
+        "CREATE INDEX IF NOT EXISTS idx_listings_price ON listings (price);",
+        "CREATE INDEX IF NOT EXISTS idx_listings_mileage ON listings (mileage);",
+        "CREATE INDEX IF NOT EXISTS idx_listings_scraped_timestamp ON listings (scraped_timestamp);",
+        "CREATE INDEX IF NOT EXISTS idx_feedback_car_id ON feedback (car_id);",
+    ]),
+    (4, [
+        """ CREATE TABLE IF NOT EXISTS analyses (
+                cache_key text PRIMARY KEY,
+                model text NOT NULL,
+                prompt_version integer NOT NULL,
+                analysis text NOT NULL,
+                created_at integer NOT NULL,
+                last_accessed integer NOT NULL
+            ); """,
+        "CREATE INDEX IF NOT EXISTS idx_analyses_last_accessed ON analyses (last_accessed);",
+    ]),
+    (5, [
+        """ CREATE TABLE IF NOT EXISTS http_cache (
+                url text PRIMARY KEY,
+                etag text,
+                last_modified text,
+                fetched_at integer NOT NULL
+            ); """,
+    ]),
+    (6, [
+        """ CREATE TABLE IF NOT EXISTS scrape_checkpoints (
+                run_key text PRIMARY KEY,
+                status text NOT NULL,
+                last_page integer NOT NULL,
+                updated_at integer NOT NULL
+            ); """,
+    ]),
+    (7, [
+        """ CREATE TABLE IF NOT EXISTS jobs (
+                id integer PRIMARY KEY,
+                kind text NOT NULL,
+                dedup_key text,
+                params text NOT NULL,
+                status text NOT NULL,
+                message text,
+                stage text,
+                progress text NOT NULL DEFAULT '{}',
+                cancel_requested integer NOT NULL DEFAULT 0,
+                worker text,
+                created_at real NOT NULL,
+                started_at real,
+                heartbeat_at real,
+                finished_at real
+            ); """,
+        "CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, id);",
+        "CREATE INDEX IF NOT EXISTS idx_jobs_dedup_key ON jobs (dedup_key, status);",
+    ]),
+    # Cross-source duplicates point at the canonical (first seen) listing of the same car.
+    (8, [
+        "ALTER TABLE listings ADD COLUMN canonical_id integer REFERENCES listings (id);",
+        "CREATE INDEX IF NOT EXISTS idx_listings_canonical_id ON listings (canonical_id);",
+    ]),
+    # Running sums behind the per-(make, model, year) price baselines used for
+    # ranking; ingest adds to them, so they are backfilled once here.
+    (9, [
+        """ CREATE TABLE IF NOT EXISTS price_baselines (
+                make text NOT NULL,
+                model text NOT NULL,
+                year integer NOT NULL,
+                n integer NOT NULL,
+                price_sum real NOT NULL,
+                mileage_n integer NOT NULL,
+                mileage_price_sum real NOT NULL,
+                mileage_sum real NOT NULL,
+                mileage_sq_sum real NOT NULL,
+                price_mileage_sum real NOT NULL,
+                PRIMARY KEY (make, model, year)
+            ); """,
+        """ INSERT INTO price_baselines
+            SELECT make, model, year, COUNT(*), SUM(price), COUNT(mileage),
+                   TOTAL(CASE WHEN mileage IS NOT NULL THEN price END),
+                   TOTAL(mileage), TOTAL(mileage * mileage), TOTAL(mileage * price)
+            FROM listings
+            WHERE canonical_id IS NULL
+            GROUP BY make, model, year; """,
+    ]),
+    # Per-stage timing report of each finished job, as JSON.
+    (10, [
+        "ALTER TABLE jobs ADD COLUMN timings text;",
+    ]),
+    # Price history. Listings are upserted on every sighting; triggers write an
+    # observation for each new listing and each price or mileage change, and
+    # keep the ranking baselines in step with updated prices.
+    (11, [
+        "ALTER TABLE listings ADD COLUMN first_seen integer;",
+        "ALTER TABLE listings ADD COLUMN last_seen integer;",
+        "UPDATE listings SET first_seen = scraped_timestamp, last_seen = scraped_timestamp;",
+        "CREATE INDEX IF NOT EXISTS idx_listings_last_seen ON listings (last_seen);",
+        """ CREATE TABLE IF NOT EXISTS listing_observations (
+                id integer PRIMARY KEY,
+                listing_id integer NOT NULL,
+                observed_at integer NOT NULL,
+                price real NOT NULL,
+                mileage integer,
+                price_change real,
+                FOREIGN KEY (listing_id) REFERENCES listings (id)
+            ); """,
+        "CREATE INDEX IF NOT EXISTS idx_observations_listing ON listing_observations (listing_id, observed_at);",
+        """ CREATE INDEX IF NOT EXISTS idx_observations_price_drops ON listing_observations (observed_at)
+            WHERE price_change < 0; """,
+        """ INSERT INTO listing_observations (listing_id, observed_at, price, mileage)
+            SELECT id, scraped_timestamp, price, mileage FROM listings; """,
+        """ CREATE TRIGGER IF NOT EXISTS listings_observe_insert AFTER INSERT ON listings
+            BEGIN
+                INSERT INTO listing_observations (listing_id, observed_at, price, mileage)
+                VALUES (new.id, COALESCE(new.last_seen, new.scraped_timestamp), new.price, new.mileage);
+            END; """,
+        """ CREATE TRIGGER IF NOT EXISTS listings_observe_change AFTER UPDATE OF price, mileage ON listings
+            WHEN new.price IS NOT old.price OR new.mileage IS NOT old.mileage
+            BEGIN
+                INSERT INTO listing_observations (listing_id, observed_at, price, mileage, price_change)
+                VALUES (new.id, COALESCE(new.last_seen, new.scraped_timestamp), new.price, new.mileage,
+                        new.price - old.price);
+                UPDATE price_baselines SET
+                    price_sum = price_sum + new.price - old.price,
+                    mileage_n = mileage_n + (new.mileage IS NOT NULL) - (old.mileage IS NOT NULL),
+                    mileage_price_sum = mileage_price_sum
+                        + IFNULL(CASE WHEN new.mileage IS NOT NULL THEN new.price END, 0)
+                        - IFNULL(CASE WHEN old.mileage IS NOT NULL THEN old.price END, 0),
+                    mileage_sum = mileage_sum + IFNULL(new.mileage, 0) - IFNULL(old.mileage, 0),
+                    mileage_sq_sum = mileage_sq_sum + IFNULL(new.mileage * new.mileage, 0)
+                        - IFNULL(old.mileage * old.mileage, 0),
+                    price_mileage_sum = price_mileage_sum + IFNULL(new.mileage * new.price, 0)
+                        - IFNULL(old.mileage * old.price, 0)
+                WHERE make = new.make AND model = new.model AND year = new.year AND new.canonical_id IS NULL;
+            END; """,
+    ]),
+    # A counter ingest bumps after committing a page, so cached API responses
+    # can tell when the listings behind them changed.
+    (12, [
+        """ CREATE TABLE IF NOT EXISTS data_version (
+                id integer PRIMARY KEY CHECK (id = 1),
+                version integer NOT NULL
+            ); """,
+        "INSERT OR IGNORE INTO data_version (id, version) VALUES (1, 0);",
+    ]),
+    # The listing URLs each cached results page held (a JSON array), so a page
+    # answered with 304 Not Modified still counts as a sighting of its listings.
+    (13, [
+        "ALTER TABLE http_cache ADD COLUMN listing_urls text;",
+    ]),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+def get_schema_version(conn):
+    """ return the schema version recorded in the database """
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate(conn):
+    """
+    Apply every pending migration, each in its own transaction
+    :param conn: the Connection object
+    :return: the schema version after migrating
+    """
+    version = get_schema_version(conn)
+    for target, statements in MIGRATIONS:
+        if target <= version:
+            continue
+        logging.info(f"Migrating database schema to version {target}")
+        try:
+            conn.execute("BEGIN")
+            for statement in statements:
+                conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {target}")
+            conn.commit()
+        except Error:
+            conn.rollback()
+            raise
+        version = target
+
+    # Refresh the planner statistics for the new indexes.
+    conn.execute("PRAGMA optimize")
+    return version
@@ -1,34 +1,233 @@
+import collections
+import functools
 import jinja2
+import logging
 import os
+import smtplib
+import time
+from email.message import EmailMessage
+from typing import Iterable, Iterator
 
-def generate_digest(cars: list[dict]) -> str:
+from src.listing import Listing
+from src.metrics import count, observe_stage
+
+TEMPLATE_NAME = 'template.html'
+DEFAULT_SUBJECT = "Daily Car Digest"
+SMTP_HOST = os.getenv("SMTP_HOST")
+SMTP_PORT = int(os.getenv("SMTP_PORT", 587))
+SMTP_USERNAME = os.getenv("SMTP_USERNAME")
+SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "true").lower() in ("1", "true", "yes")
+SMTP_TIMEOUT_SECONDS = float(os.getenv("SMTP_TIMEOUT", 30))
+# Many servers cap the messages accepted per session, so the connection is
+# recycled after this many.
+SMTP_BATCH_SIZE = int(os.getenv("SMTP_BATCH_SIZE", 50))
+SMTP_MAX_RETRIES = int(os.getenv("SMTP_MAX_RETRIES", 3))
+DIGEST_SENDER = os.getenv("DIGEST_SENDER", "car-finder@localhost")
+
+DeliveryReport = collections.namedtuple(
+    'DeliveryReport', ['recipient', 'render_seconds', 'send_seconds', 'attempts', 'error']
+)
+
+@functools.lru_cache(maxsize=None)
+def get_environment() -> jinja2.Environment:
+    """
+    Returns the shared Jinja environment.
+
+    Templates are compiled once and cached by the environment; auto-reload is
+    off, so the template file is not stat'ed on every render.
+    """
+    return jinja2.Environment(
+        loader=jinja2.FileSystemLoader(os.path.dirname(__file__)),
+        autoescape=jinja2.select_autoescape(['html']),
+        auto_reload=False,
+    )
+
+def render_digest(cars: list[Listing], **context) -> Iterator[str]:
+    """
+    Renders a digest incrementally.
+
+    Args:
+        cars: The Listings to include, with their analysis.
+        **context: Extra template variables, e.g. the recipient.
+
+    Returns:
+        An iterator over chunks of the HTML digest.
+    """
+    return get_environment().get_template(TEMPLATE_NAME).generate(cars=cars, **context)
+
+def generate_digest(cars: list[Listing], **context) -> str:
     """
     Generates an HTML digest from a list of car data.
 
     Args:
-        cars: A list of dictionaries, where each dictionary represents a car.
+        cars: The Listings to include, with their analysis.
+        **context: Extra template variables, e.g. the recipient.
 
     Returns:
         A string containing the HTML digest.
     """
-    template_path = os.path.join(os.path.dirname(__file__), 'template.html')
-    with open(template_path) as f:
-        template_content = f.read()
+    return "".join(render_digest(cars, **context))
+
+def build_message(html_content: str, recipient: str, subject: str = DEFAULT_SUBJECT,
+                  sender: str = DIGEST_SENDER) -> EmailMessage:
+    message = EmailMessage()
+    message['From'] = sender
+    message['To'] = recipient
+    message['Subject'] = subject
+    message.set_content("Your car digest is best viewed in an HTML-capable mail client.")
+    message.add_alternative(html_content, subtype='html')
+    return message
 
-    template = jinja2.Template(template_content)
-    return template.render(cars=cars)
+def _is_transient(error: Exception) -> bool:
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return False
+    if isinstance(error, smtplib.SMTPResponseException):
+        # 4xx replies are temporary failures; 5xx are permanent.
+        return 400 <= error.smtp_code < 500
+    return isinstance(error, (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError, OSError))
 
-def send_email(html_content: str, recipient: str, subject: str = "Daily Car Digest"):
+class SMTPMailer:
+    """
+    Sends messages over one reused SMTP connection.
+
+    The connection is opened on first use, recycled every `batch_size`
+    messages, and re-established when the server drops it. Transient failures
+    are retried with exponential backoff.
+    """
+
+    def __init__(self, host: str = SMTP_HOST, port: int = SMTP_PORT, username: str = SMTP_USERNAME,
+                 password: str = SMTP_PASSWORD, starttls: bool = SMTP_STARTTLS,
+                 batch_size: int = SMTP_BATCH_SIZE, max_retries: int = SMTP_MAX_RETRIES,
+                 backoff_seconds: float = 1.0, timeout: float = SMTP_TIMEOUT_SECONDS):
+        if not host:
+            raise ValueError("SMTP_HOST is not configured.")
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.timeout = timeout
+        self._smtp = None
+        self._sent_on_connection = 0
+
+    def _connect(self) -> smtplib.SMTP:
+        smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.starttls and smtp.has_extn('starttls'):
+            smtp.starttls()
+            smtp.ehlo()
+        if self.username:
+            smtp.login(self.username, self.password)
+        self._sent_on_connection = 0
+        return smtp
+
+    def _connection(self) -> smtplib.SMTP:
+        if self._smtp is not None and self._sent_on_connection >= self.batch_size:
+            self.close()
+        if self._smtp is None:
+            self._smtp = self._connect()
+        return self._smtp
+
+    def _drop(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.close()
+            finally:
+                self._smtp = None
+
+    def send(self, message: EmailMessage) -> int:
+        """
+        Sends one message.
+
+        Returns:
+            The number of attempts it took.
+
+        Raises:
+            smtplib.SMTPException: If the message could not be sent.
+        """
+        for attempt in range(1, self.max_retries + 2):
+            try:
+                self._connection().send_message(message)
+                self._sent_on_connection += 1
+                return attempt
+            except Exception as e:
+                if not _is_transient(e) or attempt > self.max_retries:
+                    raise
+                logging.warning(f"Sending to {message['To']} failed ({e}); retrying.")
+                self._drop()
+                time.sleep(self.backoff_seconds * 2 ** (attempt - 1))
+
+    def close(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except smtplib.SMTPException:
+                pass
+            finally:
+                self._smtp = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def send_digests(digests: Iterable[tuple[str, list[dict]]], mailer: SMTPMailer, subject: str = DEFAULT_SUBJECT,
+                 sender: str = DIGEST_SENDER, on_report=None) -> list[DeliveryReport]:
+    """
+    Renders and sends one digest per recipient over a shared SMTP connection.
+
+    Args:
+        digests: (recipient, cars) pairs.
+        mailer: The SMTPMailer to send with.
+        subject: The subject of the emails.
+        sender: The From address.
+        on_report: Called with each DeliveryReport as soon as it is known.
+
+    Returns:
+        A DeliveryReport per recipient with its render and send time.
+    """
+    reports = []
+    for recipient, cars in digests:
+        start = time.perf_counter()
+        message = build_message(generate_digest(cars, recipient=recipient), recipient, subject, sender)
+        rendered = time.perf_counter()
+        attempts, error = 0, None
+        try:
+            attempts = mailer.send(message)
+        except Exception as e:
+            logging.error(f"Failed to send digest to {recipient}: {e}")
+            error = str(e)
+        report = DeliveryReport(recipient, rendered - start, time.perf_counter() - rendered, attempts, error)
+        observe_stage('digest_render', report.render_seconds)
+        observe_stage('digest_send', report.send_seconds)
+        count('car_finder_digests_total', outcome='error' if error else 'ok')
+        logging.info(f"[*] Digest for {recipient}: rendered in {report.render_seconds * 1000:.1f} ms, "
+                     f"sent in {report.send_seconds * 1000:.1f} ms ({attempts} attempts).")
+        reports.append(report)
+        if on_report:
+            on_report(report)
+    return reports
+
+def send_email(html_content: str, recipient: str, subject: str = DEFAULT_SUBJECT):
     """
     Sends an email with the given HTML content.
 
-    (For now, this function just prints the email content to the console.)
+    If SMTP_HOST is not configured, the email is printed to the console instead.
 
     Args:
         html_content: The HTML content of the email.
         recipient: The email address of the recipient.
         subject: The subject of the email.
     """
+    if SMTP_HOST:
+        with SMTPMailer() as mailer:
+            mailer.send(build_message(html_content, recipient, subject))
+        return
+
     print("--- Sending Email ---")
     print(f"To: {recipient}")
     print(f"Subject: {subject}")
@@ -38,22 +237,16 @@ def send_email(html_content: str, recipient: str, subject: str = "Daily Car Dige
 if __name__ == '__main__':
     # Example usage
     sample_cars = [
-        {
-            'title': '2018 Honda Civic Type R',
-            'price': '$35,000',
-            'mileage': '30,000 miles',
-            'location': 'Los Angeles, CA',
-            'link': 'https://example.com/car123',
-            'analysis': 'This is a great car for enthusiasts. The price is a bit high, but the mileage is low.'
-        },
-        {
-            'title': '2020 Toyota Camry TRD',
-            'price': '$32,000',
-            'mileage': '25,000 miles',
-            'location': 'San Francisco, CA',
-            'link': 'https://example.com/car456',
-            'analysis': 'A reliable and sporty sedan. Good value for the price.'
-        }
+        Listing(
+            make='Honda', model='Civic Type R', year=2018, price=35000.0, mileage=30000,
+            location='Los Angeles, CA', url='https://example.com/car123',
+            analysis='This is a great car for enthusiasts. The price is a bit high, but the mileage is low.'
+        ),
+        Listing(
+            make='Toyota', model='Camry TRD', year=2020, price=32000.0, mileage=25000,
+            location='San Francisco, CA', url='https://example.com/car456',
+            analysis='A reliable and sporty sedan. Good value for the price.'
+        ),
     ]
 
     html_digest = generate_digest(sample_cars)
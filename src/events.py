@@ -0,0 +1,68 @@
+import collections
+import itertools
+import queue
+import threading
+
+DEFAULT_SUBSCRIBER_QUEUE_SIZE = 1000
+DEFAULT_HISTORY_SIZE = 500
+
+Event = collections.namedtuple('Event', ['id', 'type', 'data'])
+
+class EventBus:
+    """
+    In-process publish/subscribe bus for pipeline progress events.
+
+    Every subscriber gets its own bounded queue. A subscriber that falls behind
+    loses its oldest events rather than blocking the publisher. The most recent
+    events are kept so a reconnecting client can resume from its last event id.
+    """
+
+    def __init__(self, subscriber_queue_size=DEFAULT_SUBSCRIBER_QUEUE_SIZE, history_size=DEFAULT_HISTORY_SIZE):
+        self.subscriber_queue_size = subscriber_queue_size
+        self._ids = itertools.count(1)
+        self._history = collections.deque(maxlen=history_size)
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def publish(self, event_type, data):
+        """Publishes an event to every current subscriber."""
+        with self._lock:
+            event = Event(next(self._ids), event_type, data)
+            self._history.append(event)
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            while True:
+                try:
+                    subscriber.put_nowait(event)
+                    break
+                except queue.Full:
+                    try:
+                        subscriber.get_nowait()
+                    except queue.Empty:
+                        pass
+        return event
+
+    def subscribe(self, last_event_id=None):
+        """
+        Registers a subscriber.
+
+        Args:
+            last_event_id: Replay retained events newer than this id, if given.
+
+        Returns:
+            A queue.Queue that receives Event tuples. Pass it to `unsubscribe` when done.
+        """
+        subscriber = queue.Queue(maxsize=self.subscriber_queue_size)
+        with self._lock:
+            if last_event_id is not None:
+                for event in self._history:
+                    if event.id > last_event_id:
+                        subscriber.put_nowait(event)
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+event_bus = EventBus()
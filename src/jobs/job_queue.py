@@ -0,0 +1,376 @@
+import json
+import logging
+import os
+import socket
+import threading
+import time
+
+from src.database.connections import connection
+from src.metrics import collect_timings, count
+
+ACTIVE_STATUSES = ('queued', 'running')
+DEFAULT_WORKERS = int(os.environ.get("JOB_WORKERS", 2))
+DEFAULT_POLL_SECONDS = 1.0
+# A running job whose worker hasn't reported for this long is assumed dead.
+STALE_JOB_SECONDS = int(os.environ.get("JOB_STALE_SECONDS", 300))
+# How often a worker refreshes the heartbeat of the job it runs, whether or not
+# the handler reports progress; well under STALE_JOB_SECONDS.
+HEARTBEAT_SECONDS = float(os.environ.get("JOB_HEARTBEAT_SECONDS", 30))
+# How often idle workers look for stale jobs to requeue.
+REQUEUE_INTERVAL_SECONDS = 60
+
+class JobCancelled(Exception):
+    """Raised inside a job handler when cancellation has been requested."""
+
+class DuplicateJob(Exception):
+    """Raised by enqueue when an active job with the same dedup key exists."""
+
+    def __init__(self, job_id):
+        super().__init__(f"Job {job_id} is already active.")
+        self.job_id = job_id
+
+def _stage_metrics(stage, now):
+    done, total, started = stage.get('done', 0), stage.get('total'), stage.get('started_at')
+    elapsed = max(now - started, 1e-6) if started else None
+    rate = done / elapsed if elapsed and done else 0.0
+    eta = (total - done) / rate if rate and total is not None and total >= done else None
+    return rate, eta
+
+class JobQueue:
+    """
+    SQLite-backed job queue shared by every worker thread and process.
+
+    Jobs move queued -> running -> completed | failed | cancelled. Claiming a job
+    takes a write lock, so two workers never run the same job.
+    """
+
+    def __init__(self, db_file):
+        self.db_file = db_file
+
+    def _connect(self):
+        return connection(self.db_file, autocommit=True)
+
+    def enqueue(self, kind, params=None, dedup_key=None):
+        """
+        Adds a job.
+
+        Args:
+            kind: Selects the handler that runs the job.
+            params: JSON-serialisable job parameters.
+            dedup_key: Jobs with the same key may not be active at the same time,
+                e.g. one scrape per source and query.
+
+        Returns:
+            The new job id.
+
+        Raises:
+            DuplicateJob: If an active job with `dedup_key` exists. A running job
+                whose worker stopped reporting doesn't count; it is failed instead,
+                so it isn't requeued alongside the new one.
+        """
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if dedup_key is not None:
+                    now = time.time()
+                    cutoff = now - STALE_JOB_SECONDS
+                    row = conn.execute(
+                        "SELECT id FROM jobs WHERE dedup_key = ? "
+                        "AND (status = 'queued' OR (status = 'running' AND heartbeat_at >= ?))", (dedup_key, cutoff)
+                    ).fetchone()
+                    if row:
+                        raise DuplicateJob(row[0])
+                    conn.execute(
+                        "UPDATE jobs SET status = 'failed', message = 'Worker lost; superseded by a new job.', "
+                        "finished_at = ? WHERE dedup_key = ? AND status = 'running' AND heartbeat_at < ?",
+                        (now, dedup_key, cutoff)
+                    )
+                cur = conn.execute(
+                    "INSERT INTO jobs(kind, dedup_key, params, status, message, created_at) VALUES(?,?,?,?,?,?)",
+                    (kind, dedup_key, json.dumps(params or {}), 'queued', 'Job queued.', time.time())
+                )
+                conn.execute("COMMIT")
+                return cur.lastrowid
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def claim(self, worker, kinds):
+        """Atomically marks the oldest queued job of one of `kinds` as running and returns it."""
+        placeholders = ",".join("?" for _ in kinds)
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                f"SELECT id FROM jobs WHERE status = 'queued' AND kind IN ({placeholders}) ORDER BY id LIMIT 1",
+                tuple(kinds)
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            now = time.time()
+            conn.execute(
+                "UPDATE jobs SET status = 'running', worker = ?, started_at = ?, heartbeat_at = ?, message = ? WHERE id = ?",
+                (worker, now, now, 'Job started.', row[0])
+            )
+            conn.execute("COMMIT")
+        return self.get(row[0])
+
+    def update_progress(self, job_id, stage, done=None, total=None, message=None):
+        """Records progress of one stage and refreshes the job's heartbeat."""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            progress = json.loads(conn.execute("SELECT progress FROM jobs WHERE id = ?", (job_id,)).fetchone()[0])
+            entry = progress.setdefault(stage, {'done': 0, 'total': None, 'started_at': now})
+            if done is not None:
+                entry['done'] = done
+            if total is not None:
+                entry['total'] = total
+            conn.execute(
+                "UPDATE jobs SET stage = ?, progress = ?, heartbeat_at = ?, message = COALESCE(?, message) WHERE id = ?",
+                (stage, json.dumps(progress), now, message, job_id)
+            )
+            conn.execute("COMMIT")
+
+    def finish(self, job_id, status, message, timings=None):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, message = ?, finished_at = ?, timings = ? WHERE id = ?",
+                (status, message, time.time(), json.dumps(timings) if timings is not None else None, job_id)
+            )
+
+    def heartbeat(self, job_id):
+        """Refreshes a running job's heartbeat, so it isn't taken for stale."""
+        with self._connect() as conn:
+            conn.execute("UPDATE jobs SET heartbeat_at = ? WHERE id = ? AND status = 'running'", (time.time(), job_id))
+
+    def cancel(self, job_id):
+        """
+        Cancels a queued job immediately, or asks a running job to stop.
+
+        Returns:
+            True if the job was active.
+        """
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            queued = conn.execute(
+                "UPDATE jobs SET status = 'cancelled', message = 'Job cancelled.', finished_at = ? "
+                "WHERE id = ? AND status = 'queued'", (time.time(), job_id)
+            ).rowcount
+            running = conn.execute(
+                "UPDATE jobs SET cancel_requested = 1, message = 'Cancellation requested.' "
+                "WHERE id = ? AND status = 'running'", (job_id,)
+            ).rowcount
+            conn.execute("COMMIT")
+        return bool(queued or running)
+
+    def is_cancel_requested(self, job_id):
+        with self._connect() as conn:
+            row = conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(row and row[0])
+
+    def requeue_stale(self, live_prefix=None):
+        """
+        Puts running jobs whose worker stopped reporting back on the queue.
+
+        Args:
+            live_prefix: Worker name prefix of the calling process, whose jobs are
+                never requeued: its workers are alive and still running them.
+        """
+        cutoff = time.time() - STALE_JOB_SECONDS
+        with self._connect() as conn:
+            count = conn.execute(
+                "UPDATE jobs SET status = 'queued', worker = NULL, message = 'Requeued after worker loss.' "
+                "WHERE status = 'running' AND heartbeat_at < ? "
+                "AND (? IS NULL OR worker IS NULL OR substr(worker, 1, length(?)) != ?)",
+                (cutoff, live_prefix, live_prefix, live_prefix)
+            ).rowcount
+        if count:
+            logging.warning(f"Requeued {count} stale jobs.")
+        return count
+
+    def _to_dict(self, row):
+        job = dict(zip(
+            ('id', 'kind', 'params', 'status', 'message', 'stage', 'progress', 'cancel_requested',
+             'created_at', 'started_at', 'finished_at'), row))
+        job['params'] = json.loads(job['params'])
+        job['progress'] = json.loads(job['progress'])
+        job['cancel_requested'] = bool(job['cancel_requested'])
+
+        now = job['finished_at'] or time.time()
+        for stage in job['progress'].values():
+            rate, eta = _stage_metrics(stage, now)
+            stage['per_second'] = round(rate, 3)
+            stage['eta_seconds'] = round(eta, 1) if eta is not None and job['status'] == 'running' else None
+        current = job['progress'].get(job['stage'] or '', {})
+        job['listings_per_second'] = current.get('per_second', 0.0)
+        # The job can't finish before its slowest stage with a known total.
+        etas = [stage['eta_seconds'] for stage in job['progress'].values() if stage['eta_seconds'] is not None]
+        job['eta_seconds'] = max(etas) if etas else None
+        return job
+
+    _COLUMNS = "id, kind, params, status, message, stage, progress, cancel_requested, created_at, started_at, finished_at"
+
+    def get(self, job_id):
+        """Returns the job as a dict with per-stage throughput and ETA, or None."""
+        with self._connect() as conn:
+            row = conn.execute(f"SELECT {self._COLUMNS} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def timings(self, job_id):
+        """Returns the per-stage timing report of a finished job, or None."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT timings FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row and row[0] else None
+
+    def latest(self, kind=None):
+        with self._connect() as conn:
+            if kind:
+                row = conn.execute(f"SELECT {self._COLUMNS} FROM jobs WHERE kind = ? ORDER BY id DESC LIMIT 1",
+                                   (kind,)).fetchone()
+            else:
+                row = conn.execute(f"SELECT {self._COLUMNS} FROM jobs ORDER BY id DESC LIMIT 1").fetchone()
+        return self._to_dict(row) if row else None
+
+class JobContext:
+    """Handed to job handlers to report progress and observe cancellation."""
+
+    def __init__(self, queue, job, on_update=None):
+        self.queue = queue
+        self.job = job
+        self.id = job['id']
+        self.params = job['params']
+        self.on_update = on_update
+
+    def progress(self, stage, done=None, total=None, message=None):
+        self.queue.update_progress(self.id, stage, done, total, message)
+        if self.on_update:
+            self.on_update(self.queue.get(self.id))
+
+    def check_cancelled(self):
+        """Raises JobCancelled if cancellation was requested."""
+        if self.queue.is_cancel_requested(self.id):
+            raise JobCancelled()
+
+class WorkerPool:
+    """
+    Threads that claim and run jobs from a JobQueue.
+
+    Several pools (in several processes) can share one queue; claiming is atomic.
+    `handlers` maps job kind to a callable taking a JobContext and returning a
+    completion message. While a handler runs, its job's heartbeat is refreshed
+    every HEARTBEAT_SECONDS, so only jobs left by a dead process go stale.
+    """
+
+    def __init__(self, queue, handlers, workers=DEFAULT_WORKERS, poll_seconds=DEFAULT_POLL_SECONDS, on_update=None):
+        self.queue = queue
+        self.handlers = handlers
+        self.workers = workers
+        self.poll_seconds = poll_seconds
+        self.on_update = on_update
+        self._threads = []
+        self._stop = threading.Event()
+        self._started = False
+        self._lock = threading.Lock()
+        self._next_requeue = 0.0
+
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        self._requeue_stale()
+        for i in range(self.workers):
+            name = f"{self._worker_prefix()}{i}"
+            thread = threading.Thread(target=self._run, args=(name,), name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    @staticmethod
+    def _worker_prefix():
+        return f"{socket.gethostname()}:{os.getpid()}:"
+
+    def _requeue_stale(self):
+        # Jobs can go stale while this pool runs (another process died), so
+        # idle workers check again every REQUEUE_INTERVAL_SECONDS.
+        now = time.monotonic()
+        with self._lock:
+            if now < self._next_requeue:
+                return
+            self._next_requeue = now + REQUEUE_INTERVAL_SECONDS
+        try:
+            self.queue.requeue_stale(live_prefix=self._worker_prefix())
+        except Exception as e:
+            logging.error(f"Failed to requeue stale jobs: {e}")
+
+    def _notify(self, job_id):
+        if self.on_update:
+            self.on_update(self.queue.get(job_id))
+
+    def _run(self, name):
+        while not self._stop.is_set():
+            try:
+                job = self.queue.claim(name, list(self.handlers))
+            except Exception as e:
+                logging.error(f"Job worker {name} failed to claim a job: {e}")
+                job = None
+            if job is None:
+                self._requeue_stale()
+                self._stop.wait(self.poll_seconds)
+                continue
+            self._execute(job)
+
+    def _heartbeat(self, job_id, done):
+        while not done.wait(HEARTBEAT_SECONDS):
+            try:
+                self.queue.heartbeat(job_id)
+            except Exception as e:
+                logging.error(f"Failed to refresh the heartbeat of job {job_id}: {e}")
+
+    def _execute(self, job):
+        self._notify(job['id'])
+        context = JobContext(self.queue, job, self.on_update)
+        done = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(job['id'], done),
+                                     name=f"job-heartbeat-{job['id']}", daemon=True)
+        heartbeat.start()
+        start = time.perf_counter()
+        with collect_timings() as report:
+            try:
+                status, message = 'completed', self.handlers[job['kind']](context) or 'Job completed.'
+            except JobCancelled:
+                status, message = 'cancelled', 'Job cancelled.'
+            except Exception as e:
+                logging.error(f"Job {job['id']} failed: {e}", exc_info=True)
+                status, message = 'failed', f'An unexpected error occurred: {e}'
+            finally:
+                done.set()
+                heartbeat.join()
+        timings = dict(report.as_dict(), wall_seconds=time.perf_counter() - start)
+        self.queue.finish(job['id'], status, message, timings)
+        count('car_finder_jobs_total', kind=job['kind'], status=status)
+        self._notify(job['id'])
+        return status
+
+    def run_pending(self):
+        """
+        Runs queued jobs in the calling thread, oldest first, until none are left.
+
+        For one-shot processes such as the CronJob, which enqueue their work and
+        run it without starting worker threads.
+
+        Returns:
+            A list of (job id, status) in the order the jobs ran.
+        """
+        name = f"{self._worker_prefix()}main"
+        finished = []
+        while True:
+            job = self.queue.claim(name, list(self.handlers))
+            if job is None:
+                return finished
+            finished.append((job['id'], self._execute(job)))
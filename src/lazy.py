@@ -0,0 +1,54 @@
+import importlib
+import sys
+import threading
+
+_declared = []
+_declared_lock = threading.Lock()
+
+class LazyModule:
+    """
+    Stands in for a module that is imported when one of its attributes is first used.
+
+    Heavy backends (Selenium, the LLM clients, NumPy, Jinja2) are declared this
+    way so processes that never use them, like an API pod serving /api/cars,
+    don't pay for importing them. The import goes through importlib, whose
+    per-module locks make concurrent first uses from several threads safe.
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def _load(self):
+        module = self._module
+        if module is None:
+            module = self._module = importlib.import_module(self._name)
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = 'loaded' if self._module is not None else 'not loaded'
+        return f"<lazy module {self._name!r} ({state})>"
+
+def lazy_import(name):
+    """
+    Declares a module to import on first use.
+
+    Args:
+        name: The absolute module name, e.g. 'src.scraper.dynamic_scraper'.
+
+    Returns:
+        The module if it is already imported, otherwise a LazyModule for it.
+    """
+    with _declared_lock:
+        if name not in _declared:
+            _declared.append(name)
+    module = sys.modules.get(name)
+    return module if module is not None else LazyModule(name)
+
+def declared_modules():
+    """Returns the names passed to lazy_import so far, in declaration order."""
+    with _declared_lock:
+        return list(_declared)
@@ -0,0 +1,72 @@
+LISTING_COLUMNS = (
+    'id', 'make', 'model', 'year', 'price', 'mileage', 'vin', 'location', 'url', 'source_site',
+    'scraped_timestamp', 'canonical_id', 'first_seen', 'last_seen',
+)
+# Set on the listings picked for a digest.
+DIGEST_FIELDS = ('analysis', 'deal_score', 'expected_price', 'previous_price', 'price_drop')
+
+class Listing:
+    """
+    One car listing, from the scraper through the database and analyzers to the digest.
+
+    Fields are the `listings` columns plus the digest annotations; any not
+    given are None. Slots keep a listing to a fixed, dict-free layout, which
+    matters when a page of thousands is held in memory at once.
+    """
+
+    __slots__ = LISTING_COLUMNS + DIGEST_FIELDS
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            setattr(self, name, fields.pop(name, None))
+        if fields:
+            raise TypeError(f"Unknown listing fields: {', '.join(sorted(fields))}")
+
+    @classmethod
+    def from_dict(cls, data):
+        """Builds a listing from a dict, ignoring keys that aren't listing fields."""
+        return cls(**{name: data[name] for name in cls.__slots__ if name in data})
+
+    @property
+    def title(self):
+        return f"{self.year} {self.make} {self.model}"
+
+    @property
+    def link(self):
+        return self.url
+
+    def to_dict(self):
+        """
+        Returns the listing as a JSON-ready dict.
+
+        Digest fields are only included once set; `title` and `link` are added
+        for the frontend and templates.
+        """
+        data = {name: getattr(self, name) for name in LISTING_COLUMNS}
+        for name in DIGEST_FIELDS:
+            value = getattr(self, name)
+            if value is not None:
+                data[name] = value
+        data['title'] = self.title
+        data['link'] = self.url
+        return data
+
+    def __eq__(self, other):
+        if not isinstance(other, Listing):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self):
+        return f"Listing(id={self.id!r}, title={self.title!r}, price={self.price!r}, url={self.url!r})"
+
+def listing_factory(cursor, row):
+    """
+    sqlite3 row factory that builds a Listing.
+
+    Columns that aren't listing fields (e.g. computed ones in a join) are ignored.
+    """
+    listing = Listing()
+    for (name, *_), value in zip(cursor.description, row):
+        if name in Listing.__slots__:
+            setattr(listing, name, value)
+    return listing
@@ -0,0 +1,152 @@
+import bisect
+import contextlib
+import contextvars
+import threading
+import time
+
+# Upper bounds (seconds) of the latency histogram buckets; they span a fast DB
+# batch to a slow LLM response.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+STAGE_METRIC = 'car_finder_stage_seconds'
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+def _format_value(value):
+    return repr(float(value)) if value != float('inf') else '+Inf'
+
+class Registry:
+    """
+    Thread-safe counters and histograms, rendered in the Prometheus text format.
+
+    Metrics are created on first use; `describe` attaches HELP text.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._help = {}
+        self._counters = {}
+        self._histograms = {}
+
+    def describe(self, name, help_text):
+        self._help[name] = help_text
+
+    def inc(self, name, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            counts, total = series.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            series[key] = (counts, total + value)
+
+    def render(self):
+        """Returns every metric in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                lines.append(f"# HELP {name} {self._help.get(name, name)}")
+                lines.append(f"# TYPE {name} counter")
+                for key, value in sorted(series.items()):
+                    lines.append(f"{name}{_format_labels(key)} {_format_value(value)}")
+            for name, series in sorted(self._histograms.items()):
+                lines.append(f"# HELP {name} {self._help.get(name, name)}")
+                lines.append(f"# TYPE {name} histogram")
+                for key, (counts, total) in sorted(series.items()):
+                    cumulative = 0
+                    for bound, count in zip(self.buckets + (float('inf'),), counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_format_labels(key, [('le', _format_value(bound))])} {cumulative}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {_format_value(total)}")
+                    lines.append(f"{name}_count{_format_labels(key)} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+class TimingReport:
+    """Per-stage timing totals for one job, collected alongside the registry."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages = {}
+        self._counters = {}
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            entry = self._stages.setdefault(stage, {'count': 0, 'total_seconds': 0.0, 'max_seconds': 0.0})
+            entry['count'] += 1
+            entry['total_seconds'] += seconds
+            entry['max_seconds'] = max(entry['max_seconds'], seconds)
+
+    def inc(self, name, amount=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def as_dict(self):
+        with self._lock:
+            stages = {
+                stage: dict(entry, mean_seconds=entry['total_seconds'] / entry['count'])
+                for stage, entry in self._stages.items()
+            }
+            return {'stages': stages, 'counters': dict(self._counters)}
+
+registry = Registry()
+registry.describe(STAGE_METRIC, "Time spent per pipeline stage.")
+registry.describe('car_finder_listings_total', "Scraped listings by ingest outcome.")
+registry.describe('car_finder_llm_requests_total', "LLM requests by backend and outcome.")
+registry.describe('car_finder_jobs_total', "Finished jobs by kind and status.")
+registry.describe('car_finder_cards_total', "Vehicle cards extracted by scraper.")
+registry.describe('car_finder_pages_total', "Crawled result pages by scraper and outcome.")
+registry.describe('car_finder_source_pages_total', "Result pages handled, by source and status.")
+registry.describe('car_finder_digests_total', "Digest emails by outcome.")
+registry.describe('car_finder_db_connections_total', "SQLite connections opened by mode.")
+registry.describe('car_finder_response_cache_total', "Cached API responses by outcome.")
+
+# The report of the job running in the current context. Worker threads that
+# do work for a job must run in a copy of its context (contextvars.copy_context).
+_current_report = contextvars.ContextVar('current_report', default=None)
+
+def observe_stage(stage, seconds, **labels):
+    """Records one timing of a pipeline stage."""
+    registry.observe(STAGE_METRIC, seconds, stage=stage, **labels)
+    report = _current_report.get()
+    if report is not None:
+        report.observe(stage, seconds)
+
+def count(name, amount=1, **labels):
+    """Increments a counter, and the current job's report when there is one."""
+    registry.inc(name, amount, **labels)
+    report = _current_report.get()
+    if report is not None:
+        suffix = ','.join(f'{k}={v}' for k, v in sorted(labels.items()))
+        report.inc(f'{name}{{{suffix}}}' if suffix else name, amount)
+
+@contextlib.contextmanager
+def timer(stage, **labels):
+    """Times the enclosed block as one observation of `stage`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - start, **labels)
+
+@contextlib.contextmanager
+def collect_timings():
+    """Collects every stage timing and count made in this context into a TimingReport."""
+    report = TimingReport()
+    token = _current_report.set(report)
+    try:
+        yield report
+    finally:
+        _current_report.reset(token)
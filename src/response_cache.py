@@ -0,0 +1,117 @@
+import collections
+import gzip
+import hashlib
+import os
+import threading
+
+DEFAULT_MAX_BYTES = int(os.environ.get('RESPONSE_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+# Smaller bodies gain too little from compression to pay for the header and CPU.
+GZIP_MIN_BYTES = 1024
+GZIP_LEVEL = 6
+COMPRESSIBLE_MIMETYPES = ('application/json', 'application/x-ndjson', 'text/html', 'text/plain', 'text/csv')
+
+CachedResponse = collections.namedtuple('CachedResponse', ['body', 'gzip_body', 'etag', 'content_type', 'headers'])
+
+def make_entry(body, content_type, headers=()):
+    """
+    Prepares a response body for caching: hashes it once and compresses it once.
+
+    Args:
+        body: The uncompressed body bytes.
+        content_type: The Content-Type header value.
+        headers: Other (name, value) headers to replay, e.g. Content-Disposition.
+
+    Returns:
+        A CachedResponse. `etag` is the unquoted strong entity tag of `body`;
+        `gzip_body` is None when the body isn't worth compressing.
+    """
+    etag = hashlib.blake2b(body, digest_size=16).hexdigest()
+    gzip_body = None
+    if len(body) >= GZIP_MIN_BYTES and content_type.split(';')[0].strip() in COMPRESSIBLE_MIMETYPES:
+        # mtime=0 keeps the compressed bytes, and so their ETag, reproducible.
+        compressed = gzip.compress(body, GZIP_LEVEL, mtime=0)
+        gzip_body = compressed if len(compressed) < len(body) else None
+    return CachedResponse(body, gzip_body, etag, content_type, tuple(headers))
+
+def gzip_etag(etag):
+    """The entity tag of the gzip-encoded variant; a strong tag must differ per encoding."""
+    return f"{etag}-gzip"
+
+class ResponseCache:
+    """
+    In-process LRU of rendered API responses, bounded by total body size.
+
+    Entries are keyed on the request plus the data version they were rendered
+    at. Seeing a newer version drops every older entry at once, since none of
+    them can be served again.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, max_entry_bytes=None):
+        self.max_bytes = max_bytes
+        # One huge export shouldn't flush everything else.
+        self.max_entry_bytes = max_entry_bytes if max_entry_bytes is not None else max_bytes // 8
+        self._entries = collections.OrderedDict()
+        self._version = None
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _size(entry):
+        return len(entry.body) + len(entry.gzip_body or b'')
+
+    def _sync_version(self, version):
+        if version != self._version:
+            self._entries.clear()
+            self._bytes = 0
+            self._version = version
+
+    def get(self, key, version):
+        """Returns the CachedResponse for `key` at `version`, or None."""
+        with self._lock:
+            if version == self._version:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry
+            self.misses += 1
+            return None
+
+    def put(self, key, version, entry):
+        """
+        Stores `entry`, rendered at `version`, evicting the least recently used.
+
+        A response rendered at an older version than the cache has seen is not
+        stored, nor is one larger than `max_entry_bytes`.
+
+        Returns:
+            The entry, for chaining.
+        """
+        size = self._size(entry)
+        with self._lock:
+            if self._version is not None and version < self._version:
+                return entry
+            self._sync_version(version)
+            if size > self.max_entry_bytes:
+                return entry
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= self._size(previous)
+            self._entries[key] = entry
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= self._size(evicted)
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self._bytes, 'version': self._version,
+                    'hits': self.hits, 'misses': self.misses}
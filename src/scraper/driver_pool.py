@@ -0,0 +1,204 @@
+import atexit
+import contextlib
+import logging
+import os
+import queue
+import signal
+import threading
+
+from selenium import webdriver
+from selenium.webdriver.chrome.service import Service as ChromeService
+
+from src.metrics import timer
+
+DEFAULT_POOL_SIZE = int(os.environ.get("WEBDRIVER_POOL_SIZE", 2))
+# Recycle a browser after this many pages to bound memory growth in Chrome.
+DEFAULT_MAX_PAGES = int(os.environ.get("WEBDRIVER_MAX_PAGES", 50))
+DRIVER_PATH_CACHE = os.environ.get(
+    "CHROMEDRIVER_PATH_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "car-finder-agent", "chromedriver_path"))
+
+_driver_path = None
+_driver_path_lock = threading.Lock()
+
+def resolve_driver_path():
+    """
+    Resolves the chromedriver binary once per process.
+
+    Uses CHROMEDRIVER_PATH if set, then the path cached on disk by a previous run,
+    and only falls back to webdriver-manager (which may hit the network) when
+    neither exists.
+
+    Returns:
+        The path to the chromedriver binary.
+    """
+    global _driver_path
+    with _driver_path_lock:
+        if _driver_path and os.path.exists(_driver_path):
+            return _driver_path
+
+        path = os.environ.get("CHROMEDRIVER_PATH")
+        if not path and os.path.exists(DRIVER_PATH_CACHE):
+            with open(DRIVER_PATH_CACHE) as f:
+                path = f.read().strip()
+        if not path or not os.path.exists(path):
+            from webdriver_manager.chrome import ChromeDriverManager
+            logging.info("[*] Resolving chromedriver with webdriver-manager...")
+            path = ChromeDriverManager().install()
+            try:
+                os.makedirs(os.path.dirname(DRIVER_PATH_CACHE), exist_ok=True)
+                with open(DRIVER_PATH_CACHE, 'w') as f:
+                    f.write(path)
+            except OSError as e:
+                logging.warning(f"Could not cache chromedriver path: {e}")
+
+        _driver_path = path
+        return path
+
+def default_chrome_options():
+    options = webdriver.ChromeOptions()
+    options.add_argument('--headless')
+    options.add_argument('--no-sandbox')
+    options.add_argument('--disable-dev-shm-usage')
+    return options
+
+class DriverPool:
+    """
+    Pool of warm headless Chrome instances.
+
+    Drivers are created lazily up to `size`, health-checked when handed out,
+    and recycled after `max_pages` page loads.
+    """
+
+    def __init__(self, size=DEFAULT_POOL_SIZE, max_pages=DEFAULT_MAX_PAGES, options_factory=default_chrome_options):
+        self.size = size
+        self.max_pages = max_pages
+        self.options_factory = options_factory
+        self._idle = queue.LifoQueue()
+        self._pages = {}
+        self._created = 0
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _launch(self):
+        logging.info("[*] Initializing Chrome driver...")
+        with timer('browser_launch'):
+            return webdriver.Chrome(service=ChromeService(resolve_driver_path()), options=self.options_factory())
+
+    def _quit(self, driver):
+        with self._lock:
+            self._pages.pop(id(driver), None)
+            self._created -= 1
+        try:
+            driver.quit()
+        except Exception as e:
+            logging.warning(f"Error quitting Chrome driver: {e}")
+
+    @staticmethod
+    def _is_healthy(driver):
+        try:
+            driver.execute_script("return 1")
+            return True
+        except Exception:
+            return False
+
+    def warm(self):
+        """Launches browsers until the pool holds `size` idle instances."""
+        while True:
+            with self._lock:
+                if self._created >= self.size or self._closed:
+                    return
+                self._created += 1
+            try:
+                driver = self._launch()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+            with self._lock:
+                self._pages[id(driver)] = 0
+            self._idle.put(driver)
+
+    def _checkout(self, timeout):
+        while True:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                with self._lock:
+                    if self._closed:
+                        raise RuntimeError("Driver pool is shut down.")
+                    can_launch = self._created < self.size
+                    if can_launch:
+                        self._created += 1
+                if can_launch:
+                    try:
+                        driver = self._launch()
+                    except Exception:
+                        with self._lock:
+                            self._created -= 1
+                        raise
+                    with self._lock:
+                        self._pages[id(driver)] = 0
+                    return driver
+                driver = self._idle.get(timeout=timeout)
+
+            if self._is_healthy(driver):
+                return driver
+            logging.warning("[*] Discarding unhealthy Chrome driver.")
+            self._quit(driver)
+
+    @contextlib.contextmanager
+    def driver(self, timeout=None):
+        """
+        Checks out a driver for one page.
+
+        Args:
+            timeout: Seconds to wait for a free driver, or None to wait forever.
+
+        Yields:
+            A healthy selenium WebDriver.
+        """
+        driver = self._checkout(timeout)
+        try:
+            yield driver
+        finally:
+            with self._lock:
+                self._pages[id(driver)] = self._pages.get(id(driver), 0) + 1
+                exhausted = self._pages[id(driver)] >= self.max_pages or self._closed
+            if exhausted:
+                self._quit(driver)
+            else:
+                self._idle.put(driver)
+
+    def shutdown(self):
+        """Quits every idle driver and refuses new checkouts."""
+        with self._lock:
+            self._closed = True
+        while True:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._quit(driver)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def _exit_on_sigterm(signum, frame):
+    raise SystemExit(128 + signum)
+
+def get_driver_pool():
+    """
+    Returns the process-wide driver pool, creating it on first use.
+
+    The pool is shut down at interpreter exit. SIGTERM (sent by Kubernetes when a
+    pod or CronJob is stopped) is turned into a normal exit so that happens too.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = DriverPool()
+            atexit.register(_pool.shutdown)
+            if threading.current_thread() is threading.main_thread() \
+                    and signal.getsignal(signal.SIGTERM) is signal.SIG_DFL:
+                signal.signal(signal.SIGTERM, _exit_on_sigterm)
+        return _pool
@@ -1,89 +1,137 @@
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service as ChromeService
-from webdriver_manager.chrome import ChromeDriverManager
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
+import asyncio
 import logging
+from src.metrics import count, timer
+from src.scraper.driver_pool import DriverPool, get_driver_pool
+from src.scraper.extract import (
+    CARS_COM_CARD_SPEC, extract_cards_from_html, extract_cards_with_elements, extract_cards_with_script,
+    parse_cards, parse_cars_com_card,
+)
 
-def scrape_cars_com(driver):
+EXTRACTION_MODES = ('script', 'html', 'elements')
+DEFAULT_CONCURRENCY = 2
+DEFAULT_REQUESTS_PER_SECOND = 1.0
+
+def scrape_cars_com(driver, mode='script', spec=CARS_COM_CARD_SPEC, seen=None, parse_card=parse_cars_com_card):
+    """
+    Extracts listings from a cars.com-style results page.
+
+    `script` pulls every card in one execute_script round-trip, `html` parses
+    driver.page_source in-process, and `elements` is the original
+    per-field WebDriver path, also used as the fallback if the others fail.
+    Cards already in `seen` (a SeenIndex or PageSeen) at the same price are skipped
+    before their remaining fields are extracted; `parse_card` turns the
+    remaining raw cards into Listings.
+    """
+    keep = seen.keep if seen is not None else None
     logging.info("[*] Waiting for car listings to load...")
-    WebDriverWait(driver, 30).until(
-        EC.presence_of_element_located((By.CSS_SELECTOR, '.vehicle-card'))
-    )
+    with timer('card_wait'):
+        WebDriverWait(driver, 30).until(
+            EC.presence_of_element_located((By.CSS_SELECTOR, spec['card']))
+        )
     logging.info("[*] Car listings found.")
 
-    listings = []
-    car_elements = driver.find_elements(By.CSS_SELECTOR, '.vehicle-card')
-    logging.info(f"[*] Found {len(car_elements)} car listings.")
-
-    for i, car_element in enumerate(car_elements):
-        logging.info(f"  - Processing car {i+1}/{len(car_elements)}...")
+    with timer('card_extraction', mode=mode):
+        raw_cards = None
         try:
-            title_element = car_element.find_element(By.CSS_SELECTOR, '.vehicle-card-title')
-            title = title_element.text.strip()
-            year, make, *model_parts = title.split()
-            model = " ".join(model_parts)
-
-            price_element = car_element.find_element(By.CSS_SELECTOR, '.primary-price')
-            price = price_element.text.strip().replace('$', '').replace(',', '')
-
-            mileage_element = car_element.find_element(By.CSS_SELECTOR, 'div.mileage')
-            mileage = mileage_element.text.strip().replace(' mi.', '').replace(',', '')
-
-            location_element = car_element.find_element(By.CSS_SELECTOR, 'div.dealer-name')
-            location = location_element.text.strip()
-            
-            url_element = car_element.find_element(By.CSS_SELECTOR, 'a')
-            url = url_element.get_attribute('href')
-
-
-            listings.append({
-                'make': make,
-                'model': model,
-                'year': int(year),
-                'price': float(price),
-                'mileage': int(mileage),
-                'location': location,
-                'vin': None,
-                'url': url,
-            })
-            logging.info(f"  - Scraped: {{'make': make, 'model': model, 'year': year, 'price': price}}")
+            if mode == 'script':
+                raw_cards = extract_cards_with_script(driver, spec, keep)
+            elif mode == 'html':
+                raw_cards = extract_cards_from_html(driver.page_source, spec, base_url=driver.current_url, keep=keep)
         except Exception as e:
-            logging.error(f"Error processing car listing: {e}")
-            continue
+            logging.warning(f"[*] {mode} extraction failed ({e}); falling back to per-element extraction.")
+        if raw_cards is None:
+            raw_cards = extract_cards_with_elements(driver, spec, keep)
+        listings = parse_cards(raw_cards, parse_card)
+    logging.info(f"[*] Found {len(raw_cards)} {'new ' if keep else ''}car listings.")
+    count('car_finder_cards_total', len(raw_cards), scraper='dynamic')
 
+    logging.info(f"[*] Parsed {len(listings)} of {len(raw_cards)} car listings.")
     return listings
 
-def scrape_dynamic_site(url="file:///app/listings.html"):
+def scrape_dynamic_site(url="file:///app/listings.html", pool=None, seen=None, spec=CARS_COM_CARD_SPEC,
+                        parse_card=parse_cars_com_card, raise_errors=False):
     logging.info("[*] Entering scrape_dynamic_site function")
-    options = webdriver.ChromeOptions()
-    options.add_argument('--headless')
-    options.add_argument('--no-sandbox')
-    options.add_argument('--disable-dev-shm-usage')
-    
-    logging.info("[*] Initializing Chrome driver...")
-    driver = webdriver.Chrome(service=ChromeService(ChromeDriverManager().install()), options=options)
-    
-    try:
-        logging.info(f"[*] Navigating to URL: {url}")
-        driver.get(url)
-        logging.info("[*] Successfully navigated to URL")
+    pool = pool or get_driver_pool()
 
-        listings = scrape_cars_com(driver)
+    with pool.driver() as driver:
+        try:
+            logging.info(f"[*] Navigating to URL: {url}")
+            with timer('page_load', scraper='dynamic'):
+                driver.get(url)
+            logging.info("[*] Successfully navigated to URL")
+
+            listings = scrape_cars_com(driver, spec=spec, seen=seen, parse_card=parse_card)
+
+            logging.info("[*] Scraping completed successfully.")
+            return listings
+
+        except Exception as e:
+            logging.error(f"An error occurred: {e}")
+            # Save a screenshot for debugging
+            driver.save_screenshot("/app/database/screenshot.png")
+            logging.info("[*] Screenshot saved to /app/database/screenshot.png")
+            if raise_errors:
+                raise
+            return []
 
-        logging.info("[*] Scraping completed successfully.")
-        return listings
+async def crawl_dynamic_site(urls, spec=CARS_COM_CARD_SPEC, parse_card=parse_cars_com_card,
+                             concurrency=DEFAULT_CONCURRENCY, requests_per_second=DEFAULT_REQUESTS_PER_SECOND,
+                             seen=None, on_page=None, pool=None):
+    """
+    Loads result pages in up to `concurrency` browsers at once.
 
-    except Exception as e:
-        logging.error(f"An error occurred: {e}")
-        # Save a screenshot for debugging
-        driver.save_screenshot("/app/database/screenshot.png")
-        logging.info("[*] Screenshot saved to /app/database/screenshot.png")
-        return []
+    Each page is scraped on its own thread. Without a `pool`, drivers come from
+    a private one of `concurrency` browsers that is shut down when the crawl
+    ends, so a worker process never leaves browsers behind.
+
+    Args:
+        urls: The result page URLs.
+        spec: The card spec used to extract fields.
+        parse_card: Normalizes one raw card into a Listing; raising skips the card.
+        concurrency: Maximum pages loading at once, and the number of browsers.
+        requests_per_second: Maximum page loads started per second.
+        seen: A SeenIndex; known cards with an unchanged price are skipped before full extraction.
+        on_page: Optional callable (PageResult) run as soon as each page is scraped or has failed.
+        pool: A DriverPool to borrow drivers from, e.g. the warm process-wide one.
+
+    Returns:
+        The listings of pages not handed to `on_page`.
+    """
+    from src.scraper.static_scraper import HostLimiter, PageResult
+
+    private_pool = pool is None
+    pool = DriverPool(size=concurrency) if private_pool else pool
+    limiter = HostLimiter(concurrency, requests_per_second)
+    listings = []
+
+    async def crawl_page(url):
+        # One slot for the whole crawl, so the cap applies across hosts too.
+        await limiter.acquire('browser')
+        page_seen = seen.page() if seen is not None else None
+        try:
+            page_listings = await asyncio.to_thread(scrape_dynamic_site, url, pool, page_seen, spec, parse_card,
+                                                    raise_errors=True)
+            result = PageResult(url, 'fetched', page_listings, page_seen.unchanged if page_seen is not None else [],
+                                None)
+        except Exception:
+            # Already logged, with a screenshot, by scrape_dynamic_site.
+            result = PageResult(url, 'failed', [], [], None)
+        finally:
+            limiter.release('browser')
+        if on_page is not None:
+            on_page(result)
+        else:
+            listings.extend(result.listings)
+
+    try:
+        await asyncio.gather(*(crawl_page(url) for url in urls))
     finally:
-        logging.info("[*] Closing Chrome driver.")
-        driver.quit()
+        if private_pool:
+            await asyncio.to_thread(pool.shutdown)
+    return listings
 
 if __name__ == '__main__':
     target_url = "file:///home/jmacleod/repos/car-finder-agent/listings.html"
@@ -0,0 +1,186 @@
+import logging
+from urllib.parse import urljoin
+
+from bs4 import BeautifulSoup
+
+from src.listing import Listing
+
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = 'lxml'
+except ImportError:
+    HTML_PARSER = 'html.parser'
+
+# A card spec describes how to pull raw field strings out of a results page:
+# `card` selects one element per listing, and each field is a CSS selector
+# relative to the card plus an optional attribute (text content otherwise).
+# `key` names the field that identifies a listing, so known cards can be
+# skipped before the remaining fields are extracted; the optional
+# `fingerprint` field is read with it, so a known card whose price changed is
+# still extracted.
+CARS_COM_CARD_SPEC = {
+    'card': '.vehicle-card',
+    'key': 'url',
+    'fingerprint': 'price',
+    'fields': {
+        'title': {'selector': '.vehicle-card-title'},
+        'price': {'selector': '.primary-price'},
+        'mileage': {'selector': 'div.mileage'},
+        'location': {'selector': 'div.dealer-name'},
+        'url': {'selector': 'a', 'attr': 'href'},
+    },
+}
+
+# Runs in the browser: extracts the fields of every card (or of the cards at
+# the given indices) in a single WebDriver round-trip.
+EXTRACT_CARDS_SCRIPT = """
+const spec = arguments[0];
+const indices = arguments[1];
+const cards = Array.from(document.querySelectorAll(spec.card));
+return (indices === null ? cards : indices.map(i => cards[i])).map(card => {
+    const fields = {};
+    for (const [name, field] of Object.entries(spec.fields)) {
+        const el = card.querySelector(field.selector);
+        if (!el) {
+            fields[name] = null;
+        } else if (field.attr) {
+            const value = el[field.attr];
+            fields[name] = (value !== undefined && value !== null) ? String(value) : el.getAttribute(field.attr);
+        } else {
+            fields[name] = (el.innerText || el.textContent || '').trim();
+        }
+    }
+    return fields;
+});
+"""
+
+def key_fields(spec):
+    """The names of the fields read before deciding whether to keep a card."""
+    return [spec['key']] + ([spec['fingerprint']] if spec.get('fingerprint') else [])
+
+def key_spec(spec):
+    """Returns a spec that only extracts the key and fingerprint fields."""
+    return {'card': spec['card'], 'fields': {name: spec['fields'][name] for name in key_fields(spec)}}
+
+def _keep(keep, spec, fields):
+    return keep(fields[spec['key']], fields.get(spec['fingerprint']) if spec.get('fingerprint') else None)
+
+def extract_cards_with_script(driver, spec, keep=None):
+    """
+    Extracts raw card fields from the live DOM with one `execute_script` call.
+
+    Args:
+        driver: A selenium WebDriver on the results page.
+        spec: A card spec (see CARS_COM_CARD_SPEC).
+        keep: Optional predicate (key, fingerprint) -> bool. When given, keys are read
+            in a first round-trip and only the kept cards are fully extracted in a second.
+
+    Returns:
+        A list of dictionaries mapping field name to raw string (or None).
+    """
+    if keep is None:
+        return driver.execute_script(EXTRACT_CARDS_SCRIPT, spec, None)
+    keys = driver.execute_script(EXTRACT_CARDS_SCRIPT, key_spec(spec), None)
+    indices = [i for i, fields in enumerate(keys) if _keep(keep, spec, fields)]
+    if not indices:
+        return []
+    return driver.execute_script(EXTRACT_CARDS_SCRIPT, spec, indices)
+
+def _html_field(el, field, base_url):
+    if el is None:
+        return None
+    if field.get('attr'):
+        value = el.get(field['attr'])
+        if value is not None and field['attr'] in ('href', 'src') and base_url:
+            value = urljoin(base_url, value)
+        return value
+    return el.get_text(" ", strip=True)
+
+def extract_cards_from_html(html, spec, base_url=None, keep=None):
+    """
+    Extracts raw card fields by parsing page HTML in-process.
+
+    Args:
+        html: The page source.
+        spec: A card spec (see CARS_COM_CARD_SPEC).
+        base_url: Used to resolve relative links, as the browser would.
+        keep: Optional predicate (key, fingerprint) -> bool; other cards are
+            skipped before their remaining fields are extracted.
+
+    Returns:
+        A list of dictionaries mapping field name to raw string (or None).
+    """
+    soup = BeautifulSoup(html, HTML_PARSER)
+    cards = []
+    for card in soup.select(spec['card']):
+        fields = {}
+        if keep is not None:
+            for name in key_fields(spec):
+                field = spec['fields'][name]
+                fields[name] = _html_field(card.select_one(field['selector']), field, base_url)
+            if not _keep(keep, spec, fields):
+                continue
+        for name, field in spec['fields'].items():
+            if name not in fields:
+                fields[name] = _html_field(card.select_one(field['selector']), field, base_url)
+        cards.append(fields)
+    return cards
+
+def extract_cards_with_elements(driver, spec, keep=None):
+    """
+    Extracts raw card fields with one WebDriver call per field.
+
+    This is the slow path (cards x fields round-trips), kept as a fallback for
+    pages where script execution is unavailable.
+    """
+    from selenium.common.exceptions import NoSuchElementException
+    from selenium.webdriver.common.by import By
+
+    def read(card, field):
+        try:
+            el = card.find_element(By.CSS_SELECTOR, field['selector'])
+        except NoSuchElementException:
+            return None
+        return el.get_attribute(field['attr']) if field.get('attr') else el.text.strip()
+
+    cards = []
+    for card in driver.find_elements(By.CSS_SELECTOR, spec['card']):
+        fields = {}
+        if keep is not None:
+            for name in key_fields(spec):
+                fields[name] = read(card, spec['fields'][name])
+            if not _keep(keep, spec, fields):
+                continue
+        for name, field in spec['fields'].items():
+            if name not in fields:
+                fields[name] = read(card, field)
+        cards.append(fields)
+    return cards
+
+def parse_cars_com_card(raw):
+    """
+    Normalizes raw cars.com card fields into a Listing.
+
+    Raises:
+        ValueError, AttributeError: If a required field is missing or malformed.
+    """
+    year, make, *model_parts = raw['title'].split()
+    return Listing(
+        make=make,
+        model=" ".join(model_parts),
+        year=int(year),
+        price=float(raw['price'].replace('$', '').replace(',', '')),
+        mileage=int(raw['mileage'].replace(' mi.', '').replace(',', '')),
+        location=raw['location'],
+        url=raw['url'],
+    )
+
+def parse_cards(raw_cards, parse_card):
+    """Applies `parse_card` to each raw card, skipping (and logging) cards that fail."""
+    listings = []
+    for i, raw in enumerate(raw_cards):
+        try:
+            listings.append(parse_card(raw))
+        except (ValueError, AttributeError, KeyError, TypeError) as e:
+            logging.error(f"Error processing car listing {i + 1}: {e}")
+    return listings
@@ -0,0 +1,136 @@
+import hashlib
+import logging
+import re
+import threading
+import time
+
+from src.database.connections import connection
+
+def _digest(value):
+    # 8-byte digests keep the index compact; a collision would only make us
+    # skip one listing, with odds around 1 in 2**64 per pair.
+    return hashlib.blake2b(str(value).encode('utf-8'), digest_size=8).digest()
+
+def price_key(value):
+    """Whole-dollar price from a number or raw card text such as '$25,000', or None."""
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return round(value)
+    digits = re.sub(r'[^\d.]', '', str(value))
+    try:
+        return round(float(digits))
+    except ValueError:
+        return None
+
+class SeenIndex:
+    """
+    Compact in-memory index of the listing URLs (with their last price) and
+    VINs already stored.
+
+    Loaded once from the `listings` table, then kept up to date as pages are
+    ingested, so known cards can be skipped before full field extraction. Each
+    page is checked through its own PageSeen, which remembers the cards skipped
+    as unchanged so their last_seen can be refreshed.
+    """
+
+    def __init__(self):
+        self._urls = {}
+        self._vins = set()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, db_file):
+        index = cls()
+        with connection(db_file) as conn:
+            for url, vin, price in conn.execute("SELECT url, vin, price FROM listings"):
+                index._urls[_digest(url)] = price_key(price)
+                if vin:
+                    index._vins.add(_digest(vin))
+        logging.info(f"[*] Loaded seen index with {len(index)} listings.")
+        return index
+
+    def __len__(self):
+        return len(self._urls)
+
+    def has_url(self, url):
+        return url is not None and _digest(url) in self._urls
+
+    def has_vin(self, vin):
+        return bool(vin) and _digest(vin) in self._vins
+
+    def keep(self, url, price=None):
+        """
+        Predicate for the card extractors' `keep` argument: True for new cards
+        and for known cards whose price changed.
+        """
+        if url is None:
+            return True
+        key = _digest(url)
+        with self._lock:
+            if key not in self._urls:
+                return True
+            return price is not None and price_key(price) != self._urls[key]
+
+    def page(self):
+        """Returns a PageSeen for checking the cards of one page."""
+        return PageSeen(self)
+
+    def add(self, listing):
+        with self._lock:
+            if listing.url:
+                self._urls[_digest(listing.url)] = price_key(listing.price)
+            if listing.vin:
+                self._vins.add(_digest(listing.vin))
+
+class PageSeen:
+    """
+    One page's view of a SeenIndex. Pages are crawled concurrently, so the
+    cards skipped as unchanged are collected per page, in `unchanged`.
+    """
+
+    def __init__(self, index):
+        self.index = index
+        self.unchanged = []
+
+    def keep(self, url, price=None):
+        """Like SeenIndex.keep, remembering the URLs of the cards it skips."""
+        if self.index.keep(url, price):
+            return True
+        self.unchanged.append(url)
+        return False
+
+class Checkpoint:
+    """
+    Per-page progress of one scrape run, stored in `scrape_checkpoints`.
+
+    A run that stops before `complete()` resumes after its last finished page.
+    """
+
+    def __init__(self, db_file, run_key):
+        self.db_file = db_file
+        self.run_key = run_key
+
+    def resume_page(self):
+        """Returns the first page (1-based) that still needs scraping."""
+        with connection(self.db_file) as conn:
+            row = conn.execute(
+                "SELECT status, last_page FROM scrape_checkpoints WHERE run_key = ?", (self.run_key,)
+            ).fetchone()
+        if row is None or row[0] != 'running':
+            return 1
+        return row[1] + 1
+
+    def _save(self, status, last_page):
+        with connection(self.db_file) as conn:
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO scrape_checkpoints(run_key, status, last_page, updated_at) VALUES(?,?,?,?)",
+                    (self.run_key, status, last_page, int(time.time()))
+                )
+
+    def page_done(self, page):
+        self._save('running', page)
+
+    def complete(self):
+        self._save('completed', 0)
@@ -0,0 +1,264 @@
+"""
+Runs registered sources (src.scraper.sources) side by side.
+
+Each source is crawled by its own worker, which fetches up to the source's
+`concurrency` pages at once within its request rate. Static sources, whose
+HTML parsing is CPU-bound, get a worker process each. Dynamic sources run on
+threads of the calling process so they borrow the process-wide, possibly
+pre-warmed WebDriver pool instead of launching Chrome on every scrape; the
+work there is waiting on the browser, which doesn't hold the GIL.
+
+Every page is sent back as soon as it is done, with its status, and handed
+to `on_page`, so ingest keeps pace with the crawl instead of waiting for it.
+Ingest, checkpoints, the job's bookkeeping and the pages' HTTP validators
+stay in the calling process; workers only read the database (to load their
+SeenIndex and stored ETags). A page's validators are stored once `on_page`
+has returned, so a page whose listings weren't saved is fetched in full
+next time instead of coming back as a 304.
+
+Metrics and stage timings recorded inside worker processes stay there; only
+the per-source page counts are recorded here.
+"""
+import asyncio
+import collections
+import concurrent.futures
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+
+from src.metrics import count
+from src.scraper.incremental import Checkpoint, SeenIndex
+from src.scraper.sources import get_source, run_key
+from src.scraper.static_scraper import PageCache
+
+# Worker processes for static sources; 0 crawls them on threads of this process too.
+DEFAULT_PROCESSES = int(os.environ.get('SCRAPER_PROCESSES', os.cpu_count() or 1))
+# Processes are spawned, not forked: the parent runs web and job threads, and
+# a forked child would inherit their locks in whatever state they were in.
+START_METHOD = os.environ.get('SCRAPER_START_METHOD', 'spawn')
+POLL_SECONDS = 1.0
+
+# Messages from workers: one Page per result page, then Done per source. A
+# Page's fields are those of its PageResult, plus the source and page number.
+Page = collections.namedtuple('Page', ['source', 'page', 'url', 'status', 'listings', 'unchanged', 'validators'])
+Done = collections.namedtuple('Done', ['source', 'error'])
+
+class ScrapeStopped(Exception):
+    """Raised inside a worker once the scheduler has asked it to stop."""
+
+class ScrapeFailed(Exception):
+    """Raised by run_sources when a source's worker failed or died."""
+
+_channel = None
+
+def _init_worker(messages, stop):
+    global _channel
+    _channel = (messages, stop)
+
+def _crawl(source, urls, db_file, seen, on_page, shared_pool):
+    if source.fetch == 'static':
+        from src.scraper.static_scraper import PageCache, crawl_static_site
+        return crawl_static_site(urls, PageCache(db_file), source.spec, source.parse_card,
+                                 concurrency_per_host=source.concurrency,
+                                 requests_per_second=source.requests_per_second, seen=seen, on_page=on_page)
+    from src.scraper.dynamic_scraper import crawl_dynamic_site
+    from src.scraper.driver_pool import get_driver_pool
+    return crawl_dynamic_site(urls, source.spec, source.parse_card, concurrency=source.concurrency,
+                              requests_per_second=source.requests_per_second, seen=seen, on_page=on_page,
+                              pool=get_driver_pool() if shared_pool else None)
+
+def crawl_source(source, pages, db_file, incremental=True, channel=None):
+    """
+    Worker: crawls one source's pages and reports each as it is parsed.
+
+    Args:
+        source: The Source to crawl.
+        pages: (page number, URL) pairs still to scrape.
+        db_file: The database to load the SeenIndex and stored ETags from.
+        incremental: Skip known cards whose price is unchanged.
+        channel: (messages, stop) to use instead of the ones given to the
+            worker process; messages gets Page and Done tuples, and stop is an
+            Event that ends the crawl early.
+    """
+    messages, stop = channel or _channel
+    error = None
+    try:
+        seen = SeenIndex.load(db_file) if incremental else SeenIndex()
+        numbers = {url: page for page, url in pages}
+
+        def on_page(result):
+            if stop.is_set():
+                raise ScrapeStopped()
+            for listing in result.listings:
+                listing.source_site = source.name
+                seen.add(listing)
+            messages.put(Page(source.name, numbers[result.url], *result))
+
+        # Dynamic sources run on threads of the parent (channel given) and borrow
+        # its shared, possibly pre-warmed browser pool.
+        asyncio.run(_crawl(source, [url for _, url in pages], db_file, seen, on_page, shared_pool=channel is not None))
+    except ScrapeStopped:
+        error = 'stopped'
+    except Exception as e:
+        logging.error(f"Scraping {source.name} failed: {e}", exc_info=True)
+        error = f"{type(e).__name__}: {e}"
+    messages.put(Done(source.name, error))
+
+class _Progress:
+    """
+    Checkpoints a source's pages, which may finish out of order, at the last
+    unbroken run of pages that were scraped; a failed page stops the run, so a
+    resumed scrape retries it.
+    """
+
+    def __init__(self, checkpoint, start):
+        self.checkpoint = checkpoint
+        self.next_page = start
+        self.finished = set()
+        self.failed = set()
+
+    def page_done(self, page, ok=True):
+        if not ok:
+            self.failed.add(page)
+            return
+        self.finished.add(page)
+        if page != self.next_page:
+            return
+        while self.next_page in self.finished:
+            self.finished.discard(self.next_page)
+            self.next_page += 1
+        self.checkpoint.page_done(self.next_page - 1)
+
+def _next_message(messages, futures, running, failed):
+    """
+    Waits briefly for a worker message; returns None on timeout, moving sources
+    whose worker is gone from `running` to `failed`.
+    """
+    try:
+        return messages.get(timeout=POLL_SECONDS)
+    except queue.Empty:
+        pass
+    for future, name in futures.items():
+        # A worker that finished normally has already sent Done; one that was
+        # cancelled or whose process died never will.
+        if name in running and future.done() and (future.cancelled() or future.exception() is not None):
+            if not future.cancelled():
+                logging.error(f"Scraper worker for {name} died: {future.exception()}")
+            running.discard(name)
+            failed[name] = 'worker cancelled' if future.cancelled() else f"worker died: {future.exception()}"
+    return None
+
+def run_sources(plan, on_page, db_file, incremental=True, processes=DEFAULT_PROCESSES, check=None):
+    """
+    Scrapes several sources in parallel, ingesting each page as it arrives.
+
+    A source resumes after the last page its previous, unfinished run
+    checkpointed for the same URLs.
+
+    Args:
+        plan: Dict of source name to result page URLs (see sources.resolve_plan).
+        on_page: Callable (Page) -> None run in this process for every result page,
+            including failed ones. The page's listings carry source_site, and
+            `unchanged` lists the URLs of the known listings it still shows unchanged.
+            The page's validators are stored only once it returns.
+        db_file: The database holding listings and checkpoints.
+        incremental: Skip known cards whose price is unchanged.
+        processes: Maximum worker processes for static sources; 0 runs them on threads
+            too. Dynamic sources always run on threads.
+        check: Optional callable polled while waiting; raising from it (or from
+            on_page) stops the workers and propagates.
+
+    Returns:
+        A dict of source name to the number of listings scraped.
+
+    Raises:
+        ScrapeFailed: If a source's worker raised or died, once the others are done.
+    """
+    work, progress = [], {}
+    for name, urls in plan.items():
+        source = get_source(name)
+        checkpoint = Checkpoint(db_file, run_key(name, urls))
+        start = checkpoint.resume_page()
+        if start > 1:
+            logging.info(f"[*] Resuming {name} at page {start}.")
+        pages = [(page, url) for page, url in enumerate(urls, start=1) if page >= start]
+        if not pages:
+            checkpoint.complete()
+            continue
+        progress[name] = _Progress(checkpoint, start)
+        work.append((source, pages))
+
+    scraped = dict.fromkeys(plan, 0)
+    if not work:
+        return scraped
+
+    threaded = [(source, pages) for source, pages in work if not processes or source.fetch == 'dynamic']
+    spawned = [(source, pages) for source, pages in work if processes and source.fetch != 'dynamic']
+    executors = []
+    if spawned:
+        # A multiprocessing queue and event also work between threads, so
+        # threaded workers share them with the processes.
+        context = multiprocessing.get_context(START_METHOD)
+        messages, stop = context.Queue(), context.Event()
+        process_executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=min(processes, len(spawned)), mp_context=context,
+            initializer=_init_worker, initargs=(messages, stop))
+        executors.append(process_executor)
+    else:
+        messages, stop = queue.Queue(), threading.Event()
+    if threaded:
+        thread_executor = concurrent.futures.ThreadPoolExecutor(max_workers=len(threaded), thread_name_prefix='scrape')
+        executors.append(thread_executor)
+
+    for label, group in (('threads', threaded), ('processes', spawned)):
+        if group:
+            logging.info(f"[*] Scraping {', '.join(source.name for source, _ in group)} in {label}.")
+    page_cache = PageCache(db_file)
+    futures, running, failed = {}, set(), {}
+    try:
+        for source, pages in threaded:
+            futures[thread_executor.submit(crawl_source, source, pages, db_file, incremental, (messages, stop))] = source.name
+            running.add(source.name)
+        for source, pages in spawned:
+            futures[process_executor.submit(crawl_source, source, pages, db_file, incremental)] = source.name
+            running.add(source.name)
+        while running:
+            if check is not None:
+                check()
+            message = _next_message(messages, futures, running, failed)
+            if message is None:
+                continue
+            if isinstance(message, Done):
+                running.discard(message.source)
+                source_progress = progress[message.source]
+                if message.error is not None:
+                    logging.error(f"Scraping {message.source} stopped early: {message.error}")
+                    failed[message.source] = message.error
+                elif source_progress.failed:
+                    logging.warning(f"{len(source_progress.failed)} pages of {message.source} failed; "
+                                    f"the next scrape resumes at page {source_progress.next_page}.")
+                else:
+                    source_progress.checkpoint.complete()
+                continue
+            on_page(message)
+            if message.validators:
+                page_cache.put(message.url, *message.validators)
+            scraped[message.source] += len(message.listings)
+            progress[message.source].page_done(message.page, ok=message.status != 'failed')
+            count('car_finder_source_pages_total', source=message.source, status=message.status)
+    finally:
+        stop.set()
+        for executor in executors:
+            executor.shutdown(wait=False, cancel_futures=True)
+        # A worker process only exits once the parent has read everything it sent.
+        while running:
+            message = _next_message(messages, futures, running, failed)
+            if isinstance(message, Done):
+                running.discard(message.source)
+        for executor in executors:
+            executor.shutdown(wait=True)
+    if failed:
+        raise ScrapeFailed("; ".join(f"{name}: {error}" for name, error in failed.items()))
+    return scraped
@@ -0,0 +1,134 @@
+"""
+Registry of the sites listings are scraped from.
+
+Each Source declares how its pages are fetched ('dynamic' pages are rendered
+in Chrome, 'static' ones are fetched over HTTP), the card spec holding its
+selectors, the parser that normalizes a raw card into a Listing, and how hard
+the site may be hit. The scheduler (src.scraper.scheduler) runs them.
+
+Adding a site is a register_source call; parse_card must be a module-level
+function so a source can be handed to a worker process.
+"""
+import collections
+import os
+import threading
+
+from src.scraper.extract import CARS_COM_CARD_SPEC, parse_cars_com_card
+from src.scraper.static_scraper import (
+    CARS_COM_STATIC_CARD_SPEC, DEFAULT_CONCURRENCY_PER_HOST, DEFAULT_REQUESTS_PER_SECOND_PER_HOST,
+    DEFAULT_URL as STATIC_DEFAULT_URL, parse_static_card,
+)
+
+FETCH_MODES = ('dynamic', 'static')
+
+Source = collections.namedtuple('Source', [
+    'name',                 # Also stored as the listings' source_site.
+    'fetch',                # One of FETCH_MODES.
+    'spec',                 # Card spec: card selector, key/fingerprint fields and field selectors.
+    'parse_card',           # Raw card fields -> Listing; raising skips the card.
+    'urls',                 # Result pages scraped when a job names no URLs.
+    'concurrency',          # Maximum pages in flight at once.
+    'requests_per_second',  # Maximum page requests started per second.
+])
+
+_sources = {}
+_sources_lock = threading.Lock()
+
+def register_source(source):
+    """
+    Adds a source, replacing any registered under the same name.
+
+    Raises:
+        ValueError: If the fetch mode is unknown or the limits aren't positive.
+    """
+    if source.fetch not in FETCH_MODES:
+        raise ValueError(f"Unknown fetch mode {source.fetch!r} for {source.name}; expected one of {FETCH_MODES}.")
+    if source.concurrency < 1 or source.requests_per_second <= 0:
+        raise ValueError(f"Source {source.name} needs a positive concurrency and request rate.")
+    with _sources_lock:
+        _sources[source.name] = source
+    return source
+
+def get_source(name):
+    """
+    Returns the source registered as `name`.
+
+    Raises:
+        KeyError: If there is none.
+    """
+    with _sources_lock:
+        try:
+            return _sources[name]
+        except KeyError:
+            raise KeyError(f"Unknown source {name!r}; registered: {', '.join(sorted(_sources))}.") from None
+
+def registered_sources():
+    """Returns the registered sources, in registration order."""
+    with _sources_lock:
+        return list(_sources.values())
+
+def _limit(name, default):
+    return type(default)(os.environ.get(name, default))
+
+# The original scraper: a cars.com-style page rendered in Chrome. Its listings
+# have always been stored as truecar.com, so the name is kept for continuity.
+register_source(Source(
+    name='truecar.com',
+    fetch='dynamic',
+    spec=CARS_COM_CARD_SPEC,
+    parse_card=parse_cars_com_card,
+    urls=tuple(os.environ.get('SCRAPE_URLS', 'file:///app/listings.html').split(',')),
+    concurrency=_limit('TRUECAR_CONCURRENCY', 2),
+    requests_per_second=_limit('TRUECAR_REQUESTS_PER_SECOND', 1.0),
+))
+
+register_source(Source(
+    name='cars.com',
+    fetch='static',
+    spec=CARS_COM_STATIC_CARD_SPEC,
+    parse_card=parse_static_card,
+    urls=(STATIC_DEFAULT_URL,),
+    concurrency=_limit('CARS_COM_CONCURRENCY', DEFAULT_CONCURRENCY_PER_HOST),
+    requests_per_second=_limit('CARS_COM_REQUESTS_PER_SECOND', DEFAULT_REQUESTS_PER_SECOND_PER_HOST),
+))
+
+DEFAULT_SOURCES = tuple(os.environ.get('SCRAPE_SOURCES', 'truecar.com').split(','))
+
+def resolve_plan(sources=None, urls=None):
+    """
+    Works out which pages of which sources a scrape job covers.
+
+    Args:
+        sources: Source names, or a dict of source name to URLs (None or empty
+            for the source's default URLs). Defaults to DEFAULT_SOURCES.
+        urls: URLs for a single named source, as older jobs and clients pass them.
+
+    Returns:
+        A dict of source name to its list of URLs, in the order given.
+
+    Raises:
+        ValueError: If a source is unknown, or `urls` is given for several sources.
+    """
+    if isinstance(sources, str):
+        sources = [sources]
+    if not isinstance(sources, dict):
+        names = list(sources or DEFAULT_SOURCES)
+        if urls:
+            if len(names) != 1:
+                raise ValueError("URLs can only be given for a single source.")
+            sources = {names[0]: urls}
+        else:
+            sources = dict.fromkeys(names)
+
+    plan = {}
+    for name, source_urls in sources.items():
+        try:
+            source = get_source(name)
+        except KeyError as e:
+            raise ValueError(e.args[0]) from None
+        plan[name] = list(source_urls or source.urls)
+    return plan
+
+def run_key(name, urls):
+    """Identifies one source's part of a scrape, for checkpoints and job dedup."""
+    return f"{name}:{','.join(urls)}"
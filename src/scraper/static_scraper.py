@@ -1,57 +1,263 @@
-import requests
-from bs4 import BeautifulSoup
+import asyncio
+import collections
+import json
+import logging
+import time
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
 
-def scrape_static_site(url="https://www.cars.com/shopping/results/?stock_type=used&makes%5B%5D=honda&models%5B%5D=civic&list_price_max=&maximum_distance=20&zip="):
+import aiohttp
+
+from src.database.connections import connection
+from src.metrics import count, timer
+from src.scraper.extract import extract_cards_from_html, parse_cards, parse_cars_com_card
+
+DEFAULT_URL = "https://www.cars.com/shopping/results/?stock_type=used&makes%5B%5D=honda&models%5B%5D=civic&list_price_max=&maximum_distance=20&zip="
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'
+}
+DEFAULT_CONCURRENCY_PER_HOST = 4
+DEFAULT_REQUESTS_PER_SECOND_PER_HOST = 2.0
+DEFAULT_TIMEOUT_SECONDS = 30
+
+CARS_COM_STATIC_CARD_SPEC = {
+    'card': 'div.vehicle-card-main',
+    'key': 'link',
+    'fingerprint': 'price',
+    'fields': {
+        'title': {'selector': 'h2.title'},
+        'price': {'selector': 'span.primary-price'},
+        'mileage': {'selector': 'div.mileage'},
+        'location': {'selector': 'div.dealer-name'},
+        'link': {'selector': 'a.vehicle-card-link', 'attr': 'href'},
+    },
+}
+
+CrawlResult = collections.namedtuple('CrawlResult', ['listings', 'fetched', 'not_modified', 'failed'])
+# The outcome of one result page: `status` is 'fetched', 'not_modified' (HTTP 304) or
+# 'failed', `unchanged` lists the URLs of the known listings the page still shows, and
+# `validators` holds the PageCache.put arguments (etag, last_modified, listing_urls)
+# for a fetched page, or None.
+PageResult = collections.namedtuple('PageResult', ['url', 'status', 'listings', 'unchanged', 'validators'])
+
+def parse_static_card(raw):
+    """Normalizes raw static cars.com card fields into a Listing, like the dynamic scraper's cards."""
+    if not all(raw.get(field) for field in ('title', 'price', 'link')):
+        raise ValueError(f"Incomplete vehicle card: {raw}")
+    return parse_cars_com_card({**raw, 'url': raw['link']})
+
+def page_urls(url, pages, page_param='page'):
     """
-    Scrapes a static website to extract car listing data.
+    Builds the URLs of the first `pages` result pages.
 
     Args:
-        url (str): The URL of the website to scrape.
+        url: The first results page.
+        pages: The number of pages to crawl.
+        page_param: The query parameter holding the 1-based page number.
 
     Returns:
-        list: A list of dictionaries, where each dictionary represents a car listing.
+        A list of page URLs.
+    """
+    parts = urlsplit(url)
+    query = [(key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True) if key != page_param]
+    urls = []
+    for page in range(1, pages + 1):
+        page_query = query + [(page_param, str(page))] if page > 1 else query
+        urls.append(urlunsplit(parts._replace(query=urlencode(page_query))))
+    return urls
+
+class PageCache:
     """
+    Remembers each page's ETag / Last-Modified in the `http_cache` table so the
+    next crawl can send conditional requests, along with the listing URLs the
+    page held, which an unchanged page is known to still show. With no db_file
+    it is in-memory.
+    """
+
+    def __init__(self, db_file=None):
+        self.db_file = db_file
+        self._memory = {}
+
+    def get(self, url):
+        """Returns (etag, last_modified, listing_urls) for a page, or None; listing_urls is None if unknown."""
+        if self.db_file is None:
+            return self._memory.get(url)
+        with connection(self.db_file) as conn:
+            row = conn.execute(
+                "SELECT etag, last_modified, listing_urls FROM http_cache WHERE url = ?", (url,)).fetchone()
+        if row is None:
+            return None
+        return row[0], row[1], json.loads(row[2]) if row[2] is not None else None
+
+    def put(self, url, etag, last_modified, listing_urls=()):
+        if not etag and not last_modified:
+            return
+        if self.db_file is None:
+            self._memory[url] = (etag, last_modified, list(listing_urls))
+            return
+        with connection(self.db_file) as conn:
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO http_cache(url, etag, last_modified, listing_urls, fetched_at) "
+                    "VALUES(?,?,?,?,?)",
+                    (url, etag, last_modified, json.dumps(list(listing_urls)), int(time.time()))
+                )
+
+class HostLimiter:
+    """Caps concurrent requests and request rate per host."""
+
+    def __init__(self, concurrency=DEFAULT_CONCURRENCY_PER_HOST, requests_per_second=DEFAULT_REQUESTS_PER_SECOND_PER_HOST):
+        self.concurrency = concurrency
+        self.interval = 1.0 / requests_per_second if requests_per_second else 0
+        self._semaphores = {}
+        self._locks = {}
+        self._next_slot = {}
+
+    async def acquire(self, host):
+        semaphore = self._semaphores.setdefault(host, asyncio.Semaphore(self.concurrency))
+        await semaphore.acquire()
+        lock = self._locks.setdefault(host, asyncio.Lock())
+        async with lock:
+            now = time.monotonic()
+            start = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = start + self.interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+    def release(self, host):
+        self._semaphores[host].release()
+
+async def _fetch_page(session, url, limiter, cached):
+    """Returns (html, etag, last_modified), or None if the page is unchanged since `cached` was stored."""
+    headers = {}
+    if cached:
+        etag, last_modified, _ = cached
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+
+    host = urlsplit(url).netloc
+    await limiter.acquire(host)
     try:
-        print(f"[*] Scraping started for URL: {url}")
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'
-        }
-        response = requests.get(url, headers=headers)
-        print(f"[*] Request finished with status code: {response.status_code}")
-        response.raise_for_status()  # Raise an exception for bad status codes
-
-        print("[*] Parsing HTML content with BeautifulSoup...")
-        soup = BeautifulSoup(response.content, 'html.parser')
-
-        listings = []
-        vehicle_cards = soup.find_all('div', class_='vehicle-card-main')
-        print(f"[*] Found {len(vehicle_cards)} vehicle cards.")
-
-        for i, vehicle_card in enumerate(vehicle_cards):
-            print(f"  - Processing card {i+1}/{len(vehicle_cards)}...")
-            title = vehicle_card.find('h2', class_='title').text.strip()
-            price = vehicle_card.find('span', class_='primary-price').text.strip()
-            mileage = vehicle_card.find('div', class_='mileage').text.strip()
-            location = vehicle_card.find('div', class_='dealer-name').text.strip()
-            link = "https://www.cars.com" + vehicle_card.find('a', class_='vehicle-card-link')['href']
-            
-            listings.append({
-                'title': title,
-                'price': price,
-                'mileage': mileage,
-                'location': location,
-                'link': link
-            })
-        
-        print("[*] Scraping completed successfully.")
-        return listings
-
-    except requests.exceptions.RequestException as e:
-        print(f"Error fetching URL: {e}")
-        return None
+        with timer('page_load', scraper='static'):
+            async with session.get(url, headers=headers) as response:
+                if response.status == 304:
+                    return None
+                response.raise_for_status()
+                html = await response.text()
+                return html, response.headers.get('ETag'), response.headers.get('Last-Modified')
+    finally:
+        limiter.release(host)
+
+async def crawl_static_site(urls, page_cache=None, spec=CARS_COM_STATIC_CARD_SPEC, parse_card=parse_static_card,
+                            concurrency_per_host=DEFAULT_CONCURRENCY_PER_HOST,
+                            requests_per_second=DEFAULT_REQUESTS_PER_SECOND_PER_HOST, headers=None, seen=None,
+                            on_page=None):
+    """
+    Fetches many result pages concurrently over one pooled HTTP client.
+
+    Pages the server reports as unchanged (304) are not parsed. Validators are
+    only stored once a page has been parsed, so a failed crawl is retried in full.
+    With `on_page` they are not stored at all, but handed back in the page's
+    PageResult: the caller stores them once it has saved the listings, or the
+    next crawl could get a 304 for a page whose listings were never saved.
+
+    Args:
+        urls: The result page URLs.
+        page_cache: A PageCache holding ETags from previous crawls.
+        spec: The card spec used to extract fields.
+        parse_card: Normalizes one raw card; raising skips the card.
+        concurrency_per_host: Maximum in-flight requests per host.
+        requests_per_second: Maximum request rate per host.
+        headers: Request headers; defaults to a browser User-Agent.
+        seen: A SeenIndex; known cards with an unchanged price are skipped before full extraction,
+            and the listings of an unchanged (304) page are reported unchanged too.
+        on_page: Optional callable (PageResult) run as soon as each page is done, whatever its
+            outcome. Listings handed to it are not also collected in the result.
+
+    Returns:
+        A CrawlResult with the listings and per-page counts.
+    """
+    page_cache = page_cache or PageCache()
+    limiter = HostLimiter(concurrency_per_host, requests_per_second)
+    connector = aiohttp.TCPConnector(limit_per_host=concurrency_per_host, ttl_dns_cache=300)
+    timeout = aiohttp.ClientTimeout(total=DEFAULT_TIMEOUT_SECONDS)
+    listings, counts, parsed = [], {'fetched': 0, 'not_modified': 0, 'failed': 0}, [0]
+
+    def report(result):
+        counts[result.status] += 1
+        if on_page is not None:
+            on_page(result)
+        else:
+            listings.extend(result.listings)
+
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout, headers=headers or DEFAULT_HEADERS) as session:
+        async def crawl_page(url):
+            cached = page_cache.get(url)
+            if seen is not None and cached and cached[2] is None:
+                # Stored before listing URLs were kept: a 304 couldn't say which listings were seen.
+                cached = None
+            try:
+                page = await _fetch_page(session, url, limiter, cached)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logging.error(f"Error fetching URL {url}: {e}")
+                report(PageResult(url, 'failed', [], [], None))
+                return
+            if page is None:
+                logging.info(f"[*] {url} not modified; skipping.")
+                # The page still shows the listings it held last time.
+                report(PageResult(url, 'not_modified', [], list(cached[2] or []), None))
+                return
+            html, etag, last_modified = page
+            page_seen = seen.page() if seen is not None else None
+            page_keys = []
+
+            def page_keep(key, fingerprint):
+                page_keys.append(key)
+                return page_seen.keep(key, fingerprint)
+
+            # Parsing is CPU-bound, so keep it off the event loop.
+            with timer('card_extraction', mode='static'):
+                raw_cards = await asyncio.to_thread(extract_cards_from_html, html, spec, url,
+                                                    page_keep if page_seen is not None else None)
+                page_listings = parse_cards(raw_cards, parse_card)
+            if page_seen is None:
+                page_keys = [raw[spec['key']] for raw in raw_cards]
+            count('car_finder_cards_total', len(raw_cards), scraper='static')
+            parsed[0] += len(page_listings)
+            validators = (etag, last_modified, [key for key in page_keys if key])
+            report(PageResult(url, 'fetched', page_listings, page_seen.unchanged if page_seen is not None else [],
+                              validators))
+            if on_page is None:
+                page_cache.put(url, *validators)
+
+        await asyncio.gather(*(crawl_page(url) for url in urls))
+
+    for outcome, pages in counts.items():
+        count('car_finder_pages_total', pages, scraper='static', outcome=outcome)
+    logging.info(f"[*] Crawled {len(urls)} pages: {counts['fetched']} fetched, "
+                 f"{counts['not_modified']} not modified, {counts['failed']} failed; {parsed[0]} listings.")
+    return CrawlResult(listings, **counts)
+
+def scrape_static_site(url=DEFAULT_URL, pages=1, db_file=None):
+    """
+    Scrapes a static website to extract car listing data.
+
+    Args:
+        url (str): The URL of the first results page.
+        pages (int): The number of result pages to crawl.
+        db_file (str): Database holding stored ETags; in-memory if None.
+
+    Returns:
+        list: A list of Listings.
+    """
+    print(f"[*] Scraping started for URL: {url}")
+    result = asyncio.run(crawl_static_site(page_urls(url, pages), PageCache(db_file)))
+    print("[*] Scraping completed successfully.")
+    return result.listings
 
 if __name__ == '__main__':
-    target_url = "https://www.cars.com/shopping/results/?stock_type=used&makes%5B%5D=honda&models%5B%5D=civic&list_price_max=&maximum_distance=20&zip="
+    target_url = DEFAULT_URL
     print("[*] Starting static scraper...")
     scraped_data = scrape_static_site(target_url)
     if scraped_data:
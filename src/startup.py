@@ -0,0 +1,124 @@
+"""
+Import-time profiling for `--profile-startup`.
+
+The entry modules are imported in a fresh interpreter under
+`python -X importtime`, so the report covers everything a cold process pays
+before it can do any work. The modules declared with lazy_import are imported
+afterwards, one at a time, to show what each costs on first use.
+"""
+import collections
+import json
+import subprocess
+import sys
+
+DEFERRED_MARKER = '--- deferred imports ---'
+DEFAULT_TOP = 15
+
+_PROBE = """
+import importlib, json, sys, time
+sys.path[:0] = {path!r}
+start = time.perf_counter()
+for name in {modules!r}:
+    importlib.import_module(name)
+ready_seconds = time.perf_counter() - start
+sys.stderr.write({marker!r} + '\\n')
+from src.lazy import declared_modules
+at_startup = set(sys.modules)
+deferred = []
+for name in declared_modules():
+    loaded, error = name in at_startup, None
+    start = time.perf_counter()
+    try:
+        importlib.import_module(name)
+    except Exception as e:
+        error = f"{{type(e).__name__}}: {{e}}"
+    deferred.append([name, loaded, time.perf_counter() - start, error])
+print(json.dumps({{'ready_seconds': ready_seconds, 'deferred': deferred}}))
+"""
+
+ImportTiming = collections.namedtuple('ImportTiming', ['module', 'self_us', 'cumulative_us'])
+
+def parse_importtime(text):
+    """
+    Parses the stderr of `python -X importtime`.
+
+    Returns:
+        A list of ImportTiming in the order the imports finished.
+    """
+    timings = []
+    for line in text.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        parts = line[len('import time:'):].split('|')
+        if len(parts) != 3:
+            continue
+        try:
+            self_us, cumulative_us = int(parts[0]), int(parts[1])
+        except ValueError:
+            continue  # The column header.
+        timings.append(ImportTiming(parts[2].strip(), self_us, cumulative_us))
+    return timings
+
+def measure_startup(modules, path=()):
+    """
+    Imports `modules` in a fresh interpreter and measures it.
+
+    Args:
+        modules: Module names to import, in order, e.g. ['app'].
+        path: Directories to put at the front of sys.path.
+
+    Returns:
+        A dict with ready_seconds (wall time to import `modules`), imports (the
+        ImportTimings of that phase) and deferred ([name, imported_at_startup,
+        seconds, error] per lazily imported module; a module imported by an
+        earlier one takes close to no time).
+    """
+    probe = _PROBE.format(path=list(path), modules=list(modules), marker=DEFERRED_MARKER)
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', probe],
+                            capture_output=True, text=True, check=True)
+    startup_stderr = result.stderr.split(DEFERRED_MARKER, 1)[0]
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    report['imports'] = parse_importtime(startup_stderr)
+    return report
+
+def profile_startup(modules, path=(), top=DEFAULT_TOP, out=None):
+    """
+    Prints the import-time breakdown of starting `modules`.
+
+    Args:
+        modules: Module names to import, in order.
+        path: Directories to put at the front of sys.path.
+        top: How many packages and modules to list.
+        out: Stream to print to; defaults to stdout.
+
+    Returns:
+        The measure_startup report.
+    """
+    out = out or sys.stdout
+    report = measure_startup(modules, path)
+    imports = report['imports']
+    print(f"Imported {', '.join(modules)} in {report['ready_seconds'] * 1000:.1f} ms "
+          f"({len(imports)} modules).", file=out)
+
+    packages = collections.Counter()
+    for timing in imports:
+        packages[timing.module.split('.')[0]] += timing.self_us
+    print("\nSelf time by top-level package:", file=out)
+    for package, self_us in packages.most_common(top):
+        print(f"  {package:<40} {self_us / 1000:9.1f} ms", file=out)
+
+    print("\nSlowest imports (cumulative):", file=out)
+    for timing in sorted(imports, key=lambda t: t.cumulative_us, reverse=True)[:top]:
+        print(f"  {timing.module:<40} {timing.cumulative_us / 1000:9.1f} ms", file=out)
+
+    if report['deferred']:
+        print("\nDeferred until first use:", file=out)
+        for name, loaded, seconds, error in report['deferred']:
+            if loaded:
+                note = "already imported at startup"
+            elif error:
+                note = f"failed: {error}"
+            else:
+                note = f"{seconds * 1000:9.1f} ms"
+            print(f"  {name:<40} {note}", file=out)
+    return report
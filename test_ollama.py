@@ -1,27 +1,24 @@
-
 import requests
-import json
-import os
+
+from src.analysis.ollama_client import OllamaClient
 
 # The service name resolves to the correct ClusterIP.
 OLLAMA_HOST = "http://34.118.227.125:11434"
+MODEL = "gemma3"
 
-url = f"{OLLAMA_HOST}/api/generate"
-payload = {
-    "model": "gemma3",
-    "prompt": "Why is the sky blue?",
-    "stream": False
-}
-headers = {"Content-Type": "application/json"}
+client = OllamaClient(base_url=OLLAMA_HOST, read_timeout=60)
 
-print(f"--- Attempting to connect to: {url} ---")
+print(f"--- Attempting to connect to: {client.base_url} ---")
 try:
-    response = requests.post(url, headers=headers, data=json.dumps(payload), timeout=60)
-    print(f"Status Code: {response.status_code}")
-    print("--- Response Headers: ---")
-    for key, value in response.headers.items():
-        print(f"  {key}: {value}")
+    warm_up = client.warm_up(MODEL)
+    print(f"Model load time (cold start): {warm_up['load']:.2f}s (request total {warm_up['total']:.2f}s)")
+
+    result = client.generate(MODEL, "Why is the sky blue?")
+    print(f"Time to first token: {result['ttft'] or 0:.2f}s")
+    print(f"Total generation time: {result['total']:.2f}s (model load during request: {result['load']:.2f}s)")
     print("--- Response Body (first 500 chars): ---")
-    print(response.text[:500])
+    print(result["response"][:500])
 except requests.exceptions.RequestException as e:
     print(f"--- An error occurred: {e} ---")
+finally:
+    client.close()
@@ -0,0 +1,18 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.database.database import create_connection
+from src.database.migrations import migrate
+
+@pytest.fixture
+def db_file(tmp_path):
+    """A migrated, empty database file."""
+    path = str(tmp_path / 'car_finder.db')
+    conn = create_connection(path)
+    migrate(conn)
+    conn.close()
+    return path
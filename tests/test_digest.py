@@ -0,0 +1,93 @@
+import email
+import email.policy
+import socketserver
+import threading
+
+import pytest
+
+from src.digest.generator import SMTPMailer, send_digests
+from src.listing import Listing
+
+class SMTPSink:
+    """A minimal local SMTP server that accepts every message, recording connections and messages."""
+
+    def __init__(self):
+        self.connections = 0
+        self.messages = []
+        sink = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def reply(self, line):
+                self.wfile.write(f"{line}\r\n".encode())
+
+            def handle(self):
+                sink.connections += 1
+                self.reply("220 sink ready")
+                envelope = {'to': []}
+                for raw in self.rfile:
+                    command = raw.decode().strip()
+                    verb = command.split(' ', 1)[0].upper()
+                    if verb == 'EHLO':
+                        self.reply("250-sink")
+                        self.reply("250 8BITMIME")
+                    elif verb == 'RCPT':
+                        envelope['to'].append(command.split(':', 1)[1].strip(' <>'))
+                        self.reply("250 OK")
+                    elif verb == 'DATA':
+                        self.reply("354 End data with <CR><LF>.<CR><LF>")
+                        lines = []
+                        for line in self.rfile:
+                            if line in (b".\r\n", b".\n"):
+                                break
+                            lines.append(line[1:] if line.startswith(b"..") else line)
+                        sink.messages.append((envelope['to'], email.message_from_bytes(
+                            b"".join(lines), policy=email.policy.default)))
+                        envelope = {'to': []}
+                        self.reply("250 OK")
+                    elif verb == 'QUIT':
+                        self.reply("221 Bye")
+                        return
+                    else:
+                        self.reply("250 OK")
+
+        self.server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    @property
+    def port(self):
+        return self.server.server_address[1]
+
+@pytest.fixture
+def smtp_sink():
+    sink = SMTPSink()
+    yield sink
+    sink.server.shutdown()
+    sink.server.server_close()
+
+def test_digests_share_one_connection_and_reach_each_recipient_once(smtp_sink):
+    cars = [
+        Listing(make='Honda', model='Civic', year=2018, price=15000.0, mileage=30000, location='Austin, TX',
+                url='https://example.com/car/1', analysis='Fair price for the mileage.',
+                deal_score=0.125, expected_price=17142.86),
+        Listing(make='Toyota', model='Corolla', year=2019, price=16000.0, mileage=25000, location='Dallas, TX',
+                url='https://example.com/car/2', previous_price=17000.0, price_drop=1000.0),
+    ]
+    recipients = ['ann@example.com', 'bob@example.com', 'cy@example.com']
+
+    with SMTPMailer(host='127.0.0.1', port=smtp_sink.port, username=None, starttls=False) as mailer:
+        reports = send_digests(((recipient, cars) for recipient in recipients), mailer, sender='digest@example.com')
+
+    assert [report.error for report in reports] == [None, None, None]
+    assert smtp_sink.connections == 1
+    assert sorted(to for envelope, _ in smtp_sink.messages for to in envelope) == recipients
+    for envelope, message in smtp_sink.messages:
+        assert message['To'] == envelope[0]
+        assert message['From'] == 'digest@example.com'
+        html = message.get_body(('html',)).get_content()
+        assert '2018 Honda Civic' in html
+        assert '2019 Toyota Corolla' in html
+        assert '12.5% below the expected 17142.86' in html
+        assert 'Price dropped</strong> from 17000.0 (down 1000.0)' in html
+        assert 'href="https://example.com/car/1"' in html
+        assert 'Fair price for the mileage.' in html
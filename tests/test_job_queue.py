@@ -0,0 +1,78 @@
+import threading
+import time
+
+import pytest
+
+from src.database.connections import connection
+from src.jobs import job_queue
+from src.jobs.job_queue import JobQueue, WorkerPool
+
+@pytest.fixture
+def fast_heartbeats(monkeypatch):
+    monkeypatch.setattr(job_queue, 'STALE_JOB_SECONDS', 1)
+    monkeypatch.setattr(job_queue, 'HEARTBEAT_SECONDS', 0.1)
+    monkeypatch.setattr(job_queue, 'REQUEUE_INTERVAL_SECONDS', 0)
+
+def wait_for(queue, job_id, statuses=('completed', 'failed', 'cancelled'), timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = queue.get(job_id)
+        if job['status'] in statuses:
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"Job {job_id} is still {queue.get(job_id)['status']}.")
+
+def test_job_running_past_stale_threshold_runs_once(db_file, fast_heartbeats):
+    queue = JobQueue(db_file)
+    runs = []
+    release = threading.Event()
+
+    def handler(context):
+        # Reports no progress, like the LLM phase of a digest.
+        runs.append(context.id)
+        release.wait(10)
+        return 'Done.'
+
+    pool = WorkerPool(queue, {'digest': handler}, workers=2, poll_seconds=0.05)
+    job_id = queue.enqueue('digest')
+    pool.start()
+    try:
+        time.sleep(2.5)
+        # Another process looking for stale jobs sees a fresh heartbeat.
+        assert queue.requeue_stale() == 0
+        assert queue.get(job_id)['status'] == 'running'
+        release.set()
+        assert wait_for(queue, job_id)['status'] == 'completed'
+    finally:
+        release.set()
+        pool.stop(5)
+    assert runs == [job_id]
+
+def test_job_of_dead_process_is_requeued(db_file, fast_heartbeats):
+    queue = JobQueue(db_file)
+    job_id = queue.enqueue('scrape')
+    assert queue.claim('otherhost:1:0', ['scrape'])['id'] == job_id
+    with connection(db_file) as conn:
+        with conn:
+            conn.execute("UPDATE jobs SET heartbeat_at = ? WHERE id = ?", (time.time() - 60, job_id))
+
+    pool = WorkerPool(queue, {'scrape': lambda context: 'Scraped.'}, workers=1, poll_seconds=0.05)
+    pool.start()
+    try:
+        job = wait_for(queue, job_id)
+    finally:
+        pool.stop(5)
+    assert job['status'] == 'completed'
+    assert job['message'] == 'Scraped.'
+
+def test_stale_job_of_this_process_is_not_requeued(db_file, fast_heartbeats):
+    queue = JobQueue(db_file)
+    job_id = queue.enqueue('scrape')
+    prefix = WorkerPool._worker_prefix()
+    queue.claim(f"{prefix}0", ['scrape'])
+    with connection(db_file) as conn:
+        with conn:
+            conn.execute("UPDATE jobs SET heartbeat_at = ? WHERE id = ?", (time.time() - 60, job_id))
+
+    assert queue.requeue_stale(live_prefix=prefix) == 0
+    assert queue.requeue_stale() == 1
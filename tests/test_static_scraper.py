@@ -0,0 +1,131 @@
+import asyncio
+import hashlib
+import http.server
+import threading
+import time
+
+import pytest
+
+from src.database.database import bulk_insert_listings, create_connection
+from src.scraper import scheduler, sources
+from src.scraper.incremental import SeenIndex
+from src.scraper.static_scraper import PageCache, crawl_static_site, page_urls
+
+CARDS_PER_PAGE = 5
+
+def card(page, i):
+    return (f'<div class="vehicle-card-main"><h2 class="title">2015 Honda Civic LX</h2>'
+            f'<span class="primary-price">${10000 + i:,}</span><div class="mileage">{i * 1000:,} mi.</div>'
+            f'<div class="dealer-name">Dealer {i}</div>'
+            f'<a class="vehicle-card-link" href="/vehicle/{page}-{i}">View</a></div>')
+
+class FixtureSite:
+    """Result pages served by http.server with ETags, recording the requests they get."""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        site = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                site.serve(self)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def serve(self, handler):
+        page = int(handler.path.split('page=')[1]) if 'page=' in handler.path else 1
+        # Counted until the response is sent: the client may start its next
+        # request as soon as it has read this one, before the handler returns.
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(self.delay)
+        with self._lock:
+            self.in_flight -= 1
+        body = ''.join(card(page, i) for i in range(CARDS_PER_PAGE)).encode()
+        etag = f'"{hashlib.md5(body).hexdigest()}"'
+        status = 304 if handler.headers.get('If-None-Match') == etag else 200
+        self.requests.append((page, status))
+        handler.send_response(status)
+        handler.send_header('ETag', etag)
+        if status == 200:
+            handler.send_header('Content-Type', 'text/html')
+            handler.send_header('Content-Length', str(len(body)))
+        handler.end_headers()
+        if status == 200:
+            handler.wfile.write(body)
+
+    def urls(self, pages):
+        return page_urls(f'http://127.0.0.1:{self.server.server_port}/results?make=honda', pages)
+
+    def listing_urls(self, page):
+        return [f'http://127.0.0.1:{self.server.server_port}/vehicle/{page}-{i}' for i in range(CARDS_PER_PAGE)]
+
+@pytest.fixture
+def site():
+    site = FixtureSite()
+    yield site
+    site.server.shutdown()
+    site.server.server_close()
+
+def crawl(urls, page_cache, **kwargs):
+    return asyncio.run(crawl_static_site(urls, page_cache, requests_per_second=100, **kwargs))
+
+def test_unchanged_pages_are_revalidated_with_304(site, db_file):
+    urls = site.urls(3)
+    first = crawl(urls, PageCache(db_file))
+    assert (first.fetched, first.not_modified, first.failed) == (3, 0, 0)
+    assert len(first.listings) == 3 * CARDS_PER_PAGE
+
+    second = crawl(urls, PageCache(db_file))
+    assert (second.fetched, second.not_modified, second.failed) == (0, 3, 0)
+    assert second.listings == []
+    assert sorted(site.requests) == [(1, 200), (1, 304), (2, 200), (2, 304), (3, 200), (3, 304)]
+
+def test_not_modified_page_reports_the_listings_it_held(site, db_file):
+    urls = site.urls(2)
+    crawl(urls, PageCache(db_file), seen=SeenIndex())
+
+    results = []
+    crawl(urls, PageCache(db_file), seen=SeenIndex(), on_page=results.append)
+    by_url = {result.url: result for result in results}
+    for page, url in enumerate(urls, start=1):
+        assert by_url[url].status == 'not_modified'
+        assert sorted(by_url[url].unchanged) == sorted(site.listing_urls(page))
+
+def test_concurrency_per_host_is_capped(db_file):
+    site = FixtureSite(delay=0.2)
+    try:
+        result = crawl(site.urls(6), PageCache(db_file), concurrency_per_host=2)
+    finally:
+        site.server.shutdown()
+        site.server.server_close()
+    assert result.fetched == 6
+    assert site.max_in_flight == 2
+
+def test_page_whose_ingest_failed_is_fetched_again(site, db_file):
+    urls = site.urls(3)
+    sources.register_source(sources.get_source('cars.com')._replace(
+        name='fixture', urls=tuple(urls), concurrency=1, requests_per_second=100))
+    conn = create_connection(db_file)
+
+    def ingest(page, fail_on=None):
+        if page.page == fail_on:
+            raise RuntimeError("Ingest failed.")
+        bulk_insert_listings(conn, page.listings, source_site=page.source, scraped_timestamp=int(time.time()))
+
+    with pytest.raises(RuntimeError):
+        scheduler.run_sources({'fixture': urls}, lambda page: ingest(page, fail_on=2), db_file, processes=0)
+    scheduler.run_sources({'fixture': urls}, ingest, db_file, processes=0)
+
+    assert conn.execute("SELECT COUNT(*) FROM listings").fetchone()[0] == 3 * CARDS_PER_PAGE
+    # Page 2's validators were never stored, so it wasn't answered with a 304.
+    assert (2, 304) not in site.requests